@@ -1,13 +1,50 @@
+import asyncio
 import json
 import os
-import requests
+import httpx
+
+from backend import metrics
+from backend.chunking import overlapping_chunks
+from backend.locator import Locator, NormalizedText
+from backend.spans import SpanIndex
 
 # Configuration : Ollama (par défaut) ou Anthropic (fallback)
 OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "mistral")
 ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY", "")
+ANTHROPIC_MODEL = os.getenv("ANTHROPIC_MODEL", "claude-sonnet-4-20250514")
 AI_BACKEND = os.getenv("AI_BACKEND", "ollama")  # "ollama" ou "anthropic"
 
+# Clients HTTP persistants : pool de connexions keep-alive et timeouts par phase
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "10"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "400"))
+LLM_POOL_TIMEOUT = float(os.getenv("LLM_POOL_TIMEOUT", "30"))
+
+# Découpage des gros textes (pièces jointes) en morceaux analysés en parallèle
+LLM_CHUNK_CHARS = int(os.getenv("LLM_CHUNK_CHARS", "12000"))
+LLM_CHUNK_OVERLAP = int(os.getenv("LLM_CHUNK_OVERLAP", "400"))
+LLM_CHUNK_PARALLELISM = int(os.getenv("LLM_CHUNK_PARALLELISM", "4"))
+
+# Niveaux de risque du moins au plus grave (pour fusionner les verdicts des morceaux)
+RISK_LEVELS = [
+    "aucun",
+    "FAIBLE - ATTENTION",
+    "MOYEN - A VERIFIER",
+    "ELEVE - ENVOI DECONSEILLE",
+    "CRITIQUE - NE PAS ENVOYER",
+]
+
+# Micro-batching (mode débit) : regroupe les petits emails arrivés dans la même fenêtre
+LLM_BATCH_ENABLED = os.getenv("LLM_BATCH_ENABLED", "0") == "1"
+LLM_BATCH_WINDOW_MS = float(os.getenv("LLM_BATCH_WINDOW_MS", "50"))
+LLM_BATCH_MAX_ITEMS = int(os.getenv("LLM_BATCH_MAX_ITEMS", "8"))
+LLM_BATCH_MAX_CHARS = int(os.getenv("LLM_BATCH_MAX_CHARS", "4000"))
+
+_ollama_client: httpx.AsyncClient | None = None
+_anthropic_client = None
+
 SYSTEM_PROMPT = """Tu es un expert en sécurité des données et conformité RGPD.
 Ton rôle est d'analyser le contenu d'un email AVANT son envoi pour détecter TOUTE donnée sensible qui pourrait causer une fuite de données.
 
@@ -45,6 +82,18 @@ Réponds UNIQUEMENT avec du JSON valide, sans markdown, dans ce format exact :
 }"""
 
 
+BATCH_PROMPT_SUFFIX = """
+
+MODE LOT : tu reçois plusieurs emails indépendants, chacun précédé de "=== EMAIL <id> ===".
+Analyse chaque email séparément. Ce format de réponse remplace le précédent ;
+réponds UNIQUEMENT avec du JSON valide, sans markdown :
+{
+  "results": [
+    {"id": <id>, "entities": [...], "risk_level": "...", "risk_summary": "..."}
+  ]
+}"""
+
+
 def _parse_ai_response(result_text: str) -> dict:
     """Parse la réponse JSON du LLM, en nettoyant les éventuels backticks."""
     result_text = result_text.strip()
@@ -54,77 +103,544 @@ def _parse_ai_response(result_text: str) -> dict:
     return json.loads(result_text)
 
 
-def _analyze_with_ollama(text: str) -> dict:
+def _http_timeout() -> httpx.Timeout:
+    return httpx.Timeout(
+        connect=LLM_CONNECT_TIMEOUT,
+        read=LLM_READ_TIMEOUT,
+        write=LLM_CONNECT_TIMEOUT,
+        pool=LLM_POOL_TIMEOUT,
+    )
+
+
+def _http_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=LLM_POOL_SIZE,
+        max_keepalive_connections=LLM_POOL_SIZE,
+        keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+    )
+
+
+def _get_ollama_client() -> httpx.AsyncClient:
+    global _ollama_client
+    if _ollama_client is None:
+        _ollama_client = httpx.AsyncClient(
+            base_url=OLLAMA_URL, timeout=_http_timeout(), limits=_http_limits()
+        )
+    return _ollama_client
+
+
+def _get_anthropic_client():
+    global _anthropic_client
+    if _anthropic_client is None:
+        from anthropic import AsyncAnthropic
+
+        _anthropic_client = AsyncAnthropic(
+            api_key=ANTHROPIC_API_KEY,
+            http_client=httpx.AsyncClient(timeout=_http_timeout(), limits=_http_limits()),
+        )
+    return _anthropic_client
+
+
+async def start_clients():
+    """Crée les clients LLM persistants (démarrage de l'application)."""
+    if AI_BACKEND == "anthropic" and ANTHROPIC_API_KEY:
+        _get_anthropic_client()
+    else:
+        _get_ollama_client()
+
+
+async def close_clients():
+    """Ferme les clients LLM et leurs connexions (arrêt de l'application)."""
+    global _ollama_client, _anthropic_client, _batcher
+    _batcher = None
+    if _ollama_client is not None:
+        await _ollama_client.aclose()
+        _ollama_client = None
+    if _anthropic_client is not None:
+        await _anthropic_client.close()
+        _anthropic_client = None
+
+
+def _ollama_payload(text: str, stream: bool) -> dict:
+    return {
+        "model": OLLAMA_MODEL,
+        "prompt": f"{SYSTEM_PROMPT}\n\nAnalyse cet email avant envoi :\n\n{text}",
+        "stream": stream,
+        "options": {"temperature": 0.1},
+    }
+
+
+def _anthropic_messages(text: str) -> list[dict]:
+    return [{"role": "user", "content": f"Analyse cet email avant envoi :\n\n{text}"}]
+
+
+async def _analyze_with_ollama(text: str) -> dict:
     """Analyse via Ollama (modèle local sur GCP)."""
-    response = requests.post(
-        f"{OLLAMA_URL}/api/generate",
-        json={
-            "model": OLLAMA_MODEL,
-            "prompt": f"{SYSTEM_PROMPT}\n\nAnalyse cet email avant envoi :\n\n{text}",
-            "stream": False,
-            "options": {"temperature": 0.1},
-        },
-        timeout=400,
+    response = await _get_ollama_client().post(
+        "/api/generate",
+        json=_ollama_payload(text, stream=False),
     )
     response.raise_for_status()
     result_text = response.json()["response"]
     return _parse_ai_response(result_text)
 
 
-def _analyze_with_anthropic(text: str) -> dict:
+async def _analyze_with_anthropic(text: str) -> dict:
     """Analyse via l'API Anthropic (Claude)."""
-    from anthropic import Anthropic
-
-    client = Anthropic(api_key=ANTHROPIC_API_KEY)
-    response = client.messages.create(
-        model="claude-sonnet-4-20250514",
+    response = await _get_anthropic_client().messages.create(
+        model=ANTHROPIC_MODEL,
         max_tokens=2000,
         system=SYSTEM_PROMPT,
-        messages=[
-            {"role": "user", "content": f"Analyse cet email avant envoi :\n\n{text}"}
-        ],
+        messages=_anthropic_messages(text),
     )
     result_text = response.content[0].text
     return _parse_ai_response(result_text)
 
 
-def analyze_with_ai(text: str) -> dict:
-    """Analyse un email avec le LLM configuré (Ollama ou Anthropic)."""
-    try:
-        if AI_BACKEND == "anthropic" and ANTHROPIC_API_KEY:
-            return _analyze_with_anthropic(text)
+def _batch_content(texts: list[str]) -> str:
+    return "\n\n".join(f"=== EMAIL {i} ===\n{text}" for i, text in enumerate(texts, 1))
+
+
+async def _analyze_batch(texts: list[str]) -> list[dict | None]:
+    """Analyse plusieurs emails en un seul appel LLM ; None pour un email absent de la réponse."""
+    content = _batch_content(texts)
+    if AI_BACKEND == "anthropic" and ANTHROPIC_API_KEY:
+        response = await _get_anthropic_client().messages.create(
+            model=ANTHROPIC_MODEL,
+            max_tokens=2000 * len(texts),
+            system=SYSTEM_PROMPT + BATCH_PROMPT_SUFFIX,
+            messages=[{"role": "user", "content": f"Analyse ces emails avant envoi :\n\n{content}"}],
+        )
+        result_text = response.content[0].text
+    else:
+        response = await _get_ollama_client().post(
+            "/api/generate",
+            json={
+                "model": OLLAMA_MODEL,
+                "prompt": f"{SYSTEM_PROMPT}{BATCH_PROMPT_SUFFIX}\n\nAnalyse ces emails avant envoi :\n\n{content}",
+                "stream": False,
+                "options": {"temperature": 0.1},
+            },
+        )
+        response.raise_for_status()
+        result_text = response.json()["response"]
+
+    by_id = {}
+    for item in _parse_ai_response(result_text).get("results", []):
+        if isinstance(item, dict) and "id" in item:
+            by_id[str(item.pop("id"))] = item
+    return [by_id.get(str(i)) for i in range(1, len(texts) + 1)]
+
+
+class LLMBatcher:
+    """Regroupe les requêtes reçues pendant une courte fenêtre en un seul appel LLM.
+
+    Chaque appelant attend sa propre future ; les résultats du lot sont
+    redistribués par identifiant. Un email manquant dans la réponse (ou un lot
+    en échec) est réanalysé individuellement.
+    """
+
+    def __init__(self, window_ms: float, max_items: int):
+        self.window = window_ms / 1000
+        self.max_items = max_items
+        self._queue: list[tuple[str, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+        self.batches = 0
+        self.items = 0
+        self.fallbacks = 0
+
+    async def submit(self, text: str) -> dict:
+        future = asyncio.get_running_loop().create_future()
+        self._queue.append((text, future))
+        if len(self._queue) >= self.max_items:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._queue = self._queue, []
+        if batch:
+            task = asyncio.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_single(self, text: str) -> dict:
+        try:
+            return await _analyze_text(text)
+        except Exception as e:
+            return _error_result(e)
+
+    async def _run(self, batch: list[tuple[str, asyncio.Future]]):
+        self.batches += 1
+        self.items += len(batch)
+        texts = [text for text, _ in batch]
+        if len(batch) == 1:
+            results = [await self._run_single(texts[0])]
         else:
-            return _analyze_with_ollama(text)
-    except Exception as e:
+            try:
+                results = await _analyze_batch(texts)
+            except Exception:
+                results = [None] * len(batch)
+            missing = [i for i, result in enumerate(results) if result is None]
+            if missing:
+                self.fallbacks += len(missing)
+                retried = await asyncio.gather(*(self._run_single(texts[i]) for i in missing))
+                for i, result in zip(missing, retried):
+                    results[i] = result
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> dict:
         return {
-            "entities": [],
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+            # Taux de remplissage des lots par rapport à LLM_BATCH_MAX_ITEMS
+            "fill_ratio": self.items / (self.batches * self.max_items) if self.batches else 0.0,
+            "fallbacks": self.fallbacks,
+        }
+
+
+_batcher: LLMBatcher | None = None
+
+
+def _get_batcher() -> LLMBatcher:
+    global _batcher
+    if _batcher is None:
+        _batcher = LLMBatcher(LLM_BATCH_WINDOW_MS, LLM_BATCH_MAX_ITEMS)
+    return _batcher
+
+
+def batching_stats() -> dict:
+    return {"enabled": LLM_BATCH_ENABLED, **(_batcher.stats() if _batcher else {})}
+
+
+class EntityStreamParser:
+    """Extrait au fil de l'eau les objets du tableau "entities" d'une réponse JSON partielle."""
+
+    def __init__(self):
+        self.buffer = ""
+        self._pos = 0
+        self._in_array = False
+        self._done = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._obj_start = -1
+
+    def feed(self, chunk: str) -> list[dict]:
+        """Ajoute un fragment de texte et retourne les entités complétées."""
+        self.buffer += chunk
+        entities = []
+        if not self._in_array and not self._done:
+            key = self.buffer.find('"entities"', self._pos)
+            if key < 0:
+                return entities
+            bracket = self.buffer.find("[", key)
+            if bracket < 0:
+                return entities
+            self._in_array = True
+            self._pos = bracket + 1
+
+        buffer = self.buffer
+        i = self._pos
+        while self._in_array and i < len(buffer):
+            char = buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                if self._depth == 0:
+                    self._obj_start = i
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        entities.append(json.loads(buffer[self._obj_start:i + 1]))
+                    except json.JSONDecodeError:
+                        pass
+            elif char == "]" and self._depth == 0:
+                self._in_array = False
+                self._done = True
+            i += 1
+        self._pos = i
+        return entities
+
+    def result(self) -> dict:
+        """Parse la réponse complète une fois le flux terminé."""
+        return _parse_ai_response(self.buffer)
+
+
+async def _stream_ollama(text: str):
+    async with _get_ollama_client().stream(
+        "POST",
+        "/api/generate",
+        json=_ollama_payload(text, stream=True),
+    ) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line:
+                yield json.loads(line).get("response", "")
+
+
+async def _stream_anthropic(text: str):
+    async with _get_anthropic_client().messages.stream(
+        model=ANTHROPIC_MODEL,
+        max_tokens=2000,
+        system=SYSTEM_PROMPT,
+        messages=_anthropic_messages(text),
+    ) as stream:
+        async for chunk in stream.text_stream:
+            yield chunk
+
+
+def _error_result(error: Exception) -> dict:
+    metrics.count_llm_error(ai_model_id().split(":", 1)[0], error)
+    return {
+        "entities": [],
+        "risk_level": "erreur",
+        "risk_summary": f"Erreur lors de l'analyse IA : {str(error)}",
+    }
+
+
+async def _analyze_text(text: str) -> dict:
+    if AI_BACKEND == "anthropic" and ANTHROPIC_API_KEY:
+        return await _analyze_with_anthropic(text)
+    return await _analyze_with_ollama(text)
+
+
+async def _analyze_chunk(semaphore: asyncio.Semaphore, offset: int, chunk: str) -> dict:
+    async with semaphore:
+        try:
+            result = await _analyze_text(chunk)
+        except Exception as e:
+            result = _error_result(e)
+    result["entities"] = [e for e in result.get("entities", []) if isinstance(e, dict)]
+    for entity in result["entities"]:
+        entity["chunk_offset"] = offset
+    return result
+
+
+async def _iter_chunk_results(text: str):
+    """Analyse les morceaux en parallèle (LLM_CHUNK_PARALLELISM) et les produit dans l'ordre de fin."""
+    semaphore = asyncio.Semaphore(LLM_CHUNK_PARALLELISM)
+    tasks = [
+        asyncio.create_task(_analyze_chunk(semaphore, offset, chunk))
+        for offset, chunk in overlapping_chunks(text, LLM_CHUNK_CHARS, LLM_CHUNK_OVERLAP)
+    ]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def _merge_chunk_results(results: list[dict]) -> dict:
+    """Fusionne les analyses des morceaux : entités dédupliquées, verdict le plus grave."""
+    entities = []
+    seen = set()
+    for result in results:
+        for entity in result["entities"]:
+            key = (entity.get("label", ""), entity.get("text", "").lower().strip())
+            if key not in seen:
+                seen.add(key)
+                entities.append(entity)
+
+    failed = [r for r in results if r.get("risk_level") == "erreur"]
+    if failed:
+        # Analyse incomplète : signalée comme erreur (et donc jamais mise en cache)
+        return {
+            "entities": entities,
             "risk_level": "erreur",
-            "risk_summary": f"Erreur lors de l'analyse IA : {str(e)}",
+            "risk_summary": f"{len(failed)}/{len(results)} morceau(x) en erreur. {failed[0].get('risk_summary', '')}",
         }
 
+    worst = max(
+        results,
+        key=lambda r: RISK_LEVELS.index(r["risk_level"]) if r.get("risk_level") in RISK_LEVELS else 0,
+    )
+    return {
+        "entities": entities,
+        "risk_level": worst.get("risk_level", "aucun"),
+        "risk_summary": worst.get("risk_summary", ""),
+    }
+
+
+async def stream_ai_analysis(text: str):
+    """Analyse en streaming : produit ("entity", dict) au fil de la génération, puis ("result", dict).
+
+    Fermer le générateur (aclose) interrompt la requête HTTP et donc la génération.
+    Les gros textes sont analysés par morceaux : les entités d'un morceau sont produites
+    dès que son analyse est terminée.
+    """
+    if len(text) > LLM_CHUNK_CHARS:
+        results = []
+        chunk_results = _iter_chunk_results(text)
+        try:
+            async for result in chunk_results:
+                results.append(result)
+                for entity in result["entities"]:
+                    yield "entity", entity
+        finally:
+            await chunk_results.aclose()
+        yield "result", _merge_chunk_results(results)
+        return
+
+    parser = EntityStreamParser()
+    if AI_BACKEND == "anthropic" and ANTHROPIC_API_KEY:
+        chunks = _stream_anthropic(text)
+    else:
+        chunks = _stream_ollama(text)
+    try:
+        async for chunk in chunks:
+            for entity in parser.feed(chunk):
+                entity["chunk_offset"] = 0
+                yield "entity", entity
+        result = parser.result()
+    except Exception as e:
+        result = _error_result(e)
+    finally:
+        await chunks.aclose()
+    yield "result", result
+
+
+def ai_model_id() -> str:
+    """Identifiant du backend et du modèle LLM utilisés (pour les clés de cache)."""
+    if AI_BACKEND == "anthropic" and ANTHROPIC_API_KEY:
+        return f"anthropic:{ANTHROPIC_MODEL}"
+    return f"ollama:{OLLAMA_MODEL}"
+
+
+async def analyze_with_ai(text: str) -> dict:
+    """Analyse un email avec le LLM configuré (Ollama ou Anthropic).
+
+    Au-delà de LLM_CHUNK_CHARS, le texte est découpé en morceaux qui se recouvrent,
+    analysés en parallèle ; chaque entité IA porte l'offset de son morceau (chunk_offset).
+    """
+    if len(text) > LLM_CHUNK_CHARS:
+        results = [result async for result in _iter_chunk_results(text)]
+        return _merge_chunk_results(results)
+    if LLM_BATCH_ENABLED and len(text) <= LLM_BATCH_MAX_CHARS:
+        result = await _get_batcher().submit(text)
+    else:
+        try:
+            result = await _analyze_text(text)
+        except Exception as e:
+            return _error_result(e)
+    for entity in result.get("entities", []):
+        if isinstance(entity, dict):
+            entity["chunk_offset"] = 0
+    return result
+
+
+async def check_ai_backend() -> bool:
+    """Vérifie que le backend LLM configuré est joignable (pour /readyz)."""
+    if AI_BACKEND == "anthropic" and ANTHROPIC_API_KEY:
+        return True
+    try:
+        response = await _get_ollama_client().get("/api/tags", timeout=2)
+        return response.is_success
+    except httpx.HTTPError:
+        return False
+
+
+class DetectionMerger:
+    """Fusion incrémentale d'entités IA avec les détections regex/NER d'un texte.
+
+    Le texte normalisé, l'index des intervalles retenus et les textes déjà
+    détectés sont construits une fois : chaque appel à ``add`` ne coûte que
+    la localisation des nouvelles entités (flux SSE, une entité à la fois).
+    """
+
+    def __init__(self, regex_entities: list[dict], text: "str | NormalizedText | None" = None):
+        self.entities = list(regex_entities)
+        self._texts = {e["text"].lower().strip() for e in regex_entities}
+        self._spans = SpanIndex()
+        self._spans.add_sorted(sorted((e["start"], e["end"]) for e in regex_entities if e.get("start", -1) >= 0))
+        self._normalized = None
+        if text is not None:
+            self._normalized = text if isinstance(text, NormalizedText) else NormalizedText(text)
+
+    @staticmethod
+    def _entry(ai_ent: dict, ent_text: str, start: int, end: int) -> dict:
+        return {
+            "text": ent_text,
+            "label": ai_ent.get("label", "SENSIBLE"),
+            "start": start,
+            "end": end,
+            "severity": ai_ent.get("severity", "moyen"),
+            "reason": ai_ent.get("reason", ""),
+            "source": "ai",
+            "chunk_offset": ai_ent.get("chunk_offset", 0),
+        }
+
+    def add(self, ai_entities: list[dict]) -> list[dict]:
+        """Ajoute des entités IA ; retourne celles retenues (non dupliquées), dans l'ordre."""
+        positions = []
+        for ai_ent in ai_entities:
+            start = ai_ent.get("start", -1)
+            end = ai_ent.get("end", -1)
+            if not isinstance(start, int) or not isinstance(end, int) or start < 0 or end <= start:
+                start = end = -1
+            positions.append((start, end))
+
+        occurrences = [[] for _ in ai_entities]
+        normalized = self._normalized
+        if normalized is not None:
+            unplaced = [i for i, (start, _) in enumerate(positions) if start < 0]
+            located = Locator([ai_entities[i].get("text", "") for i in unplaced]).locate(normalized)
+            for i, found in zip(unplaced, located):
+                occurrences[i] = found
 
-def merge_detections(regex_entities: list[dict], ai_result: dict) -> dict:
-    """Fusionne les détections regex/NER avec l'analyse IA."""
-    ai_entities = ai_result.get("entities", [])
-    merged = list(regex_entities)
+        added = []
+        for ai_ent, (start, end), found in zip(ai_entities, positions, occurrences):
+            ai_text = ai_ent.get("text", "").lower().strip()
+            if not ai_text:
+                continue
+            if found:
+                # Occurrences triées : ajout par lot dans l'index
+                for (occ_start, occ_end), kept in zip(found, self._spans.add_sorted(found)):
+                    if kept:
+                        added.append(self._entry(ai_ent, normalized.source[occ_start:occ_end], occ_start, occ_end))
+                continue
+            if start >= 0:
+                if not self._spans.try_add(start, end):
+                    continue
+            elif ai_text in self._texts:
+                continue
+            added.append(self._entry(ai_ent, ai_ent.get("text", ""), start, end))
+        self.entities.extend(added)
+        return added
 
-    regex_texts = {e["text"].lower().strip() for e in regex_entities}
 
-    for ai_ent in ai_entities:
-        ai_text = ai_ent.get("text", "").lower().strip()
-        if ai_text and ai_text not in regex_texts:
-            merged.append({
-                "text": ai_ent.get("text", ""),
-                "label": ai_ent.get("label", "SENSIBLE"),
-                "start": -1,
-                "end": -1,
-                "severity": ai_ent.get("severity", "moyen"),
-                "reason": ai_ent.get("reason", ""),
-                "source": "ai",
-            })
+def merge_detections(
+    regex_entities: list[dict], ai_result: dict, text: "str | NormalizedText | None" = None
+) -> dict:
+    """Fusionne les détections regex/NER avec l'analyse IA.
 
+    Si ``text`` est fourni, les entités IA sans position sont localisées dans
+    le texte (une entité par occurrence, cf. Locator) pour pouvoir être
+    masquées. Les entités positionnées sont dédupliquées par chevauchement
+    d'intervalles, les autres par texte.
+    """
+    merger = DetectionMerger(regex_entities, text)
+    merger.add(ai_result.get("entities", []))
     return {
-        "entities": merged,
+        "entities": merger.entities,
         "risk_level": ai_result.get("risk_level", "aucun"),
         "risk_summary": ai_result.get("risk_summary", ""),
     }
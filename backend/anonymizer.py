@@ -1,4 +1,14 @@
-from backend.detector import detect_sensitive_data
+import io
+import zipfile
+
+from docx import Document
+from docx.oxml.ns import qn
+from docx.text.run import Run
+from openpyxl import load_workbook
+
+from backend.detector import INCOMPLETE_LABEL, detect_sensitive_data, is_incomplete
+from backend.file_parser import open_source
+from backend.sheet_scanner import scan_workbook
 
 # Masques par type de donnée sensible
 MASKS = {
@@ -23,6 +33,56 @@ MASKS = {
 }
 
 
+# Parties d'un classeur que openpyxl perd à l'enregistrement (graphiques, images, objets
+# incorporés) ou qui copient des données hors des cellules analysées (caches, commentaires)
+XLSX_UNSUPPORTED_PARTS = {
+    "xl/drawings/": "dessins",
+    "xl/charts/": "graphiques",
+    "xl/media/": "images",
+    "xl/embeddings/": "objets incorporés",
+    "xl/pivotCache/": "tableaux croisés dynamiques",
+    "xl/comments": "commentaires",
+    "xl/threadedComments/": "commentaires",
+    "xl/vbaProject.bin": "macros",
+}
+
+
+class UnsupportedContentError(ValueError):
+    """Levée quand le fichier contient des éléments que le masquage perdrait ou ne traiterait pas,
+    ou quand la détection a été interrompue (masquage incomplet)."""
+
+
+def mask_for(label: str) -> str:
+    return MASKS.get(label, f"[{label}_MASQUÉ]")
+
+
+def _merge_spans(entities: list[dict]) -> list[tuple[int, int, str]]:
+    """Intervalles à masquer, triés et disjoints ; un chevauchement prolonge le masque précédent."""
+    spans = []
+    for ent in sorted(entities, key=lambda e: (e["start"], -e["end"])):
+        start, end = ent["start"], ent["end"]
+        if start < 0 or end <= start:
+            continue
+        if spans and start < spans[-1][1]:
+            if end > spans[-1][1]:
+                spans[-1] = (spans[-1][0], end, spans[-1][2])
+            continue
+        spans.append((start, end, mask_for(ent["label"])))
+    return spans
+
+
+def _splice(text: str, spans: list[tuple[int, int, str]]) -> str:
+    # Assemblage en un seul passage : segments conservés et masques, joints à la fin
+    parts = []
+    cursor = 0
+    for start, end, mask in spans:
+        parts.append(text[cursor:start])
+        parts.append(mask)
+        cursor = end
+    parts.append(text[cursor:])
+    return "".join(parts)
+
+
 def anonymize(text: str, entities: list[dict] | None = None) -> str:
     """Remplace les données sensibles détectées par des masques.
 
@@ -30,10 +90,149 @@ def anonymize(text: str, entities: list[dict] | None = None) -> str:
     """
     if entities is None:
         entities = detect_sensitive_data(text)
+    return _splice(text, _merge_spans(entities))
+
 
-    result = text
-    for ent in sorted(entities, key=lambda e: e["start"], reverse=True):
-        mask = MASKS.get(ent["label"], f"[{ent['label']}_MASQUÉ]")
-        result = result[:ent["start"]] + mask + result[ent["end"]:]
+def _split_spans(segments: list[tuple[int, str]], spans: list[tuple[int, int, str]]) -> list[list[tuple[int, int, str]]]:
+    """Répartit les intervalles à masquer sur des segments (offset, texte) triés.
 
+    Le masque revient au premier segment touché, la suite de l'intervalle
+    est effacée des segments suivants.
+    """
+    result = [[] for _ in segments]
+    i = 0
+    for start, end, mask in spans:
+        while i < len(segments) and segments[i][0] + len(segments[i][1]) <= start:
+            i += 1
+        j = i
+        while j < len(segments) and segments[j][0] < end:
+            offset, text = segments[j]
+            local_start = max(start, offset) - offset
+            local_end = min(end, offset + len(text)) - offset
+            if local_end > local_start:
+                result[j].append((local_start, local_end, mask))
+                mask = ""
+            j += 1
     return result
+
+
+def _docx_parts(doc):
+    # Corps (tableaux et zones de texte compris), puis en-têtes et pieds de page définis
+    yield doc.element.body
+    for section in doc.sections:
+        for part in (section.header, section.footer, section.first_page_header,
+                     section.first_page_footer, section.even_page_header, section.even_page_footer):
+            if not part.is_linked_to_previous:
+                yield part._element
+
+
+def _detect_complete(text: str) -> list[dict]:
+    entities = detect_sensitive_data(text)
+    if is_incomplete(entities):
+        raise UnsupportedContentError("Masquage impossible : détection interrompue faute de temps")
+    return entities
+
+
+def _paragraph_runs(p) -> list:
+    """Runs d'un paragraphe à toute profondeur (insertions suivies, contrôles de contenu, champs...),
+    hors paragraphes imbriqués (zones de texte), visités pour eux-mêmes."""
+    return [r for r in p.iter(qn("w:r")) if next(r.iterancestors(qn("w:p"))) is p]
+
+
+def anonymize_docx(source) -> bytes:
+    """Masque un document Word en place : le texte des runs est modifié, la mise en forme conservée.
+
+    Le texte supprimé en suivi des modifications et les instructions de champ
+    (ex. lien "mailto:") sont masqués élément par élément.
+    """
+    with open_source(source) as fileobj:
+        doc = Document(fileobj)
+
+    # Paragraphes joints par "\n" : une seule détection, offsets ramenés aux runs
+    runs = []
+    segments = []
+    paragraphs = []
+    offset = 0
+    for part in _docx_parts(doc):
+        for p in part.iter(qn("w:p")):
+            texts = []
+            for r in _paragraph_runs(p):
+                run = Run(r, None)
+                runs.append(run)
+                segments.append((offset, run.text))
+                texts.append(run.text)
+                offset += len(run.text)
+            paragraphs.append("".join(texts))
+            offset += 1
+
+    text = "\n".join(paragraphs)
+    spans = _merge_spans(_detect_complete(text))
+    for run, (_, run_text), run_spans in zip(runs, segments, _split_spans(segments, spans)):
+        if run_spans:
+            run.text = _splice(run_text, run_spans)
+    for part in _docx_parts(doc):
+        for element in (*part.iter(qn("w:delText")), *part.iter(qn("w:instrText"))):
+            if element.text and element.text.strip():
+                element.text = anonymize(element.text, _detect_complete(element.text))
+
+    out = io.BytesIO()
+    doc.save(out)
+    return out.getvalue()
+
+
+def _check_xlsx_parts(fileobj):
+    with zipfile.ZipFile(fileobj) as archive:
+        found = {kind for name in archive.namelist()
+                 for prefix, kind in XLSX_UNSUPPORTED_PARTS.items() if name.startswith(prefix)}
+    if found:
+        raise UnsupportedContentError(f"Masquage impossible, le classeur contient : {', '.join(sorted(found))}")
+
+
+def anonymize_xlsx(source) -> bytes:
+    """Masque un classeur Excel en place, cellule par cellule (détection de scan_workbook).
+
+    Les classeurs contenant des éléments de XLSX_UNSUPPORTED_PARTS sont refusés
+    (UnsupportedContentError) plutôt que rendus incomplets ou partiellement masqués.
+    """
+    with open_source(source) as fileobj:
+        _check_xlsx_parts(fileobj)
+        fileobj.seek(0)
+        hits = scan_workbook(fileobj)["hits"]
+        if any(hit["label"] == INCOMPLETE_LABEL for hit in hits):
+            raise UnsupportedContentError("Masquage impossible : détection interrompue faute de temps")
+        fileobj.seek(0)
+        wb = load_workbook(fileobj)
+
+    cells: dict[tuple[str, str], list[dict]] = {}
+    for hit in hits:
+        cells.setdefault((hit["sheet"], f"{hit['column']}{hit['row']}"), []).append(hit)
+    for (sheet, ref), cell_hits in cells.items():
+        cell = wb[sheet][ref]
+        if not isinstance(cell.value, str) or any(hit["source"] == "header" for hit in cell_hits):
+            # Colonne sensible par son en-tête, ou valeur numérique : cellule entière masquée
+            cell.value = mask_for(cell_hits[0]["label"])
+            continue
+        value = cell.value
+        # Regex d'abord (plus précises) : un nom NER déjà recouvert n'est plus trouvé
+        for hit in sorted(cell_hits, key=lambda h: (h["source"] == "ner", -len(h["text"]))):
+            value = value.replace(hit["text"], mask_for(hit["label"]))
+        cell.value = value
+
+    out = io.BytesIO()
+    wb.save(out)
+    return out.getvalue()
+
+
+# Formats masqués en place : extension → (fonction, type MIME)
+FILE_ANONYMIZERS = {
+    ".docx": (anonymize_docx, "application/vnd.openxmlformats-officedocument.wordprocessingml.document"),
+    ".xlsx": (anonymize_xlsx, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+
+
+def anonymize_file(filename: str, source) -> bytes:
+    """Retourne une copie masquée du fichier, dans son format d'origine (.docx, .xlsx)."""
+    ext = "." + filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    if ext not in FILE_ANONYMIZERS:
+        raise ValueError(f"Format non supporté pour le masquage : {ext}")
+    return FILE_ANONYMIZERS[ext][0](source)
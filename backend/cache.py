@@ -0,0 +1,270 @@
+import copy
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+
+def content_key(*parts: str) -> str:
+    """Clé SHA-256 d'un contenu : le texte analysé n'est jamais conservé en clair comme clé."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8", errors="surrogatepass"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _estimate_size(value) -> int:
+    return len(json.dumps(value, ensure_ascii=False, default=str).encode("utf-8"))
+
+
+class ResultCache:
+    """Cache LRU en mémoire, borné en octets, avec expiration (TTL) stricte.
+
+    Le TTL étant fixe, l'ordre d'expiration est l'ordre d'insertion : la purge
+    ne parcourt que les entrées expirées.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[int, object]] = OrderedDict()  # ordre LRU
+        self._expiry: OrderedDict[str, float] = OrderedDict()  # ordre d'insertion
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _remove(self, key: str):
+        size, _ = self._entries.pop(key)
+        del self._expiry[key]
+        self._bytes -= size
+
+    def _purge_expired(self, now: float):
+        while self._expiry:
+            key, expires_at = next(iter(self._expiry.items()))
+            if expires_at > now:
+                break
+            self._remove(key)
+            self.expirations += 1
+
+    def purge_expired(self):
+        with self._lock:
+            self._purge_expired(time.monotonic())
+
+    def get(self, key: str):
+        with self._lock:
+            self._purge_expired(time.monotonic())
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return copy.deepcopy(entry[1])
+
+    def put(self, key: str, value):
+        size = _estimate_size(value)
+        if size > self.max_bytes:
+            return
+        value = copy.deepcopy(value)
+        with self._lock:
+            now = time.monotonic()
+            self._purge_expired(now)
+            if key in self._entries:
+                self._remove(key)
+            while self._bytes + size > self.max_bytes and self._entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+            self._entries[key] = (size, value)
+            self._expiry[key] = now + self.ttl
+            self._bytes += size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._expiry.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+class DiskCache:
+    """Cache LRU sur disque, borné en octets, chiffré au repos (clé Fernet obligatoire), avec TTL.
+
+    Une entrée par fichier (nom = clé), dont la date de modification est la
+    date d'écriture : une entrée plus ancienne que ``ttl`` est supprimée à la
+    lecture et au démarrage. L'ordre LRU est tenu en mémoire et reconstruit au
+    démarrage d'après les dates d'écriture.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, encryption_key: str, ttl: float):
+        if not encryption_key:
+            raise ValueError("Cache disque refusé sans clé de chiffrement : les résultats y seraient en clair")
+        # Dépendance optionnelle, requise seulement pour le cache disque
+        from cryptography.fernet import Fernet
+
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._fernet = Fernet(encryption_key)
+        self._index: OrderedDict[str, int] = OrderedDict()  # ordre LRU
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        os.makedirs(directory, exist_ok=True)
+        entries = []
+        now = time.time()
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if name.endswith(".tmp"):
+                os.unlink(path)
+                continue
+            stat = os.stat(path)
+            if now - stat.st_mtime >= ttl:
+                os.unlink(path)
+                self.expirations += 1
+                continue
+            entries.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self._index[name] = size
+            self._bytes += size
+        with self._lock:
+            self._evict()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._index:
+            key, size = self._index.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+            try:
+                os.unlink(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def _forget(self, key: str):
+        self._bytes -= self._index.pop(key, 0)
+
+    def _discard(self, key: str):
+        self._forget(key)
+        try:
+            os.unlink(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def get(self, key: str):
+        with self._lock:
+            if key not in self._index:
+                self.misses += 1
+                return None
+            try:
+                with open(self._path(key), "rb") as f:
+                    if time.time() - os.fstat(f.fileno()).st_mtime >= self.ttl:
+                        self._discard(key)
+                        self.expirations += 1
+                        self.misses += 1
+                        return None
+                    data = f.read()
+                value = json.loads(zlib.decompress(self._fernet.decrypt(data)))
+            except Exception:
+                # Fichier supprimé, corrompu ou chiffré avec une autre clé
+                self._discard(key)
+                self.misses += 1
+                return None
+            self._index.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value):
+        data = self._fernet.encrypt(zlib.compress(json.dumps(value, ensure_ascii=False).encode("utf-8"), 1))
+        if len(data) > self.max_bytes:
+            return
+        # Écriture atomique : fichier temporaire puis renommage
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self._path(key))
+        with self._lock:
+            self._forget(key)
+            self._index[key] = len(data)
+            self._bytes += len(data)
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._index):
+                try:
+                    os.unlink(self._path(key))
+                except FileNotFoundError:
+                    pass
+            self._index.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._index),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+class TieredCache:
+    """Cache à deux niveaux : mémoire (ResultCache) devant un stockage disque optionnel.
+
+    Une entrée lue sur disque est remontée en mémoire. Les appels au disque
+    étant bloquants, les méthodes sont à exécuter hors de la boucle d'événements.
+    """
+
+    def __init__(self, memory: ResultCache, disk: DiskCache | None = None):
+        self.memory = memory
+        self.disk = disk
+
+    def get(self, key: str):
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.put(key, value)
+        return value
+
+    def put(self, key: str, value):
+        self.memory.put(key, value)
+        if self.disk is not None:
+            self.disk.put(key, value)
+
+    def clear(self):
+        """Vide le niveau mémoire (le disque est conservé entre deux démarrages)."""
+        self.memory.clear()
+
+    def stats(self) -> dict:
+        return {"memory": self.memory.stats(), "disk": self.disk.stats() if self.disk else None}
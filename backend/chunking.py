@@ -0,0 +1,43 @@
+# Séparateurs préférés pour couper un texte, du plus au moins structurant
+_SEPARATORS = ("\n\n", "\n", " ")
+
+
+def paragraph_chunks(text: str, max_chars: int) -> list[tuple[int, str]]:
+    """Découpe un texte en morceaux d'au plus max_chars, aux frontières de paragraphe.
+
+    Retourne une liste de (offset, morceau) avec text[offset:offset + len(morceau)] == morceau.
+    """
+    chunks = []
+    start = 0
+    length = len(text)
+    while start < length:
+        end = min(start + max_chars, length)
+        if end < length:
+            for sep in _SEPARATORS:
+                cut = text.rfind(sep, start, end)
+                if cut > start:
+                    end = cut + len(sep)
+                    break
+        chunks.append((start, text[start:end]))
+        start = end
+    return chunks
+
+
+def overlapping_chunks(text: str, max_chars: int, overlap: int) -> list[tuple[int, str]]:
+    """Comme paragraph_chunks, mais chaque morceau reprend jusqu'à overlap caractères du précédent.
+
+    Le début du recouvrement est aligné sur une frontière de ligne quand c'est possible,
+    pour qu'une donnée coupée entre deux morceaux apparaisse entière dans l'un d'eux.
+    """
+    base = paragraph_chunks(text, max(1, max_chars - overlap))
+    chunks = []
+    for offset, chunk in base:
+        start = offset
+        if offset > 0 and overlap > 0:
+            start = max(0, offset - overlap)
+            line = text.find("\n", start, offset)
+            if line >= 0:
+                start = line + 1
+        end = offset + len(chunk)
+        chunks.append((start, text[start:end]))
+    return chunks
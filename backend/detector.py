@@ -1,10 +1,61 @@
-import re
+import os
+import threading
+from itertools import groupby
 import spacy
-from langdetect import detect
 
-# Chargement des modèles spaCy
-nlp_fr = spacy.load("fr_core_news_md")
-nlp_en = spacy.load("en_core_web_md")
+from backend import metrics, rules
+from backend.cache import content_key
+from backend.chunking import paragraph_chunks
+from backend.file_parser import iter_extract
+from backend.langid import DEFAULT_LANG, LANG_MIN_HITS, LANG_SAMPLE_CHARS, LANG_SEGMENT_CHARS, STOPWORDS, identify, language_runs
+from backend.regex_engine import RegexBudget
+from backend.spans import SpanIndex
+
+# Configuration NER : pipeline réduit au seul composant "ner" et traitement par lots
+SPACY_LEAN = os.getenv("SPACY_LEAN", "1") == "1"
+SPACY_CHUNK_CHARS = int(os.getenv("SPACY_CHUNK_CHARS", "10000"))
+SPACY_BATCH_SIZE = int(os.getenv("SPACY_BATCH_SIZE", "32"))
+SPACY_N_PROCESS = int(os.getenv("SPACY_N_PROCESS", "1"))
+
+# Composants inutiles pour doc.ents (le "ner" des modèles *_md a son propre tok2vec)
+LEAN_EXCLUDE = ["tok2vec", "tagger", "morphologizer", "parser", "senter", "attribute_ruler", "lemmatizer"]
+
+
+def _load_model(name: str):
+    if SPACY_LEAN:
+        return spacy.load(name, exclude=LEAN_EXCLUDE)
+    return spacy.load(name)
+
+
+# Modèles spaCy par langue, chargés à la première utilisation
+SPACY_MODELS = {
+    "fr": "fr_core_news_md",
+    "en": "en_core_web_md",
+}
+_models = {}
+_models_lock = threading.Lock()
+
+
+def get_nlp(lang: str):
+    """Retourne le pipeline spaCy de la langue, en le chargeant au besoin."""
+    nlp = _models.get(lang)
+    if nlp is None:
+        with _models_lock:
+            nlp = _models.get(lang)
+            if nlp is None:
+                nlp = _load_model(SPACY_MODELS[lang])
+                _models[lang] = nlp
+    return nlp
+
+
+def warm_up(langs=None):
+    """Précharge les modèles des langues demandées (toutes par défaut)."""
+    for lang in langs or SPACY_MODELS:
+        get_nlp(lang)
+
+
+def loaded_models() -> list[str]:
+    return sorted(_models)
 
 # Labels NER spaCy → labels DLP
 SPACY_LABEL_MAP = {
@@ -12,111 +63,16 @@ SPACY_LABEL_MAP = {
     "PERSON": "NOM",
 }
 
-# Patterns regex pour la détection de données sensibles
-REGEX_PATTERNS = [
-    # --- Identifiants & mots de passe ---
-    {
-        "label": "MOT_DE_PASSE",
-        "pattern": re.compile(
-            r"(?i)(?:mot\s*de\s*passe|password|mdp|pwd|pass)(?:\s+\w+)*\s*[:=]\s*\S+",
-        ),
-    },
-    {
-        "label": "IDENTIFIANT",
-        "pattern": re.compile(
-            r"(?i)(?:login|identifiant|username|user|utilisateur)(?:\s+\w+)*\s*[:=]\s*\S+",
-        ),
-    },
-    {
-        "label": "CODE_PIN",
-        "pattern": re.compile(
-            r"(?i)(?:code\s*(?:pin|secret|acc[eè]s|confidentiel))\s*[:=]\s*\S+",
-        ),
-    },
-    # --- Clés API & tokens ---
-    {
-        "label": "CLE_API",
-        "pattern": re.compile(
-            r"(?i)(?:api[_\s-]?key|api[_\s-]?secret|token|secret[_\s-]?key|access[_\s-]?key)\s*[:=]\s*\S+",
-        ),
-    },
-    {
-        "label": "CLE_API_AWS",
-        "pattern": re.compile(r"(?:AKIA|ASIA)[A-Z0-9]{16}"),
-    },
-    {
-        "label": "CLE_API_GENERIC",
-        "pattern": re.compile(
-            r"(?i)(?:sk|pk|rk)[_-](?:live|test|prod)[_-][a-zA-Z0-9]{20,}",
-        ),
-    },
-    {
-        "label": "TOKEN_JWT",
-        "pattern": re.compile(r"eyJ[a-zA-Z0-9_-]{10,}\.eyJ[a-zA-Z0-9_-]{10,}\.[a-zA-Z0-9_-]+"),
-    },
-    # --- Données financières ---
-    {
-        "label": "CARTE_BANCAIRE",
-        "pattern": re.compile(
-            r"\b(?:4\d{3}|5[1-5]\d{2}|3[47]\d{2}|6(?:011|5\d{2}))"
-            r"[\s.-]?\d{4}[\s.-]?\d{4}[\s.-]?\d{1,4}\b",
-        ),
-    },
-    {
-        "label": "CVV",
-        "pattern": re.compile(
-            r"(?i)(?:cvv|cvc|csv|code\s*s[eé]curit[eé])\s*[:=]\s*\d{3,4}",
-        ),
-    },
-    {
-        "label": "IBAN",
-        "pattern": re.compile(
-            r"\b[A-Z]{2}\d{2}[\s]?\d{4}[\s]?\d{4}[\s]?\d{4}[\s]?\d{4}[\s]?\d{0,4}\b",
-        ),
-    },
-    # --- Données personnelles sensibles ---
-    {
-        "label": "SECU",
-        "pattern": re.compile(r"[12]\s?\d{2}\s?\d{2}\s?\d{2}\s?\d{3}\s?\d{3}\s?\d{2}"),
-    },
-    {
-        "label": "EMAIL",
-        "pattern": re.compile(r"[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}"),
-    },
-    {
-        "label": "TELEPHONE",
-        "pattern": re.compile(
-            r"(?:\+33[\s.-]?|0)[1-9](?:[\s.-]?\d{2}){4}"
-            r"|(?:\+\d{1,3}[\s.-]?)?\(?\d{2,4}\)?[\s.-]?\d{3,4}[\s.-]?\d{3,4}",
-        ),
-    },
-    # --- Connexion & infra ---
-    {
-        "label": "URL_PRIVEE",
-        "pattern": re.compile(
-            r"https?://(?:localhost|127\.0\.0\.1|10\.\d+\.\d+\.\d+|192\.168\.\d+\.\d+|172\.(?:1[6-9]|2\d|3[01])\.\d+\.\d+)\S*",
-        ),
-    },
-    {
-        "label": "ADRESSE_IP",
-        "pattern": re.compile(
-            r"\b(?:10\.\d{1,3}\.\d{1,3}\.\d{1,3}|192\.168\.\d{1,3}\.\d{1,3}|172\.(?:1[6-9]|2\d|3[01])\.\d{1,3}\.\d{1,3})\b",
-        ),
-    },
-    {
-        "label": "CHAINE_CONNEXION",
-        "pattern": re.compile(
-            r"(?i)(?:mongodb|postgres|mysql|redis|amqp|jdbc)://\S+",
-        ),
-    },
-    # --- Mots-clés de confidentialité ---
-    {
-        "label": "SALAIRE",
-        "pattern": re.compile(
-            r"(?i)(?:salaire|r[eé]mun[eé]ration|paie)\s*[:=]?\s*\d[\d\s.,]*\s*(?:€|euros?|EUR)?",
-        ),
-    },
-]
+# Règles regex : fichier versionné (cf. rules.json), chargé dès l'import pour qu'un fichier invalide bloque le démarrage
+rules.current()
+
+# Version des modèles NER et de l'identification de langue ; les règles regex s'y ajoutent (detector_version)
+_NER_VERSION = content_key(
+    *SPACY_MODELS.values(),
+    str(SPACY_LEAN),
+    *(" ".join(sorted(words)) for words in STOPWORDS.values()),
+    f"{LANG_SAMPLE_CHARS}:{LANG_SEGMENT_CHARS}:{LANG_MIN_HITS}",
+)[:16]
 
 # Niveaux de criticité par label
 SEVERITY = {
@@ -138,68 +94,201 @@ SEVERITY = {
     "EMAIL": "faible",
     "TELEPHONE": "faible",
     "NOM": "faible",
+    "ANALYSE_INCOMPLETE": "moyen",
 }
 
+# Entité signalant des règles regex interrompues par leur budget (sans position) :
+# la détection est incomplète, le verdict ne peut pas être "aucun"
+INCOMPLETE_LABEL = "ANALYSE_INCOMPLETE"
+
+
+def detector_version() -> str:
+    """Version du détecteur (règles actives + modèles NER) : entre dans les clés de cache de résultats."""
+    return content_key(_NER_VERSION, rules.current().digest)[:16]
+
 
 def detect_language(text: str) -> str:
-    try:
-        lang = detect(text)
-        return lang if lang in ("fr", "en") else "fr"
-    except Exception:
-        return "fr"
+    """Langue du début du texte (cf. langid), DEFAULT_LANG faute d'indice."""
+    with metrics.timed("langdetect"):
+        return identify(text) or DEFAULT_LANG
+
+
+def _language_runs(text: str, previous: str | None = None) -> list[tuple[int, int, str]]:
+    with metrics.timed("langdetect"):
+        return language_runs(text, previous)
+
+
+def _route_chunks(text: str, runs: list[tuple[int, int, str]]):
+    """Morceaux NER (langue, offset, texte) : chaque plage de langue est découpée à part."""
+    for start, end, lang in runs:
+        for offset, chunk in paragraph_chunks(text[start:end], SPACY_CHUNK_CHARS):
+            yield lang, start + offset, chunk
+
+
+def _iter_ner_entities(nlp, chunks: list[tuple[int, str]]):
+    """Exécute le NER sur des morceaux (offset, texte) via nlp.pipe, offsets ramenés au texte complet.
+
+    Génère (index du morceau, texte, label, début, fin) dans l'ordre des morceaux.
+    """
+    n_process = SPACY_N_PROCESS if len(chunks) > 1 else 1
+    docs = nlp.pipe((chunk for _, chunk in chunks), batch_size=SPACY_BATCH_SIZE, n_process=n_process)
+    for index, ((offset, _), doc) in enumerate(zip(chunks, docs)):
+        for ent in doc.ents:
+            if ent.label_ in SPACY_LABEL_MAP:
+                yield index, ent.text, SPACY_LABEL_MAP[ent.label_], offset + ent.start_char, offset + ent.end_char
+
+
+def _entity(text: str, label: str, start: int, end: int, severity: str | None = None) -> dict:
+    return {
+        "text": text,
+        "label": label,
+        "start": start,
+        "end": end,
+        "severity": severity or SEVERITY.get(label, "faible"),
+    }
+
+
+def _incomplete_entity(budget: RegexBudget) -> dict:
+    entity = _entity("", INCOMPLETE_LABEL, -1, -1)
+    entity["reason"] = f"Règles interrompues faute de temps : {', '.join(budget.exceeded)}"
+    return entity
+
 
+def is_incomplete(entities: list[dict]) -> bool:
+    """Vrai si la détection a été interrompue (cf. INCOMPLETE_LABEL)."""
+    return any(e.get("label") == INCOMPLETE_LABEL for e in entities)
 
-def detect_sensitive_data(text: str) -> list[dict]:
+
+def _detect_regex_chunk(text: str, offset: int, seen_spans: SpanIndex, entities: list[dict], budget: RegexBudget):
+    # Première règle enregistrée gagnante ; les chevauchements avec une détection retenue sont ignorés
+    # (les correspondances d'une règle arrivent triées : ajout par lot dans l'index)
+    with metrics.timed("regex"):
+        for _, group in groupby(rules.current().engine.finditer(text, budget), key=lambda item: item[0]["label"]):
+            group = [(rule, match, offset + match.start(), offset + match.end()) for rule, match in group]
+            for (rule, match, start, end), added in zip(group, seen_spans.add_sorted((s, e) for _, _, s, e in group)):
+                if added:
+                    entities.append(_entity(match.group(), rule["label"], start, end, rule.get("severity")))
+
+
+def _add_ner_entities(found, seen_spans: SpanIndex, entities: list[dict]):
+    # Entités d'un même texte, triées : ajout par lot dans l'index
+    found = list(found)
+    for (_, ent_text, label, start, end), added in zip(found, seen_spans.add_sorted((s, e) for *_, s, e in found)):
+        if added:
+            entities.append(_entity(ent_text, label, start, end))
+
+
+def _detect_ner(lang: str, chunks: list[tuple[int, str]], seen_spans: SpanIndex, entities: list[dict]):
+    with metrics.timed("ner"):
+        # Morceaux dans l'ordre du texte : entités triées
+        _add_ner_entities(_iter_ner_entities(get_nlp(lang), chunks), seen_spans, entities)
+
+
+def detect_sensitive_data(text: str, lang: str | None = None) -> list[dict]:
     """Détecte les données sensibles dans un texte (prévention fuite avant envoi email).
 
-    Retourne une liste de { text, label, start, end, severity }.
+    ``lang`` : langue du NER pour tout le texte si déjà connue ; sinon chaque
+    paragraphe est confié au modèle de sa langue.
+    Retourne une liste de { text, label, start, end, severity }, dont une
+    entité INCOMPLETE_LABEL si des règles ont été interrompues par leur budget.
+    """
+    entities = []
+    seen_spans = SpanIndex()
+
+    # 1. Détection regex (prioritaire, première règle enregistrée gagnante)
+    budget = RegexBudget()
+    _detect_regex_chunk(text, 0, seen_spans, entities, budget)
+
+    # 2. Détection NER spaCy (noms de personnes), par morceaux de paragraphes regroupés par langue
+    runs = [(0, len(text), lang)] if lang else _language_runs(text)
+    by_lang: dict[str, list[tuple[int, str]]] = {}
+    for chunk_lang, offset, chunk in _route_chunks(text, runs):
+        by_lang.setdefault(chunk_lang, []).append((offset, chunk))
+    for chunk_lang, chunks in by_lang.items():
+        _detect_ner(chunk_lang, chunks, seen_spans, entities)
+
+    if budget.incomplete:
+        entities.append(_incomplete_entity(budget))
+    entities.sort(key=lambda e: e["start"])
+    return entities
+
+
+def detect_sensitive_data_batch(texts: list[str]) -> list[list[dict]]:
+    """Détecte les données sensibles sur un lot de textes (résultats dans l'ordre des textes).
+
+    Regex texte par texte, puis NER en un seul nlp.pipe par langue pour tout
+    le lot (paragraphes de tous les textes regroupés par langue, SPACY_N_PROCESS
+    compris) : même résultat que detect_sensitive_data sur chaque texte.
+    """
+    results = [[] for _ in texts]
+    seen_spans = [SpanIndex() for _ in texts]
+    budgets = [RegexBudget() for _ in texts]
+    by_lang: dict[str, list[tuple[int, int, str]]] = {}
+    for i, text in enumerate(texts):
+        _detect_regex_chunk(text, 0, seen_spans[i], results[i], budgets[i])
+        for lang, offset, chunk in _route_chunks(text, _language_runs(text)):
+            by_lang.setdefault(lang, []).append((i, offset, chunk))
+
+    for lang, chunks in by_lang.items():
+        with metrics.timed("ner"):
+            found = _iter_ner_entities(get_nlp(lang), [(offset, chunk) for _, offset, chunk in chunks])
+            # Morceaux de chaque texte contigus et dans l'ordre : un groupe trié par texte
+            for i, group in groupby(found, key=lambda item: chunks[item[0]][0]):
+                _add_ner_entities(group, seen_spans[i], results[i])
+
+    for entities, budget in zip(results, budgets):
+        if budget.incomplete:
+            entities.append(_incomplete_entity(budget))
+        entities.sort(key=lambda e: e["start"])
+    return results
+
+
+def detect_sensitive_data_chunks(chunks) -> list[dict]:
+    """Détecte les données sensibles sur un flux de morceaux (offset, texte), cf. iter_extract.
+
+    Les règles regex s'appliquent à chaque morceau dès sa réception (une
+    correspondance ne franchit pas la limite d'un morceau) ; le NER traite
+    ensuite les morceaux par lots, chaque paragraphe dans sa langue (un
+    paragraphe sans indice prend la langue du précédent, d'un morceau à l'autre).
     """
     entities = []
-    seen_spans = set()
-
-    # 1. Détection regex (prioritaire)
-    for rule in REGEX_PATTERNS:
-        for match in rule["pattern"].finditer(text):
-            span = (match.start(), match.end())
-            # Vérifier qu'il n'y a pas de chevauchement
-            overlaps = any(
-                not (span[1] <= s[0] or span[0] >= s[1]) for s in seen_spans
-            )
-            if not overlaps:
-                seen_spans.add(span)
-                entities.append({
-                    "text": match.group(),
-                    "label": rule["label"],
-                    "start": match.start(),
-                    "end": match.end(),
-                    "severity": SEVERITY.get(rule["label"], "faible"),
-                })
-
-    # 2. Détection NER spaCy (noms de personnes)
-    lang = detect_language(text)
-    nlp = nlp_fr if lang == "fr" else nlp_en
-    doc = nlp(text)
-
-    for ent in doc.ents:
-        if ent.label_ in SPACY_LABEL_MAP:
-            span = (ent.start_char, ent.end_char)
-            overlaps = any(
-                not (span[1] <= s[0] or span[0] >= s[1]) for s in seen_spans
-            )
-            if not overlaps:
-                label = SPACY_LABEL_MAP[ent.label_]
-                seen_spans.add(span)
-                entities.append({
-                    "text": ent.text,
-                    "label": label,
-                    "start": ent.start_char,
-                    "end": ent.end_char,
-                    "severity": SEVERITY.get(label, "faible"),
-                })
+    seen_spans = SpanIndex()
+    by_lang: dict[str, list[tuple[int, str]]] = {}
+    previous = None
+    # Un seul budget regex pour tout le flux (une pièce jointe)
+    budget = RegexBudget()
+    for offset, chunk in chunks:
+        _detect_regex_chunk(chunk, offset, seen_spans, entities, budget)
+        runs = _language_runs(chunk, previous)
+        if runs:
+            previous = runs[-1][2]
+        for lang, o, c in _route_chunks(chunk, runs):
+            by_lang.setdefault(lang, []).append((offset + o, c))
 
+    for lang, ner_chunks in by_lang.items():
+        _detect_ner(lang, ner_chunks, seen_spans, entities)
+
+    if budget.incomplete:
+        entities.append(_incomplete_entity(budget))
     entities.sort(key=lambda e: e["start"])
     return entities
 
 
+def detect_file(filename: str, source) -> tuple[str, list[dict]]:
+    """Extrait et analyse un fichier en un passage : chaque morceau extrait est analysé au fil de l'eau.
+
+    Retourne (texte extrait, entités positionnées dans ce texte).
+    """
+    chunks = []
+
+    def consume():
+        for offset, chunk in iter_extract(filename, source):
+            chunks.append(chunk)
+            yield offset, chunk
+
+    entities = detect_sensitive_data_chunks(consume())
+    return "\n".join(chunks), entities
+
+
 # Alias pour compatibilité
 detect_pii = detect_sensitive_data
@@ -0,0 +1,131 @@
+"""Sessions de brouillon : ré-analyse incrémentale du texte pendant la saisie."""
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+
+DRAFT_MAX_SESSIONS = int(os.getenv("DRAFT_MAX_SESSIONS", "10000"))
+DRAFT_SESSION_TTL = float(os.getenv("DRAFT_SESSION_TTL", "1800"))
+# Marge (caractères) ré-analysée de part et d'autre d'une modification, étendue aux lignes entières
+DRAFT_MARGIN_CHARS = int(os.getenv("DRAFT_MARGIN_CHARS", "200"))
+# Pause de saisie (secondes) avant l'analyse complète (IA comprise) du brouillon
+DRAFT_LLM_DELAY = float(os.getenv("DRAFT_LLM_DELAY", "1.5"))
+# Volume modifié (caractères) au-delà duquel la langue du brouillon est re-détectée
+DRAFT_LANG_REDETECT_CHARS = int(os.getenv("DRAFT_LANG_REDETECT_CHARS", "500"))
+
+
+class DraftConflict(Exception):
+    """Session inconnue ou expirée, ou version de base périmée : le client doit renvoyer le texte complet."""
+
+
+class DraftSession:
+    """Texte courant d'un brouillon et ses détections, à jour de la dernière modification."""
+
+    def __init__(self, session_id: str, text: str, entities: list[dict], lang: str):
+        self.id = session_id
+        self.text = text
+        self.entities = entities
+        self.lang = lang
+        self.version = 0
+        # Caractères modifiés depuis la dernière détection de langue
+        self.changed_chars = 0
+        self.touched = time.monotonic()
+        # Modifications appliquées une à une (la détection de la fenêtre est asynchrone)
+        self.lock = asyncio.Lock()
+        # Analyse complète différée : tâche en attente et dernier résultat (version, résultat)
+        self.full_task: asyncio.Task | None = None
+        self.full_result: tuple[int, dict] | None = None
+
+    def prepare_edit(self, start: int, end: int, replacement: str) -> tuple[str, int, int, list[dict], list[dict]]:
+        """Calcule l'effet du remplacement de [start, end) par ``replacement``, sans l'appliquer.
+
+        Retourne (nouveau texte, début et fin de la fenêtre à ré-analyser,
+        entités conservées avant et après la fenêtre, offsets décalés).
+        """
+        if not 0 <= start <= end <= len(self.text):
+            raise ValueError(f"Intervalle de modification invalide : [{start}, {end})")
+        text = self.text[:start] + replacement + self.text[end:]
+        delta = len(replacement) - (end - start)
+
+        # Offsets dans le nouveau texte ; une entité touchée par la modification élargit la fenêtre
+        win_start = max(0, start - DRAFT_MARGIN_CHARS)
+        win_end = min(len(text), start + len(replacement) + DRAFT_MARGIN_CHARS)
+        shifted = []
+        for e in self.entities:
+            if e["end"] <= start:
+                shifted.append(e)
+            elif e["start"] >= end:
+                shifted.append({**e, "start": e["start"] + delta, "end": e["end"] + delta})
+            else:
+                win_start = min(win_start, e["start"])
+                win_end = max(win_end, min(e["end"] + delta, len(text)))
+
+        # Fenêtre étendue aux lignes entières et à toute entité qui chevauche ses bords
+        while True:
+            win_start = text.rfind("\n", 0, win_start) + 1
+            next_break = text.find("\n", win_end)
+            win_end = len(text) if next_break < 0 else next_break
+            crossing = [e for e in shifted
+                        if e["start"] < win_start < e["end"] or e["start"] < win_end < e["end"]]
+            if not crossing:
+                break
+            win_start = min(win_start, *(e["start"] for e in crossing))
+            win_end = max(win_end, *(e["end"] for e in crossing))
+
+        before = [e for e in shifted if e["end"] <= win_start]
+        after = [e for e in shifted if e["start"] >= win_end]
+        return text, win_start, win_end, before, after
+
+    def apply_edit(self, text: str, entities: list[dict]):
+        self.text = text
+        self.entities = entities
+        self.version += 1
+        self.touched = time.monotonic()
+
+
+class DraftStore:
+    """Sessions de brouillon en mémoire : LRU borné à DRAFT_MAX_SESSIONS, expiration après inactivité."""
+
+    def __init__(self, max_sessions: int = DRAFT_MAX_SESSIONS, ttl: float = DRAFT_SESSION_TTL):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions: OrderedDict[str, DraftSession] = OrderedDict()
+
+    def create(self, text: str, entities: list[dict], lang: str) -> DraftSession:
+        session = DraftSession(uuid.uuid4().hex, text, entities, lang)
+        self._sessions[session.id] = session
+        while len(self._sessions) > self.max_sessions:
+            _, evicted = self._sessions.popitem(last=False)
+            self._cancel(evicted)
+        return session
+
+    def get(self, session_id: str) -> DraftSession:
+        session = self._sessions.get(session_id)
+        if session is None or time.monotonic() - session.touched > self.ttl:
+            self.discard(session_id)
+            raise DraftConflict("Session de brouillon inconnue ou expirée.")
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def discard(self, session_id: str):
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            self._cancel(session)
+
+    def purge_expired(self):
+        now = time.monotonic()
+        for session_id in [s.id for s in self._sessions.values() if now - s.touched > self.ttl]:
+            self.discard(session_id)
+
+    def clear(self):
+        for session_id in list(self._sessions):
+            self.discard(session_id)
+
+    def stats(self) -> dict:
+        return {"sessions": len(self._sessions), "max_sessions": self.max_sessions}
+
+    @staticmethod
+    def _cancel(session: DraftSession):
+        if session.full_task is not None:
+            session.full_task.cancel()
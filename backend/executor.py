@@ -0,0 +1,202 @@
+import asyncio
+import functools
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+from backend import metrics
+
+# Configuration de la couche d'exécution
+CPU_EXECUTOR = os.getenv("CPU_EXECUTOR", "process")  # "process", "prefork" ou "thread"
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", str(os.cpu_count() or 1)))
+IO_WORKERS = int(os.getenv("IO_WORKERS", "16"))
+MAX_IN_FLIGHT = int(os.getenv("MAX_IN_FLIGHT", "8"))
+MAX_QUEUE = int(os.getenv("MAX_QUEUE", "32"))
+RETRY_AFTER = int(os.getenv("RETRY_AFTER", "5"))
+
+_cpu_pool: Executor | None = None
+_io_pool: ThreadPoolExecutor | None = None
+# Langues préchargées dans les workers du pool CPU (cf. start)
+_warmup_langs: list[str] = []
+# Mode "process" : workers dont l'initialisation (préchargement) est terminée
+_workers_ready = None
+
+
+class Saturated(Exception):
+    """Levée quand le nombre d'analyses en attente dépasse MAX_QUEUE."""
+
+    def __init__(self, retry_after: int = RETRY_AFTER):
+        super().__init__("Serveur saturé, réessayez plus tard.")
+        self.retry_after = retry_after
+
+
+class AdmissionLimiter:
+    """Limite les analyses simultanées et rejette au-delà d'une file bornée."""
+
+    def __init__(self, max_in_flight: int = MAX_IN_FLIGHT, max_queue: int = MAX_QUEUE):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+
+    async def acquire(self):
+        """Réserve une place d'analyse, ou lève Saturated si la file est pleine."""
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            raise Saturated()
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+
+    def release(self):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+        }
+
+
+def _init_worker(langs: list[str], ready):
+    """Initialisation d'un worker du pool "process" : préchargement des modèles de ``langs``."""
+    if langs:
+        from backend.detector import warm_up
+
+        warm_up(langs)
+    with ready.get_lock():
+        ready.value += 1
+
+
+def _noop():
+    return None
+
+
+def start(langs=None):
+    """Démarre le pool CPU au lancement de l'application et y précharge les modèles de ``langs``.
+
+    En mode "prefork", les modèles sont chargés par le fork-server puis
+    partagés en copy-on-write avec les workers qu'il forke (démarrage
+    synchrone). En mode "process", chaque worker les charge à
+    son initialisation (le processus serveur n'exécute pas la détection) ; le
+    chargement se fait en arrière-plan. En mode "thread", cf. warm_up_in_process.
+    """
+    global _warmup_langs
+    if _cpu_pool is not None:
+        return
+    _warmup_langs = list(langs or [])
+    pool = _get_cpu_pool()
+    if CPU_EXECUTOR == "process":
+        # Les workers sont lancés à la demande : une tâche par worker les démarre tous
+        for _ in range(CPU_WORKERS):
+            pool.submit(_noop)
+
+
+def _get_cpu_pool() -> Executor:
+    global _cpu_pool, _workers_ready
+    if _cpu_pool is None:
+        if CPU_EXECUTOR == "prefork":
+            from backend.prefork import PreforkPool
+
+            _cpu_pool = PreforkPool(CPU_WORKERS, _warmup_langs).start()
+        elif CPU_EXECUTOR == "process":
+            # "spawn" : un fork hériterait des verrous tenus par les threads du serveur (préchargement)
+            context = multiprocessing.get_context("spawn")
+            _workers_ready = context.Value("i", 0)
+            _cpu_pool = ProcessPoolExecutor(
+                max_workers=CPU_WORKERS,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(_warmup_langs, _workers_ready),
+            )
+        else:
+            _cpu_pool = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix="cpu")
+    return _cpu_pool
+
+
+def warm_up_in_process() -> bool:
+    """Mode "thread" : la détection s'exécute dans le processus serveur, qui précharge donc les modèles.
+
+    Retourne False (rien à faire) dans les autres modes.
+    """
+    if CPU_EXECUTOR != "thread" or not _warmup_langs:
+        return False
+    from backend.detector import warm_up
+
+    warm_up(_warmup_langs)
+    return True
+
+
+def models_ready() -> dict:
+    """Préchargement des modèles là où s'exécute la détection : {"ready", "workers_ready", "workers"}."""
+    if CPU_EXECUTOR == "thread":
+        from backend.detector import loaded_models
+
+        models = loaded_models()
+        ready = all(lang in models for lang in _warmup_langs)
+        return {"ready": ready, "workers_ready": CPU_WORKERS if ready else 0, "workers": CPU_WORKERS}
+    if CPU_EXECUTOR == "prefork":
+        # Modèles chargés dans le fork-server avant le premier fork (start synchrone)
+        count = CPU_WORKERS if _cpu_pool is not None else 0
+    else:
+        count = min(_workers_ready.value, CPU_WORKERS) if _workers_ready is not None else 0
+    return {"ready": count >= CPU_WORKERS, "workers_ready": count, "workers": CPU_WORKERS}
+
+
+def _get_io_pool() -> ThreadPoolExecutor:
+    global _io_pool
+    if _io_pool is None:
+        _io_pool = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="io")
+    return _io_pool
+
+
+async def run_cpu(fn, *args, **kwargs):
+    """Exécute une étape CPU (regex, spaCy, parsing, PDF) hors de la boucle d'événements.
+
+    Les durées d'étapes mesurées dans le worker sont ajoutées à la requête en cours.
+    """
+    loop = asyncio.get_running_loop()
+    result, timings = await loop.run_in_executor(
+        _get_cpu_pool(), functools.partial(metrics.call_timed, fn, *args, **kwargs)
+    )
+    metrics.merge(timings)
+    return result
+
+
+async def run_io(fn, *args, **kwargs):
+    """Exécute une étape I/O bloquante (appel HTTP synchrone) dans le pool de threads."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_io_pool(), functools.partial(fn, *args, **kwargs))
+
+
+def stats() -> dict:
+    """État du pool CPU (RSS par worker et profondeur de file en mode prefork)."""
+    result = {"cpu_executor": CPU_EXECUTOR, "cpu_workers": CPU_WORKERS}
+    if _cpu_pool is not None and hasattr(_cpu_pool, "stats"):
+        result.update(_cpu_pool.stats())
+    return result
+
+
+def shutdown():
+    """Arrête les pools d'exécution (appelé à l'arrêt de l'application)."""
+    global _cpu_pool, _io_pool, _workers_ready
+    if _cpu_pool is not None:
+        _cpu_pool.shutdown(wait=False, cancel_futures=True)
+        _cpu_pool = None
+    _workers_ready = None
+    if _io_pool is not None:
+        _io_pool.shutdown(wait=False, cancel_futures=True)
+        _io_pool = None
@@ -1,27 +1,110 @@
+import codecs
 import io
+import logging
+import math
+import multiprocessing
+import multiprocessing.util
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from importlib import metadata
 from PyPDF2 import PdfReader
 from docx import Document
 from openpyxl import load_workbook
 
+from backend import metrics
+from backend.cache import content_key
+from backend.executor import CPU_WORKERS
+
 
 SUPPORTED_EXTENSIONS = {".pdf", ".docx", ".xlsx", ".xls", ".txt"}
 
+# Limites d'extraction : au-delà, échec immédiat plutôt qu'une explosion mémoire
+EXTRACT_MAX_BYTES = int(os.getenv("EXTRACT_MAX_BYTES", str(50 * 1024 * 1024)))
+EXTRACT_MAX_PAGES = int(os.getenv("EXTRACT_MAX_PAGES", "1000"))
+EXTRACT_MAX_ROWS = int(os.getenv("EXTRACT_MAX_ROWS", "500000"))
+EXTRACT_MAX_CHARS = int(os.getenv("EXTRACT_MAX_CHARS", "20000000"))
+# Taille cible des morceaux produits par iter_extract
+EXTRACT_CHUNK_CHARS = int(os.getenv("EXTRACT_CHUNK_CHARS", "10000"))
 
-def extract_text(filename: str, content: bytes) -> str:
-    """Extrait le texte d'un fichier (PDF, Word, Excel, TXT)."""
-    ext = _get_extension(filename)
+# Extraction PDF parallèle : plages de pages réparties sur un pool de processus
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "50"))
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Budget de temps (secondes) d'extraction d'un PDF : les pages au-delà sont ignorées (0 : illimité)
+PDF_TIME_BUDGET = float(os.getenv("PDF_TIME_BUDGET", "60"))
+# Durée (secondes) à partir de laquelle une page est signalée comme lente
+PDF_SLOW_PAGE_SECONDS = float(os.getenv("PDF_SLOW_PAGE_SECONDS", "2"))
+
+logger = logging.getLogger(__name__)
+
+# Version de l'extraction (découpage + bibliothèques) : entre dans les clés du cache d'extraction
+PARSER_VERSION = content_key(
+    "1",
+    str(EXTRACT_CHUNK_CHARS),
+    *(metadata.version(package) for package in ("PyPDF2", "python-docx", "openpyxl")),
+)[:16]
+
+# Préfixe signalant des pages PDF non extraites (budget de temps dépassé)
+SKIPPED_PAGES_MARKER = "[Pages non analysées"
+
+_pdf_pool: ProcessPoolExecutor | None = None
+
+
+class ExtractionLimitError(ValueError):
+    """Levée quand un fichier dépasse une limite d'extraction (octets, pages, lignes, caractères)."""
+
+
+def extract_text(filename: str, source) -> str:
+    """Extrait le texte d'un fichier (PDF, Word, Excel, TXT).
+
+    ``source`` : contenu (bytes), chemin ou fichier binaire ouvert.
+    """
+    return "\n".join(chunk for _, chunk in iter_extract(filename, source))
 
+
+def iter_extract(filename: str, source):
+    """Extrait le texte par morceaux : génère des couples (offset, morceau).
+
+    Les morceaux regroupent pages, paragraphes ou lignes jusqu'à
+    EXTRACT_CHUNK_CHARS ; joints par "\\n", ils forment le texte de
+    extract_text et ``offset`` est leur position dans ce texte.
+    Le fichier est lu au fil de l'eau, sans être chargé en mémoire.
+    """
+    return metrics.timed_iter("extract", _iter_chunks(filename, source))
+
+
+def _iter_chunks(filename: str, source):
+    ext = _get_extension(filename)
     if ext == ".pdf":
-        return _extract_pdf(content)
+        parts = _iter_pdf
     elif ext == ".docx":
-        return _extract_docx(content)
+        parts = _iter_docx
     elif ext in (".xlsx", ".xls"):
-        return _extract_excel(content)
+        parts = _iter_excel
     elif ext == ".txt":
-        return content.decode("utf-8", errors="replace")
+        parts = _iter_txt
     else:
         raise ValueError(f"Format non supporté : {ext}")
 
+    with open_source(source) as fileobj:
+        offset = 0
+        group: list[str] = []
+        size = 0
+        for part in parts(fileobj):
+            if group and size + 1 + len(part) > EXTRACT_CHUNK_CHARS:
+                chunk = "\n".join(group)
+                yield offset, chunk
+                offset += len(chunk) + 1
+                group, size = [], 0
+            if offset + size + len(part) > EXTRACT_MAX_CHARS:
+                raise ExtractionLimitError(f"Texte extrait trop long (max {EXTRACT_MAX_CHARS} caractères)")
+            size += len(part) + (1 if group else 0)
+            group.append(part)
+        if group:
+            yield offset, "\n".join(group)
+
 
 def is_supported(filename: str) -> bool:
     return _get_extension(filename) in SUPPORTED_EXTENSIONS
@@ -31,40 +114,208 @@ def _get_extension(filename: str) -> str:
     return "." + filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
 
 
-def _extract_pdf(content: bytes) -> str:
-    reader = PdfReader(io.BytesIO(content))
-    texts = []
-    for page in reader.pages:
-        text = page.extract_text()
+@contextmanager
+def open_source(source):
+    """Ouvre une source (bytes, chemin ou fichier binaire) en vérifiant EXTRACT_MAX_BYTES."""
+    if isinstance(source, (bytes, bytearray)):
+        fileobj = io.BytesIO(source)
+    elif isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            _check_size(f)
+            yield f
+        return
+    else:
+        fileobj = source
+    _check_size(fileobj)
+    yield fileobj
+
+
+def _check_size(fileobj):
+    size = fileobj.seek(0, io.SEEK_END)
+    fileobj.seek(0)
+    if size > EXTRACT_MAX_BYTES:
+        raise ExtractionLimitError(f"Fichier trop volumineux (max {EXTRACT_MAX_BYTES} octets)")
+
+
+def _iter_reader_pages(reader: PdfReader, start: int, stop: int, deadline: float | None):
+    """Pages [start, stop) : génère (numéro, texte ou None si ignorée, durée d'extraction).
+
+    L'échéance est vérifiée avant chaque page : une page commencée n'est pas
+    interrompue (seule l'extraction parallèle abandonne une page lente).
+    """
+    for number in range(start, stop):
+        if deadline is not None and time.time() > deadline:
+            yield number, None, 0.0
+            continue
+        started = time.perf_counter()
+        text = reader.pages[number].extract_text()
+        yield number, text, time.perf_counter() - started
+
+
+def _extract_pdf_pages(source, start: int, stop: int, deadline: float | None) -> list[tuple[int, str | None, float]]:
+    # Exécutée dans un worker du pool PDF
+    reader = PdfReader(io.BytesIO(source) if isinstance(source, bytes) else source)
+    return list(_iter_reader_pages(reader, start, stop, deadline))
+
+
+def _pdf_workers() -> int:
+    """Taille du pool PDF : dans un worker du pool CPU, sa part des CPU (les autres workers extraient aussi)."""
+    if multiprocessing.parent_process() is None:
+        return PDF_WORKERS
+    return min(PDF_WORKERS, max(1, (os.cpu_count() or 1) // max(1, CPU_WORKERS)))
+
+
+def _get_pdf_pool() -> ProcessPoolExecutor:
+    global _pdf_pool
+    if _pdf_pool is None:
+        _pdf_pool = ProcessPoolExecutor(max_workers=_pdf_workers(), mp_context=multiprocessing.get_context("spawn"))
+        if multiprocessing.parent_process() is not None:
+            # Worker du pool CPU : shutdown_pdf_pool n'y est pas appelé par l'application
+            multiprocessing.util.Finalize(None, shutdown_pdf_pool, kwargs={"wait": True}, exitpriority=20)
+    return _pdf_pool
+
+
+def shutdown_pdf_pool(wait: bool = False):
+    global _pdf_pool
+    if _pdf_pool is not None:
+        _pdf_pool.shutdown(wait=wait, cancel_futures=True)
+        _pdf_pool = None
+
+
+def _recycle_pdf_pool():
+    """Abandonne le pool PDF (page bloquée ou pool cassé) : ses workers sont tués, le suivant est recréé à la demande."""
+    global _pdf_pool
+    pool, _pdf_pool = _pdf_pool, None
+    if pool is None:
+        return
+    # Pas d'API publique pour tuer les workers avant Python 3.14 (terminate_workers)
+    processes = list((pool._processes or {}).values())
+    pool.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        process.terminate()
+
+
+def _iter_pdf_pages(reader: PdfReader, fileobj, deadline: float | None):
+    page_count = len(reader.pages)
+    # Un processus démon (worker prefork) ne peut pas créer de processus : extraction en série
+    if page_count < PDF_PARALLEL_MIN_PAGES or _pdf_workers() < 2 or multiprocessing.current_process().daemon:
+        yield from _iter_reader_pages(reader, 0, page_count, deadline)
+        return
+    # Les workers relisent le fichier depuis son chemin, ou reçoivent son contenu
+    name = getattr(fileobj, "name", None)
+    if isinstance(name, str) and os.path.isfile(name):
+        source = name
+    else:
+        fileobj.seek(0)
+        source = fileobj.read()
+    # Plusieurs plages par worker pour équilibrer la charge ; réassemblage dans l'ordre
+    size = max(1, math.ceil(page_count / (_pdf_workers() * 4)))
+    pool = _get_pdf_pool()
+    ranges = [(start, min(start + size, page_count)) for start in range(0, page_count, size)]
+    futures = [pool.submit(_extract_pdf_pages, source, start, stop, deadline) for start, stop in ranges]
+    abandoned = False
+    try:
+        for future, (start, stop) in zip(futures, ranges):
+            timeout = None if deadline is None else max(0.0, deadline - time.time())
+            try:
+                pages = future.result(timeout=timeout)
+            except (TimeoutError, BrokenProcessPool):
+                # Plage non terminée à l'échéance : ses pages sont signalées ignorées
+                abandoned = True
+                pages = [(number, None, 0.0) for number in range(start, stop)]
+            yield from pages
+    finally:
+        for future in futures:
+            future.cancel()
+        if abandoned and _pdf_pool is pool:
+            # Un worker est encore bloqué sur une page lente
+            _recycle_pdf_pool()
+
+
+def _iter_pdf(fileobj):
+    reader = PdfReader(fileobj)
+    page_count = len(reader.pages)
+    if page_count > EXTRACT_MAX_PAGES:
+        raise ExtractionLimitError(f"PDF trop long : {page_count} pages (max {EXTRACT_MAX_PAGES})")
+    deadline = time.time() + PDF_TIME_BUDGET if PDF_TIME_BUDGET > 0 else None
+    skipped = []
+    for number, text, elapsed in _iter_pdf_pages(reader, fileobj, deadline):
+        if text is None:
+            skipped.append(number + 1)
+            continue
+        if elapsed >= PDF_SLOW_PAGE_SECONDS:
+            logger.warning("Page PDF %d lente : %.1f s", number + 1, elapsed)
         if text:
-            texts.append(text)
-    return "\n".join(texts)
+            yield text
+    if skipped:
+        logger.warning("PDF : %d page(s) ignorée(s), budget de %g s dépassé", len(skipped), PDF_TIME_BUDGET)
+        # Signalé dans le texte extrait : ces pages n'ont pas été analysées
+        yield f"{SKIPPED_PAGES_MARKER} (budget de temps dépassé) : {_page_ranges(skipped)}]"
+
 
+def _page_ranges(numbers: list[int]) -> str:
+    ranges = []
+    start = prev = numbers[0]
+    for number in numbers[1:] + [None]:
+        if number is not None and number == prev + 1:
+            prev = number
+            continue
+        ranges.append(str(start) if start == prev else f"{start}-{prev}")
+        if number is not None:
+            start = prev = number
+    return ", ".join(ranges)
 
-def _extract_docx(content: bytes) -> str:
-    doc = Document(io.BytesIO(content))
-    texts = []
+
+def _iter_docx(fileobj):
+    doc = Document(fileobj)
     for para in doc.paragraphs:
         if para.text.strip():
-            texts.append(para.text)
+            yield para.text
     # Aussi extraire les tableaux
+    rows = 0
     for table in doc.tables:
         for row in table.rows:
+            rows += 1
+            if rows > EXTRACT_MAX_ROWS:
+                raise ExtractionLimitError(f"Trop de lignes de tableau (max {EXTRACT_MAX_ROWS})")
             row_text = " | ".join(cell.text.strip() for cell in row.cells if cell.text.strip())
             if row_text:
-                texts.append(row_text)
-    return "\n".join(texts)
-
-
-def _extract_excel(content: bytes) -> str:
-    wb = load_workbook(io.BytesIO(content), read_only=True, data_only=True)
-    texts = []
-    for sheet_name in wb.sheetnames:
-        sheet = wb[sheet_name]
-        texts.append(f"[Feuille: {sheet_name}]")
-        for row in sheet.iter_rows(values_only=True):
-            row_values = [str(cell) for cell in row if cell is not None]
-            if row_values:
-                texts.append(" | ".join(row_values))
-    wb.close()
-    return "\n".join(texts)
+                yield row_text
+
+
+def _iter_excel(fileobj):
+    wb = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        # Dimensions déclarées par le classeur : échec avant toute lecture
+        declared = sum(wb[name].max_row or 0 for name in wb.sheetnames)
+        if declared > EXTRACT_MAX_ROWS:
+            raise ExtractionLimitError(f"Classeur trop grand : {declared} lignes (max {EXTRACT_MAX_ROWS})")
+        rows = 0
+        for sheet_name in wb.sheetnames:
+            sheet = wb[sheet_name]
+            yield f"[Feuille: {sheet_name}]"
+            for row in sheet.iter_rows(values_only=True):
+                rows += 1
+                if rows > EXTRACT_MAX_ROWS:
+                    raise ExtractionLimitError(f"Classeur trop grand (max {EXTRACT_MAX_ROWS} lignes)")
+                row_values = [str(cell) for cell in row if cell is not None]
+                if row_values:
+                    yield " | ".join(row_values)
+    finally:
+        wb.close()
+
+
+def _iter_txt(fileobj):
+    # Décodage incrémental par blocs ; chaque partie s'arrête avant un "\n"
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    pending = ""
+    while True:
+        block = fileobj.read(EXTRACT_CHUNK_CHARS)
+        pending += decoder.decode(block, final=not block)
+        if not block:
+            break
+        cut = pending.rfind("\n")
+        if cut >= 0:
+            yield pending[:cut]
+            pending = pending[cut + 1:]
+    yield pending
@@ -0,0 +1,93 @@
+"""Identification de langue rapide et déterministe, par paragraphe.
+
+Chaque paragraphe (ou morceau de LANG_SEGMENT_CHARS caractères au plus) est
+identifié sur ses LANG_SAMPLE_CHARS premiers caractères en comptant les mots
+outils propres à chaque langue. Un paragraphe sans indice suffisant (signature,
+liste de valeurs) prend la langue du paragraphe précédent.
+"""
+import os
+import re
+
+from backend.chunking import paragraph_chunks
+
+# Caractères examinés au début de chaque paragraphe (ou d'un texte) pour identifier sa langue
+LANG_SAMPLE_CHARS = int(os.getenv("LANG_SAMPLE_CHARS", "1000"))
+# Taille max d'un segment identifié : un long paragraphe (page, export) est redécoupé
+LANG_SEGMENT_CHARS = int(os.getenv("LANG_SEGMENT_CHARS", "5000"))
+# Mots outils à trouver dans l'échantillon pour décider de sa langue
+LANG_MIN_HITS = int(os.getenv("LANG_MIN_HITS", "2"))
+
+DEFAULT_LANG = "fr"
+
+STOPWORDS = {
+    "fr": frozenset("""
+        le la les l un une des du de d au aux et est sont sera été être avoir ai avez avons ont
+        pour que qu qui dans sur avec sans sous chez entre vers depuis avant après pas ne plus
+        vous nous je j il ils elle elles ce cette ces cet mais où par mon ma mes ton ta tes
+        votre vos notre nos son sa ses leur leurs lui y à ça tout tous toute toutes très
+        aussi comme donc car alors quand encore déjà peut doit faire fait voici voilà merci
+        bonjour cordialement madame monsieur en se si
+    """.split()),
+    "en": frozenset("""
+        the and is are was were be been being to of in for on with that this these those it
+        its you we they he she i my your our their his her have has had will would can could
+        should not but or at by from as an do does did please thanks regards hi hello here
+        there what which who when about if so all any just also into than then them up out
+        us dear sincerely kind best
+    """.split()),
+}
+
+# Mot outil → langue, pour les seuls mots propres à une langue ("on", "me"... sont ambigus)
+_WORD_LANG = {
+    word: lang
+    for lang, words in STOPWORDS.items()
+    for word in words
+    if not any(word in other for o, other in STOPWORDS.items() if o != lang)
+}
+_WORD = re.compile(r"[^\W\d_]+")
+_PARAGRAPH_BREAK = re.compile(r"\n[ \t\r\f\v]*\n")
+
+
+def identify(text: str) -> str | None:
+    """Langue du début du texte, ou None si l'échantillon ne contient pas assez d'indices."""
+    scores = dict.fromkeys(STOPWORDS, 0)
+    for word in _WORD.findall(text[:LANG_SAMPLE_CHARS].lower()):
+        lang = _WORD_LANG.get(word)
+        if lang is not None:
+            scores[lang] += 1
+    (best, score), *others = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    if score < LANG_MIN_HITS or any(other == score for _, other in others):
+        return None
+    return best
+
+
+def _segments(text: str):
+    """Paragraphes (start, end) couvrant tout le texte, les plus longs redécoupés."""
+    start = 0
+    bounds = [m.end() for m in _PARAGRAPH_BREAK.finditer(text)]
+    for end in [*bounds, len(text)]:
+        if end - start <= LANG_SEGMENT_CHARS:
+            if end > start:
+                yield start, end
+        else:
+            for offset, chunk in paragraph_chunks(text[start:end], LANG_SEGMENT_CHARS):
+                yield start + offset, start + offset + len(chunk)
+        start = end
+
+
+def language_runs(text: str, previous: str | None = None) -> list[tuple[int, int, str]]:
+    """Découpe le texte en plages (start, end, langue) contiguës de même langue.
+
+    ``previous`` : langue de ce qui précède le texte (morceau précédent d'un
+    flux), reprise par les premiers paragraphes sans indice suffisant.
+    """
+    labelled = [(start, end, identify(text[start:min(end, start + LANG_SAMPLE_CHARS)])) for start, end in _segments(text)]
+    current = previous or next((lang for _, _, lang in labelled if lang), DEFAULT_LANG)
+    runs = []
+    for start, end, lang in labelled:
+        current = lang or current
+        if runs and runs[-1][2] == current:
+            runs[-1] = (runs[-1][0], end, current)
+        else:
+            runs.append((start, end, current))
+    return runs
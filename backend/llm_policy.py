@@ -0,0 +1,74 @@
+import logging
+import os
+import threading
+from collections import Counter
+from typing import NamedTuple
+
+logger = logging.getLogger(__name__)
+
+# Rang des sévérités (les deux graphies de "élevé" sont utilisées dans le projet)
+SEVERITY_RANK = {"faible": 0, "moyen": 1, "eleve": 2, "élevé": 2, "critique": 3}
+
+# Ne pas appeler le LLM si les règles ont déjà trouvé une donnée de cette gravité ("" : désactivé)
+LLM_SKIP_MIN_SEVERITY = os.getenv("LLM_SKIP_MIN_SEVERITY", "critique")
+# Ne pas appeler le LLM sur un texte plus court que N caractères sans mot-clé ni détection (0 : désactivé)
+LLM_SKIP_MAX_CHARS = int(os.getenv("LLM_SKIP_MAX_CHARS", "200"))
+LLM_KEYWORDS = [
+    k.strip().lower()
+    for k in os.getenv(
+        "LLM_KEYWORDS",
+        "confidentiel,secret,interne,privé,salaire,contrat,virement,rib,iban,adresse,"
+        "médical,santé,juridique,code,accès,compte,crypto,wallet,seed,clé,confidential,private",
+    ).split(",")
+    if k.strip()
+]
+
+
+class PolicyDecision(NamedTuple):
+    call_llm: bool
+    rule: str
+    reason: str
+
+
+_counts: Counter = Counter()
+_counts_lock = threading.Lock()
+
+
+def _decide(text: str, regex_entities: list[dict]) -> PolicyDecision:
+    threshold = SEVERITY_RANK.get(LLM_SKIP_MIN_SEVERITY)
+    if threshold is not None and regex_entities:
+        worst = max(regex_entities, key=lambda e: SEVERITY_RANK.get(e.get("severity", "faible"), 0))
+        severity = worst.get("severity", "faible")
+        if SEVERITY_RANK.get(severity, 0) >= threshold:
+            return PolicyDecision(
+                False, "severity",
+                f"{worst['label']} de gravité {severity} déjà détecté par les règles",
+            )
+
+    if LLM_SKIP_MAX_CHARS and len(text) < LLM_SKIP_MAX_CHARS and not regex_entities:
+        lowered = text.lower()
+        if not any(keyword in lowered for keyword in LLM_KEYWORDS):
+            return PolicyDecision(
+                False, "short_text",
+                f"texte court ({len(text)} caractères) sans mot-clé ni détection",
+            )
+
+    return PolicyDecision(True, "ambiguous", "aucune règle ne permet de conclure sans le LLM")
+
+
+def decide(text: str, regex_entities: list[dict]) -> PolicyDecision:
+    """Décide si l'analyse LLM est nécessaire au vu des détections regex/NER."""
+    decision = _decide(text, regex_entities)
+    with _counts_lock:
+        _counts[decision.rule] += 1
+    logger.info(
+        "Politique LLM : %s [%s] %s",
+        "appel" if decision.call_llm else "ignoré", decision.rule, decision.reason,
+    )
+    return decision
+
+
+def stats() -> dict:
+    """Nombre de décisions par règle depuis le démarrage."""
+    with _counts_lock:
+        return dict(_counts)
@@ -0,0 +1,143 @@
+import bisect
+import re
+from collections import deque
+
+from backend.regex_engine import _fold
+
+_WHITESPACE = re.compile(r"\s+")
+_WHITESPACE_RUN = re.compile(r"\s{2,}")
+
+# En deçà, une chaîne renvoyée par l'IA n'est pas localisée (trop de faux positifs)
+MIN_NEEDLE_CHARS = 2
+
+
+def normalize_needle(text: str) -> str:
+    """Forme de recherche d'une chaîne : casse repliée, blancs compactés."""
+    return _WHITESPACE.sub(" ", _fold(text)).strip()
+
+
+def _is_word(char: str) -> bool:
+    return char.isalnum() or char == "_"
+
+
+class NormalizedText:
+    """Texte à casse repliée et blancs compactés, avec retour aux offsets d'origine.
+
+    Chaque suite de blancs devient une espace ; les ancres mémorisent le
+    décalage cumulé à partir de chaque position normalisée.
+    """
+
+    def __init__(self, text: str):
+        self.source = text
+        folded = _fold(text)
+        self.text = _WHITESPACE.sub(" ", folded)
+        self._anchors = [0]
+        self._shifts = [0]
+        shift = 0
+        for match in _WHITESPACE_RUN.finditer(folded):
+            shift += match.end() - match.start() - 1
+            self._anchors.append(match.end() - shift)
+            self._shifts.append(shift)
+
+    def original(self, pos: int) -> int:
+        i = bisect.bisect_right(self._anchors, pos) - 1
+        return pos + self._shifts[i]
+
+    def span(self, start: int, end: int) -> tuple[int, int]:
+        """Intervalle d'origine d'un intervalle normalisé (non vide, sans blanc en bordure)."""
+        return self.original(start), self.original(end - 1) + 1
+
+    def bounded(self, start: int, end: int) -> bool:
+        """Vrai si [start, end) ne coupe pas un mot à ses extrémités."""
+        text = self.text
+        if start > 0 and _is_word(text[start]) and _is_word(text[start - 1]):
+            return False
+        if end < len(text) and _is_word(text[end - 1]) and _is_word(text[end]):
+            return False
+        return True
+
+
+class Locator:
+    """Localise toutes les occurrences d'un ensemble de chaînes en un seul passage.
+
+    Automate d'Aho-Corasick compilé en table de transitions complète : le
+    texte est parcouru une fois quel que soit le nombre de chaînes. Les
+    correspondances sont insensibles à la casse et aux blancs, et ne coupent
+    pas de mot. Pour chaque chaîne, les occurrences retenues sont disjointes
+    (la première gagne), comme avec des ``str.find`` successifs.
+    """
+
+    def __init__(self, needles: list[str]):
+        self.needles = [normalize_needle(needle) for needle in needles]
+        self._keys = sorted({n for n in self.needles if len(n) >= MIN_NEEDLE_CHARS})
+
+        goto: list[dict[str, int]] = [{}]
+        outputs: list[tuple[str, ...]] = [()]
+        for key in self._keys:
+            state = 0
+            for char in key:
+                nxt = goto[state].get(char)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][char] = nxt
+                    goto.append({})
+                    outputs.append(())
+                state = nxt
+            outputs[state] = (key,)
+
+        # Parcours en largeur : liens d'échec puis transitions complètes (automate déterministe)
+        fail = [0] * len(goto)
+        delta: list[dict[str, int]] = [{}] * len(goto)
+        delta[0] = dict(goto[0])
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            delta[state] = {**delta[fail[state]], **goto[state]}
+            outputs[state] = outputs[state] + outputs[fail[state]]
+            for char, nxt in goto[state].items():
+                fail[nxt] = delta[fail[state]].get(char, 0)
+                queue.append(nxt)
+        self._delta = delta
+        self._outputs = outputs
+
+    def _scan(self, normalized: NormalizedText) -> dict[str, list[tuple[int, int]]]:
+        found = {key: [] for key in self._keys}
+        last_end = dict.fromkeys(self._keys, 0)
+        delta, outputs = self._delta, self._outputs
+        state = 0
+        for end, char in enumerate(normalized.text, 1):
+            state = delta[state].get(char, 0)
+            if outputs[state]:
+                for key in outputs[state]:
+                    start = end - len(key)
+                    if start >= last_end[key] and normalized.bounded(start, end):
+                        found[key].append((start, end))
+                        last_end[key] = end
+        return found
+
+    def _find(self, normalized: NormalizedText, key: str) -> list[tuple[int, int]]:
+        # Une seule chaîne : str.find (boucle en C) plutôt que l'automate
+        found = []
+        pos = normalized.text.find(key)
+        while pos >= 0:
+            end = pos + len(key)
+            if normalized.bounded(pos, end):
+                found.append((pos, end))
+                pos = normalized.text.find(key, end)
+            else:
+                pos = normalized.text.find(key, pos + 1)
+        return found
+
+    def locate(self, text: "str | NormalizedText") -> list[list[tuple[int, int]]]:
+        """Occurrences (offsets d'origine) de chaque chaîne, dans l'ordre des chaînes."""
+        normalized = text if isinstance(text, NormalizedText) else NormalizedText(text)
+        if len(self._keys) == 1:
+            found = {self._keys[0]: self._find(normalized, self._keys[0])}
+        elif self._keys:
+            found = self._scan(normalized)
+        else:
+            found = {}
+        return [
+            [normalized.span(start, end) for start, end in found.get(needle, ())]
+            for needle in self.needles
+        ]
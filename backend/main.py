@@ -1,26 +1,184 @@
+import asyncio
+import hashlib
+import json
+import logging
 import os
-from fastapi import FastAPI, File, UploadFile, Form
+import shutil
+import tempfile
+import time
+from urllib.parse import quote
+from contextlib import asynccontextmanager, nullcontext
+from fastapi import FastAPI, File, HTTPException, UploadFile, Form, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import Response
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional
 
-from backend.detector import detect_sensitive_data
-from backend.anonymizer import anonymize
+from backend.detector import (
+    LANG_SAMPLE_CHARS,
+    detect_file,
+    detect_language,
+    detect_sensitive_data,
+    detect_sensitive_data_batch,
+    detector_version,
+    INCOMPLETE_LABEL,
+    is_incomplete,
+)
+from backend.anonymizer import FILE_ANONYMIZERS, UnsupportedContentError, anonymize, anonymize_file
 from backend.report import generate_report, assess_risk
-from backend.ai_analyzer import analyze_with_ai, merge_detections
-from backend.file_parser import extract_text, is_supported
+from backend.ai_analyzer import (
+    ai_model_id,
+    analyze_with_ai,
+    DetectionMerger,
+    batching_stats,
+    check_ai_backend,
+    close_clients,
+    merge_detections,
+    start_clients,
+    stream_ai_analysis,
+)
+from backend.cache import DiskCache, ResultCache, TieredCache, content_key
+from backend.drafts import DRAFT_LANG_REDETECT_CHARS, DRAFT_LLM_DELAY, DraftConflict, DraftStore
+from backend.locator import NormalizedText
+from backend.sheet_scanner import scan_workbook
+from backend import llm_policy
+from backend.file_parser import (
+    EXTRACT_MAX_BYTES,
+    PARSER_VERSION,
+    SKIPPED_PAGES_MARKER,
+    ExtractionLimitError,
+    is_supported,
+    shutdown_pdf_pool,
+)
+from backend import executor, metrics, rules
+from backend.executor import AdmissionLimiter, Saturated, run_cpu, run_io
 
-app = FastAPI(title="SecureMail - Anti-fuite de données")
+
+logger = logging.getLogger(__name__)
+
+# Cache des résultats d'analyse partagé par /analyze, /anonymize et /report
+ANALYSIS_CACHE_MAX_BYTES = int(os.getenv("ANALYSIS_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+ANALYSIS_CACHE_TTL = float(os.getenv("ANALYSIS_CACHE_TTL", "300"))
+analysis_cache = ResultCache(ANALYSIS_CACHE_MAX_BYTES, ANALYSIS_CACHE_TTL)
+
+# Cache d'extraction des pièces jointes (texte + entités), par empreinte SHA-256 du fichier
+EXTRACTION_CACHE_MEMORY_BYTES = int(os.getenv("EXTRACTION_CACHE_MEMORY_BYTES", str(64 * 1024 * 1024)))
+EXTRACTION_CACHE_TTL = float(os.getenv("EXTRACTION_CACHE_TTL", "3600"))
+EXTRACTION_CACHE_DIR = os.getenv("EXTRACTION_CACHE_DIR", "")  # vide : pas de stockage disque
+EXTRACTION_CACHE_MAX_BYTES = int(os.getenv("EXTRACTION_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+EXTRACTION_CACHE_KEY = os.getenv("EXTRACTION_CACHE_KEY", "")  # clé Fernet, obligatoire pour le stockage disque
+extraction_cache = TieredCache(
+    ResultCache(EXTRACTION_CACHE_MEMORY_BYTES, EXTRACTION_CACHE_TTL),
+    DiskCache(EXTRACTION_CACHE_DIR, EXTRACTION_CACHE_MAX_BYTES, EXTRACTION_CACHE_KEY, EXTRACTION_CACHE_TTL)
+    if EXTRACTION_CACHE_DIR else None,
+)
+
+# Analyse par lots (/analyze/batch)
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+BATCH_MAX_BYTES = int(os.getenv("BATCH_MAX_BYTES", str(20 * 1024 * 1024)))
+BATCH_CPU_CHUNK = int(os.getenv("BATCH_CPU_CHUNK", "64"))  # emails par tâche de détection
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "4"))
+
+# Brouillons analysés pendant la saisie (/draft)
+drafts = DraftStore()
+
+# Langues dont les modèles sont préchargés au démarrage ("" pour un chargement paresseux pur)
+WARMUP_LANGS = [lang for lang in os.getenv("WARMUP_LANGS", "fr,en").split(",") if lang]
+
+
+async def _purge_cache_periodically():
+    # Les entrées expirées sont retirées même sans trafic
+    while True:
+        await asyncio.sleep(1)
+        analysis_cache.purge_expired()
+        extraction_cache.memory.purge_expired()
+        drafts.purge_expired()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Préchargement là où s'exécute la détection : fork-server avant fork (prefork, synchrone),
+    # initialisation des workers (process) ou processus serveur (thread)
+    executor.start(WARMUP_LANGS)
+    # Préchargement en arrière-plan : /healthz répond pendant le chargement, /readyz non
+    warmup = asyncio.create_task(asyncio.to_thread(executor.warm_up_in_process))
+    purge = asyncio.create_task(_purge_cache_periodically())
+    await start_clients()
+    yield
+    await close_clients()
+    purge.cancel()
+    drafts.clear()
+    analysis_cache.clear()
+    extraction_cache.clear()
+    warmup.cancel()
+    executor.shutdown()
+    shutdown_pdf_pool()
+
+
+app = FastAPI(title="SecureMail - Anti-fuite de données", lifespan=lifespan)
+limiter = AdmissionLimiter()
+
+
+@app.exception_handler(Saturated)
+async def saturated_handler(request: Request, exc: Saturated):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+@app.exception_handler(ExtractionLimitError)
+async def extraction_limit_handler(request: Request, exc: ExtractionLimitError):
+    return JSONResponse(status_code=413, content={"detail": str(exc)})
+
+
+@app.exception_handler(DraftConflict)
+async def draft_conflict_handler(request: Request, exc: DraftConflict):
+    return JSONResponse(status_code=409, content={"detail": str(exc)})
 
 AI_BACKEND = os.getenv("AI_BACKEND", "ollama")
 AI_ENABLED = AI_BACKEND == "ollama" or bool(os.getenv("ANTHROPIC_API_KEY"))
 
+# Durées par étape : histogrammes Prometheus (/metrics) et en-tête Server-Timing
+app.add_middleware(metrics.TimingMiddleware, ai_backend=AI_BACKEND if AI_ENABLED else "none")
+
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness : le processus répond."""
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness : modèles préchargés dans les workers de détection et backend LLM joignable."""
+    models = executor.models_ready()
+    ai_ready = await check_ai_backend() if AI_ENABLED else True
+    ready = models["ready"] and ai_ready
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "ready": ready,
+            "models": WARMUP_LANGS,
+            "workers_ready": models["workers_ready"],
+            "workers": models["workers"],
+            "ai_backend": ai_ready,
+        },
+    )
+
 
 class TextRequest(BaseModel):
     text: str
 
 
+class DraftEditRequest(BaseModel):
+    version: int
+    start: int
+    end: int
+    text: str = ""
+
+
 class SensitiveEntity(BaseModel):
     text: str
     label: str
@@ -49,24 +207,173 @@ class AnonymizeResponse(BaseModel):
     risk_summary: str
 
 
-def full_analysis(text: str) -> dict:
-    """Lance l'analyse complète : regex + IA."""
-    regex_entities = detect_sensitive_data(text)
-    for e in regex_entities:
+def _analysis_key(text: str) -> str:
+    return content_key(detector_version(), ai_model_id() if AI_ENABLED else "regex", text)
+
+
+def _file_digest(fileobj) -> str:
+    fileobj.seek(0)
+    return hashlib.file_digest(fileobj, "sha256").hexdigest()
+
+
+def _spool_to_disk(fileobj) -> str:
+    """Copie l'upload (SpooledTemporaryFile) vers un fichier nommé, lisible par les workers CPU."""
+    fileobj.seek(0)
+    with tempfile.NamedTemporaryFile(prefix="securemail-", delete=False) as tmp:
+        shutil.copyfileobj(fileobj, tmp, 1024 * 1024)
+    return tmp.name
+
+
+async def _extract_attachment(file: UploadFile) -> tuple[str, list[dict]]:
+    """Texte et entités d'une pièce jointe ; un fichier déjà vu (même empreinte) n'est pas relu."""
+    with metrics.timed("upload"):
+        digest = await run_io(_file_digest, file.file)
+    key = content_key(PARSER_VERSION, detector_version(), os.path.splitext(file.filename)[1].lower(), digest)
+    cached = await run_io(extraction_cache.get, key)
+    if cached is not None:
+        return cached["text"], cached["entities"]
+
+    with metrics.timed("upload"):
+        path = await run_io(_spool_to_disk, file.file)
+    try:
+        attachment_text, attachment_entities = await run_cpu(detect_file, file.filename, path)
+    finally:
+        os.unlink(path)
+    # Extraction ou détection incomplète (pages PDF ignorées, budget regex) : pas de mise en cache
+    if SKIPPED_PAGES_MARKER not in attachment_text and not is_incomplete(attachment_entities):
+        await run_io(extraction_cache.put, key, {"text": attachment_text, "entities": attachment_entities})
+    return attachment_text, attachment_entities
+
+
+async def _read_attachment(text: str, file: Optional[UploadFile]) -> tuple[str, str, str, list[dict] | None]:
+    """Retourne (texte combiné, nom de la pièce jointe, texte extrait, entités regex/NER).
+
+    Avec une pièce jointe, l'extraction et la détection se font en un passage
+    sur le fichier, sans le charger en mémoire ; les entités (positionnées
+    dans le texte combiné) sont alors retournées, None sinon.
+    """
+    combined_text = text
+    attachment_name = ""
+    attachment_text = ""
+    regex_entities = None
+
+    if file and file.filename:
+        attachment_name = file.filename
+        if is_supported(file.filename):
+            metrics.set_file_type(os.path.splitext(file.filename)[1].lower())
+            if file.size is not None and file.size > EXTRACT_MAX_BYTES:
+                raise ExtractionLimitError(f"Fichier trop volumineux (max {EXTRACT_MAX_BYTES} octets)")
+            attachment_text, attachment_entities = await _extract_attachment(file)
+            header = f"{text}\n\n[PIÈCE JOINTE: {file.filename}]\n"
+            combined_text = header + attachment_text
+            regex_entities = await _detect_regex(text)
+            for e in _with_defaults(attachment_entities):
+                if e["start"] >= 0:
+                    e["start"] += len(header)
+                    e["end"] += len(header)
+                regex_entities.append(e)
+        else:
+            attachment_text = f"Format non supporté : {file.filename}"
+
+    return combined_text, attachment_name, attachment_text, regex_entities
+
+
+async def full_analysis(
+    text: str, regex_entities: list[dict] | None = None, llm_slots: asyncio.Semaphore | None = None
+) -> dict:
+    """Lance l'analyse complète : regex + IA (résultat mis en cache par contenu).
+
+    ``llm_slots`` borne, si fourni, le nombre d'appels LLM simultanés.
+    """
+    key = _analysis_key(text)
+    cached = analysis_cache.get(key)
+    if cached is not None:
+        return cached
+
+    result = await _run_analysis(text, regex_entities, llm_slots)
+    if _cacheable(result):
+        analysis_cache.put(key, result)
+    return result
+
+
+def _cacheable(result: dict) -> bool:
+    # Erreur du LLM ou détection interrompue (budget regex) : nouvelle tentative à la requête suivante
+    return result["risk_level"] != "erreur" and not is_incomplete(result["entities"])
+
+
+def _flag_incomplete(result: dict) -> dict:
+    """Détection regex interrompue : le verdict ne peut pas être "aucun", même si le LLM n'a rien vu."""
+    if result["risk_level"] == "aucun" and is_incomplete(result["entities"]):
+        result["risk_level"] = assess_risk([e for e in result["entities"] if e["label"] == INCOMPLETE_LABEL])
+        result["risk_summary"] = "Analyse incomplète (règles interrompues faute de temps). " + result.get("risk_summary", "")
+    return result
+
+
+def _with_defaults(entities: list[dict]) -> list[dict]:
+    for e in entities:
         e.setdefault("reason", "")
         e.setdefault("source", "regex")
+    return entities
+
+
+async def _detect_regex(text: str) -> list[dict]:
+    return _with_defaults(await run_cpu(detect_sensitive_data, text))
+
+
+async def _run_analysis(
+    text: str, regex_entities: list[dict] | None = None, llm_slots: asyncio.Semaphore | None = None
+) -> dict:
+    if regex_entities is None:
+        regex_entities = await _detect_regex(text)
 
     if AI_ENABLED:
-        ai_result = analyze_with_ai(text)
-        merged = merge_detections(regex_entities, ai_result)
-        return merged
+        decision = llm_policy.decide(text, regex_entities)
+        if decision.call_llm:
+            async with llm_slots or nullcontext():
+                with metrics.timed("llm"):
+                    ai_result = await analyze_with_ai(text)
+            # Localisation des entités IA dans le texte : un passage linéaire, hors boucle d'événements
+            with metrics.timed("merge"):
+                result = _flag_incomplete(await run_cpu(merge_detections, regex_entities, ai_result, text))
+        else:
+            result = {
+                "entities": regex_entities,
+                "risk_level": assess_risk(regex_entities),
+                "risk_summary": f"Analyse IA non nécessaire : {decision.reason}.",
+            }
     else:
         risk = assess_risk(regex_entities)
-        return {
+        result = {
             "entities": regex_entities,
             "risk_level": risk,
             "risk_summary": "Analyse par règles uniquement (clé API Claude non configurée).",
         }
+    metrics.count_entities(result["entities"])
+    return result
+
+
+@app.get("/stats")
+async def stats():
+    """Charge courante : admission, pool CPU (RSS des workers, file), cache, décisions LLM."""
+    return {
+        "admission": limiter.stats(),
+        "executor": executor.stats(),
+        "analysis_cache": analysis_cache.stats(),
+        "extraction_cache": extraction_cache.stats(),
+        "llm_policy": llm_policy.stats(),
+        "llm_batching": batching_stats(),
+        "drafts": drafts.stats(),
+        "rules": rules.current().stats(),
+    }
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Métriques Prometheus : durées par étape, erreurs LLM, détections par type, charge."""
+    metrics.IN_FLIGHT.set(limiter.in_flight)
+    metrics.WAITING.set(limiter.waiting)
+    content, media_type = metrics.exposition()
+    return Response(content=content, media_type=media_type)
 
 
 @app.post("/analyze")
@@ -74,31 +381,375 @@ async def analyze(
     text: str = Form(""),
     file: Optional[UploadFile] = File(None),
 ):
-    combined_text = text
-    attachment_name = ""
-    attachment_text = ""
+    async with limiter:
+        # Extraire le texte de la pièce jointe si présente
+        combined_text, attachment_name, attachment_text, regex_entities = await _read_attachment(text, file)
+        result = await full_analysis(combined_text, regex_entities)
 
-    # Extraire le texte de la pièce jointe si présente
-    if file and file.filename:
-        attachment_name = file.filename
-        if is_supported(file.filename):
-            content = await file.read()
-            attachment_text = extract_text(file.filename, content)
-            combined_text = f"{text}\n\n[PIÈCE JOINTE: {file.filename}]\n{attachment_text}"
+        return {
+            "entities": result["entities"],
+            "count": len(result["entities"]),
+            "risk_level": result["risk_level"],
+            "risk_summary": result.get("risk_summary", ""),
+            "ai_enabled": AI_ENABLED,
+            "attachment_name": attachment_name,
+            "attachment_text": attachment_text,
+        }
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+CRITICAL_RISK = "CRITIQUE - NE PAS ENVOYER"
+
+
+def _entity_key(entity: dict) -> tuple:
+    if entity.get("start", -1) >= 0:
+        return entity["start"], entity["end"], entity["label"]
+    return entity.get("text", "").lower().strip(), entity["label"]
+
+
+class AdmittedStreamingResponse(StreamingResponse):
+    """Réponse en flux qui libère la place d'admission (cf. AdmissionLimiter) à sa fin.
+
+    La libération a lieu même si le client se déconnecte avant le début du
+    flux, cas où le générateur n'est jamais exécuté.
+    """
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            limiter.release()
+
+
+async def _analysis_events(
+    text: str, attachment_name: str, attachment_text: str, regex_entities: list[dict] | None = None
+):
+    """Événements SSE : entités regex/NER, entités IA au fil de l'eau, puis verdict."""
+    yield _sse("attachment", {"attachment_name": attachment_name, "attachment_text": attachment_text})
+
+    key = _analysis_key(text)
+    cached = analysis_cache.get(key)
+    if cached is not None:
+        yield _sse("entities", {"entities": cached["entities"]})
+        yield _sse("verdict", {
+            "risk_level": cached["risk_level"],
+            "risk_summary": cached.get("risk_summary", ""),
+            "final": True,
+        })
+        yield _sse("done", {"count": len(cached["entities"])})
+        return
+
+    if regex_entities is None:
+        regex_entities = await _detect_regex(text)
+    yield _sse("entities", {"entities": regex_entities})
+
+    # Verdict déjà acquis par les règles (ex. donnée critique) : pas d'appel LLM
+    decision = llm_policy.decide(text, regex_entities) if AI_ENABLED else None
+    if decision is None or not decision.call_llm:
+        summary = f"Analyse IA non nécessaire : {decision.reason}." if decision else \
+            "Analyse par règles uniquement (clé API Claude non configurée)."
+        result = {
+            "entities": regex_entities,
+            "risk_level": assess_risk(regex_entities),
+            "risk_summary": summary,
+        }
+        if _cacheable(result):
+            analysis_cache.put(key, result)
+        yield _sse("verdict", {
+            "risk_level": result["risk_level"],
+            "risk_summary": summary,
+            "final": True,
+        })
+        yield _sse("done", {"count": len(regex_entities)})
+        return
+
+    # Texte normalisé et index des détections construits une fois : fusion incrémentale peu coûteuse
+    normalized = await run_io(NormalizedText, text)
+    merger = DetectionMerger(regex_entities, normalized)
+    entities = merger.entities
+    ai_result = None
+    ai_stream = stream_ai_analysis(text)
+    llm_started = time.perf_counter()
+    try:
+        async for kind, payload in ai_stream:
+            if kind == "result":
+                ai_result = payload
+                break
+            for entity in merger.add([payload]):
+                yield _sse("entity", entity)
+            if payload.get("severity") == "critique":
+                # Verdict anticipé : la fermeture du flux interrompt la génération
+                yield _sse("verdict", {
+                    "risk_level": CRITICAL_RISK,
+                    "risk_summary": f"Donnée critique détectée par l'IA : {payload.get('label', 'SENSIBLE')}.",
+                    "final": True,
+                })
+                yield _sse("done", {"count": len(entities)})
+                return
+    finally:
+        await ai_stream.aclose()
+        metrics.record("llm", time.perf_counter() - llm_started)
+
+    with metrics.timed("merge"):
+        result = _flag_incomplete(await run_cpu(merge_detections, regex_entities, ai_result, normalized))
+    metrics.count_entities(result["entities"])
+    if _cacheable(result):
+        analysis_cache.put(key, result)
+    # Entités absentes du flux, comparées par intervalle (ou par texte sans position)
+    streamed = {_entity_key(e) for e in entities}
+    for entity in result["entities"]:
+        if _entity_key(entity) not in streamed:
+            yield _sse("entity", entity)
+    yield _sse("verdict", {
+        "risk_level": result["risk_level"],
+        "risk_summary": result.get("risk_summary", ""),
+        "final": True,
+    })
+    yield _sse("done", {"count": len(result["entities"])})
+
+
+@app.post("/analyze/stream")
+async def analyze_stream(
+    text: str = Form(""),
+    file: Optional[UploadFile] = File(None),
+):
+    await limiter.acquire()
+    try:
+        combined_text, attachment_name, attachment_text, regex_entities = await _read_attachment(text, file)
+    except BaseException:
+        limiter.release()
+        raise
+    return AdmittedStreamingResponse(
+        _analysis_events(combined_text, attachment_name, attachment_text, regex_entities),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/analyze/sheet")
+async def analyze_sheet(file: UploadFile = File(...)):
+    """Analyse colonne par colonne d'un classeur .xlsx : détections en coordonnées feuille/ligne/colonne."""
+    if not (file.filename or "").lower().endswith(".xlsx"):
+        raise HTTPException(status_code=400, detail="Seuls les classeurs .xlsx sont acceptés.")
+    if file.size is not None and file.size > EXTRACT_MAX_BYTES:
+        raise ExtractionLimitError(f"Fichier trop volumineux (max {EXTRACT_MAX_BYTES} octets)")
+    metrics.set_file_type(".xlsx")
+    async with limiter:
+        with metrics.timed("upload"):
+            path = await run_io(_spool_to_disk, file.file)
+        try:
+            result = await run_cpu(scan_workbook, path)
+        finally:
+            os.unlink(path)
+        return {
+            "sheets": result["sheets"],
+            "hits": result["hits"],
+            "count": len(result["hits"]),
+            "risk_level": assess_risk(result["hits"]),
+            "attachment_name": file.filename,
+        }
+
+
+async def _read_batch(request: Request) -> list:
+    """Lit le corps de /analyze/batch : tableau JSON ou NDJSON (un email par ligne)."""
+    body = bytearray()
+    async for part in request.stream():
+        body += part
+        if len(body) > BATCH_MAX_BYTES:
+            raise HTTPException(status_code=413, detail=f"Lot trop volumineux (max {BATCH_MAX_BYTES} octets)")
+    try:
+        if "ndjson" in request.headers.get("content-type", ""):
+            items = [json.loads(line) for line in body.decode("utf-8").splitlines() if line.strip()]
         else:
-            attachment_text = f"Format non supporté : {file.filename}"
+            items = json.loads(body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Lot illisible : {e}")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Le lot doit être un tableau JSON ou du NDJSON.")
+    if len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Trop d'emails dans le lot (max {BATCH_MAX_ITEMS})")
+    return items
 
-    result = full_analysis(combined_text)
 
-    return {
+def _batch_line(item_id, result: dict) -> str:
+    line = {
+        "id": item_id,
         "entities": result["entities"],
         "count": len(result["entities"]),
         "risk_level": result["risk_level"],
         "risk_summary": result.get("risk_summary", ""),
-        "ai_enabled": AI_ENABLED,
-        "attachment_name": attachment_name,
-        "attachment_text": attachment_text,
     }
+    return json.dumps(line, ensure_ascii=False) + "\n"
+
+
+def _batch_error(item_id, message: str) -> str:
+    return json.dumps({"id": item_id, "error": message}, ensure_ascii=False) + "\n"
+
+
+async def _batch_events(items: list):
+    """Résultats NDJSON dans l'ordre de fin d'analyse, chacun marqué de l'identifiant de l'appelant."""
+    queue: asyncio.Queue[str] = asyncio.Queue()
+    llm_slots = asyncio.Semaphore(BATCH_LLM_CONCURRENCY)
+    tasks = []
+
+    async def analyze_item(item_id, text: str, entities: list[dict]):
+        try:
+            result = await full_analysis(text, _with_defaults(entities), llm_slots)
+            await queue.put(_batch_line(item_id, result))
+        except Exception as e:
+            await queue.put(_batch_error(item_id, str(e)))
+
+    async def analyze_group(group: list[tuple[object, str]]):
+        # Une seule tâche CPU par groupe : regex par email, NER en nlp.pipe sur tout le groupe
+        try:
+            detections = await run_cpu(detect_sensitive_data_batch, [text for _, text in group])
+        except Exception as e:
+            for item_id, _ in group:
+                await queue.put(_batch_error(item_id, str(e)))
+            return
+        await asyncio.gather(*(
+            analyze_item(item_id, text, entities) for (item_id, text), entities in zip(group, detections)
+        ))
+
+    try:
+        pending = []
+        for index, item in enumerate(items):
+            item_id = item.get("id", index) if isinstance(item, dict) else index
+            text = item.get("text") if isinstance(item, dict) else item
+            if not isinstance(text, str):
+                yield _batch_error(item_id, "Champ \"text\" manquant ou invalide.")
+                continue
+            cached = analysis_cache.get(_analysis_key(text))
+            if cached is not None:
+                yield _batch_line(item_id, cached)
+            else:
+                pending.append((item_id, text))
+
+        for start in range(0, len(pending), BATCH_CPU_CHUNK):
+            tasks.append(asyncio.create_task(analyze_group(pending[start:start + BATCH_CPU_CHUNK])))
+        for _ in pending:
+            yield await queue.get()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+@app.post("/analyze/batch")
+async def analyze_batch(request: Request):
+    """Analyse un lot d'emails ({"id", "text"}) ; réponse NDJSON au fil des résultats."""
+    items = await _read_batch(request)
+    await limiter.acquire()
+    return AdmittedStreamingResponse(_batch_events(items), media_type="application/x-ndjson")
+
+
+def _draft_response(session, result: dict | None = None, **extra) -> dict:
+    entities = result["entities"] if result else session.entities
+    return {
+        "session": session.id,
+        "version": session.version,
+        "entities": entities,
+        "count": len(entities),
+        "risk_level": result["risk_level"] if result else assess_risk(entities),
+        **({"risk_summary": result.get("risk_summary", ""), "ai_enabled": AI_ENABLED} if result else {}),
+        **extra,
+    }
+
+
+async def _draft_full_analysis(session, version: int, text: str) -> dict:
+    # Différée jusqu'à une pause de saisie : annulée par toute modification ultérieure
+    await asyncio.sleep(DRAFT_LLM_DELAY)
+    async with limiter:
+        # Détection complète : corrige aussi les écarts éventuels des analyses incrémentales
+        result = await full_analysis(text)
+    if session.version == version:
+        session.entities = [e for e in result["entities"] if e.get("start", -1) >= 0]
+    session.full_result = (version, result)
+    return result
+
+
+def _log_full_analysis_error(task: asyncio.Task):
+    # Erreur consommée ici (saturation, IA...) : un client qui attend l'analyse la reçoit quand même
+    if not task.cancelled() and (exc := task.exception()) is not None:
+        logger.warning("Analyse complète du brouillon impossible : %r", exc)
+
+
+def _schedule_full_analysis(session):
+    if session.full_task is not None:
+        session.full_task.cancel()
+    session.full_task = asyncio.create_task(_draft_full_analysis(session, session.version, session.text))
+    session.full_task.add_done_callback(_log_full_analysis_error)
+
+
+@app.post("/draft")
+async def create_draft(draft: TextRequest):
+    """Ouvre une session de brouillon : détection complète du texte initial."""
+    async with limiter:
+        text = draft.text
+        lang = await run_cpu(detect_language, text[:LANG_SAMPLE_CHARS])
+        entities = _with_defaults(await run_cpu(detect_sensitive_data, text, lang))
+        session = drafts.create(text, entities, lang)
+        _schedule_full_analysis(session)
+        return _draft_response(session)
+
+
+@app.post("/draft/{session_id}/edit")
+async def edit_draft(session_id: str, edit: DraftEditRequest):
+    """Applique une modification ([start, end) remplacé par text) et ré-analyse la zone touchée.
+
+    Seules les lignes modifiées (plus une marge) repassent par les règles et
+    le NER ; les autres détections sont décalées. L'analyse complète (IA
+    comprise) attend une pause de saisie de DRAFT_LLM_DELAY secondes.
+    """
+    session = drafts.get(session_id)
+    async with limiter, session.lock:
+        if edit.version != session.version:
+            raise DraftConflict(f"Version {edit.version} périmée (version courante : {session.version}).")
+        try:
+            text, win_start, win_end, before, after = session.prepare_edit(edit.start, edit.end, edit.text)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        session.changed_chars += max(edit.end - edit.start, len(edit.text))
+        if session.changed_chars >= DRAFT_LANG_REDETECT_CHARS:
+            session.lang = await run_cpu(detect_language, text[:LANG_SAMPLE_CHARS])
+            session.changed_chars = 0
+
+        window = await run_cpu(detect_sensitive_data, text[win_start:win_end], session.lang)
+        for e in window:
+            if e["start"] >= 0:
+                e["start"] += win_start
+                e["end"] += win_start
+        session.apply_edit(text, before + _with_defaults(window) + after)
+        _schedule_full_analysis(session)
+        return _draft_response(session, window=[win_start, win_end])
+
+
+@app.get("/draft/{session_id}/analysis")
+async def draft_analysis(session_id: str, version: int):
+    """Analyse complète (IA comprise) d'une version du brouillon, attendue jusqu'à la pause de saisie."""
+    session = drafts.get(session_id)
+    if version != session.version:
+        raise DraftConflict(f"Version {version} périmée (version courante : {session.version}).")
+    if session.full_result is not None and session.full_result[0] == version:
+        return _draft_response(session, session.full_result[1])
+    task = session.full_task
+    try:
+        # shield : la déconnexion du client n'annule pas l'analyse partagée
+        result = await asyncio.shield(task)
+    except asyncio.CancelledError:
+        if task.cancelled():
+            raise DraftConflict("Brouillon modifié pendant l'analyse.")
+        raise
+    return _draft_response(session, result)
+
+
+@app.delete("/draft/{session_id}")
+async def delete_draft(session_id: str):
+    drafts.discard(session_id)
+    return {"deleted": session_id}
 
 
 @app.post("/anonymize")
@@ -106,25 +757,45 @@ async def anonymize_text(
     text: str = Form(""),
     file: Optional[UploadFile] = File(None),
 ):
-    combined_text = text
-    attachment_text = ""
+    async with limiter:
+        combined_text, _, _, regex_entities = await _read_attachment(text, file)
+        result = await full_analysis(combined_text, regex_entities)
+        positioned = [e for e in result["entities"] if e.get("start", -1) >= 0]
+        anonymized = await run_cpu(anonymize, combined_text, positioned)
 
-    if file and file.filename and is_supported(file.filename):
-        content = await file.read()
-        attachment_text = extract_text(file.filename, content)
-        combined_text = f"{text}\n\n[PIÈCE JOINTE: {file.filename}]\n{attachment_text}"
+        return {
+            "original": combined_text,
+            "anonymized": anonymized,
+            "entities": result["entities"],
+            "risk_level": result["risk_level"],
+            "risk_summary": result.get("risk_summary", ""),
+        }
 
-    result = full_analysis(combined_text)
-    regex_entities = [e for e in result["entities"] if e.get("start", -1) >= 0]
-    anonymized = anonymize(combined_text, regex_entities)
 
-    return {
-        "original": combined_text,
-        "anonymized": anonymized,
-        "entities": result["entities"],
-        "risk_level": result["risk_level"],
-        "risk_summary": result.get("risk_summary", ""),
-    }
+@app.post("/anonymize/file")
+async def anonymize_attachment(file: UploadFile = File(...)):
+    """Copie masquée d'une pièce jointe Word ou Excel, dans son format d'origine."""
+    stem, ext = os.path.splitext(file.filename or "")
+    if ext.lower() not in FILE_ANONYMIZERS:
+        formats = ", ".join(sorted(FILE_ANONYMIZERS))
+        raise HTTPException(status_code=400, detail=f"Formats acceptés pour le masquage : {formats}.")
+    if file.size is not None and file.size > EXTRACT_MAX_BYTES:
+        raise ExtractionLimitError(f"Fichier trop volumineux (max {EXTRACT_MAX_BYTES} octets)")
+    metrics.set_file_type(ext.lower())
+    async with limiter:
+        with metrics.timed("upload"):
+            path = await run_io(_spool_to_disk, file.file)
+        try:
+            content = await run_cpu(anonymize_file, file.filename, path)
+        except UnsupportedContentError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        finally:
+            os.unlink(path)
+        return Response(
+            content=content,
+            media_type=FILE_ANONYMIZERS[ext.lower()][1],
+            headers={"Content-Disposition": f"attachment; filename*=UTF-8''{quote(stem + '_masque' + ext)}"},
+        )
 
 
 @app.post("/report")
@@ -132,20 +803,16 @@ async def export_report(
     text: str = Form(""),
     file: Optional[UploadFile] = File(None),
 ):
-    combined_text = text
-
-    if file and file.filename and is_supported(file.filename):
-        content = await file.read()
-        attachment_text = extract_text(file.filename, content)
-        combined_text = f"{text}\n\n[PIÈCE JOINTE: {file.filename}]\n{attachment_text}"
-
-    result = full_analysis(combined_text)
-    pdf_bytes = generate_report(combined_text, result["entities"])
-    return Response(
-        content=pdf_bytes,
-        media_type="application/pdf",
-        headers={"Content-Disposition": "attachment; filename=rapport_securite.pdf"},
-    )
+    async with limiter:
+        combined_text, _, _, regex_entities = await _read_attachment(text, file)
+        result = await full_analysis(combined_text, regex_entities)
+        with metrics.timed("report"):
+            pdf_bytes = await run_cpu(generate_report, combined_text, result["entities"])
+        return Response(
+            content=pdf_bytes,
+            media_type="application/pdf",
+            headers={"Content-Disposition": "attachment; filename=rapport_securite.pdf"},
+        )
 
 
 # Servir le frontend
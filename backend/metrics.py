@@ -0,0 +1,238 @@
+"""Instrumentation : durée de chaque étape d'une requête, métriques Prometheus et en-tête Server-Timing.
+
+Les durées sont collectées dans un ``Timings`` propre à la requête (contextvar).
+Les étapes exécutées dans le pool CPU sont chronométrées dans le worker et
+rapatriées avec le résultat (cf. executor.run_cpu) : toutes les observations
+ont lieu dans le processus serveur, quel que soit le mode d'exécution.
+"""
+import contextvars
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# Bornes des histogrammes (secondes) : de la règle regex (ms) à l'appel LLM (minutes)
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+STAGE_SECONDS = Histogram(
+    "securemail_stage_seconds",
+    "Durée d'une étape de traitement d'une requête",
+    ["stage", "file_type", "ai_backend"],
+    buckets=STAGE_BUCKETS,
+)
+REGEX_RULE_SECONDS = Histogram(
+    "securemail_regex_rule_seconds",
+    "Durée d'évaluation d'une règle regex sur un texte",
+    ["rule"],
+    buckets=STAGE_BUCKETS,
+)
+REQUEST_SECONDS = Histogram(
+    "securemail_request_seconds",
+    "Durée totale d'une requête HTTP (réponses en flux comprises)",
+    ["route", "status"],
+    buckets=STAGE_BUCKETS,
+)
+REGEX_BUDGET_EXCEEDED = Counter(
+    "securemail_regex_budget_exceeded_total",
+    "Règles regex interrompues faute de budget de temps",
+    ["rule"],
+)
+LLM_ERRORS = Counter(
+    "securemail_llm_errors_total",
+    "Appels LLM en échec (réponse dégradée en risk_level \"erreur\")",
+    ["ai_backend", "error"],
+)
+ENTITIES = Counter(
+    "securemail_entities_total",
+    "Données sensibles détectées, par type et par source",
+    ["label", "source"],
+)
+IN_FLIGHT = Gauge("securemail_in_flight", "Analyses en cours", multiprocess_mode="livesum")
+WAITING = Gauge("securemail_waiting", "Analyses en attente d'admission", multiprocess_mode="livesum")
+
+
+class Timings:
+    """Durées collectées pour une requête (ou une tâche du pool CPU)."""
+
+    __slots__ = ("stages", "rules", "exceeded", "file_type")
+
+    def __init__(self):
+        self.stages: list[tuple[str, float]] = []
+        self.rules: dict[str, float] = {}
+        # Règles regex interrompues par leur budget
+        self.exceeded: list[str] = []
+        # Type de la pièce jointe traitée ("none" : texte seul)
+        self.file_type = "none"
+
+    def merge(self, other: "Timings"):
+        self.stages.extend(other.stages)
+        for rule, seconds in other.rules.items():
+            self.rules[rule] = self.rules.get(rule, 0.0) + seconds
+        self.exceeded.extend(other.exceeded)
+
+    def server_timing(self) -> str:
+        """Valeur de l'en-tête Server-Timing : durée cumulée par étape, en millisecondes."""
+        totals: dict[str, float] = {}
+        for stage, seconds in self.stages:
+            totals[stage] = totals.get(stage, 0.0) + seconds
+        return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in totals.items())
+
+
+_timings: contextvars.ContextVar[Timings | None] = contextvars.ContextVar("timings", default=None)
+
+
+def record(stage: str, seconds: float):
+    timings = _timings.get()
+    if timings is not None:
+        timings.stages.append((stage, seconds))
+
+
+def record_rule(rule: str, seconds: float):
+    timings = _timings.get()
+    if timings is not None:
+        timings.rules[rule] = timings.rules.get(rule, 0.0) + seconds
+
+
+def record_budget_exceeded(rule: str):
+    timings = _timings.get()
+    if timings is not None:
+        timings.exceeded.append(rule)
+
+
+@contextmanager
+def timed(stage: str):
+    """Chronomètre le bloc comme étape ``stage`` de la requête en cours."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
+
+
+def timed_iter(stage: str, iterable):
+    """Itère en attribuant à ``stage`` le seul temps passé à produire les éléments."""
+    iterator = iter(iterable)
+    spent = 0.0
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                spent += time.perf_counter() - start
+            yield item
+    finally:
+        record(stage, spent)
+
+
+def call_timed(fn, *args, **kwargs):
+    """Exécute fn (dans un worker CPU) : retourne (résultat, durées collectées)."""
+    timings = Timings()
+    token = _timings.set(timings)
+    try:
+        return fn(*args, **kwargs), timings
+    finally:
+        _timings.reset(token)
+
+
+def merge(timings: Timings):
+    """Ajoute à la requête en cours les durées rapatriées d'un worker."""
+    current = _timings.get()
+    if current is not None:
+        current.merge(timings)
+
+
+def set_file_type(file_type: str):
+    """Étiquette les durées de la requête en cours par type de pièce jointe (ex. ".pdf")."""
+    timings = _timings.get()
+    if timings is not None:
+        timings.file_type = file_type
+
+
+def begin() -> Timings:
+    """Démarre la collecte pour la requête en cours."""
+    timings = Timings()
+    _timings.set(timings)
+    return timings
+
+
+def observe(timings: Timings, ai_backend: str):
+    """Reporte les durées collectées dans les histogrammes."""
+    for stage, seconds in timings.stages:
+        STAGE_SECONDS.labels(stage, timings.file_type, ai_backend).observe(seconds)
+    for rule, seconds in timings.rules.items():
+        REGEX_RULE_SECONDS.labels(rule).observe(seconds)
+    for rule in timings.exceeded:
+        REGEX_BUDGET_EXCEEDED.labels(rule).inc()
+
+
+def count_entities(entities: list[dict]):
+    """Compte les détections par label ; un label hors detector.SEVERITY (réponse du LLM,
+    règle ajoutée) est compté sous "AUTRE" pour borner la cardinalité de la métrique."""
+    from backend.detector import SEVERITY
+
+    for entity in entities:
+        label = entity.get("label")
+        ENTITIES.labels(label if label in SEVERITY else "AUTRE", entity.get("source", "regex")).inc()
+
+
+def count_llm_error(ai_backend: str, error: Exception):
+    LLM_ERRORS.labels(ai_backend, type(error).__name__).inc()
+
+
+def exposition() -> tuple[bytes, str]:
+    """Corps et type MIME de /metrics ; agrège les processus si PROMETHEUS_MULTIPROC_DIR est défini."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+class TimingMiddleware:
+    """Middleware ASGI : collecte des durées par requête et en-tête Server-Timing.
+
+    L'en-tête porte les étapes terminées à l'envoi des en-têtes (plus "total") ;
+    les histogrammes sont alimentés en fin de réponse, flux compris.
+    """
+
+    def __init__(self, app, ai_backend: str):
+        self.app = app
+        self.ai_backend = ai_backend
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timings = begin()
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                value = timings.server_timing()
+                total = f"total;dur={(time.perf_counter() - start) * 1000:.1f}"
+                headers = [*message.get("headers", []), (b"server-timing", f"{value}, {total}".lstrip(", ").encode())]
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            route = getattr(scope.get("route"), "path", "static")
+            REQUEST_SECONDS.labels(route, str(status)).observe(time.perf_counter() - start)
+            observe(timings, self.ai_backend)
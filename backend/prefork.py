@@ -0,0 +1,226 @@
+import collections
+import itertools
+import multiprocessing
+from multiprocessing.connection import wait
+import os
+import threading
+from concurrent.futures import Executor, Future, InvalidStateError
+
+
+# Variable d'environnement lue par prefork_preload dans le fork-server ("*" : toutes les langues, "" : aucune)
+_LANGS_ENV = "SECUREMAIL_PREFORK_LANGS"
+
+
+class WorkerDied(RuntimeError):
+    """Levée pour une tâche dont le worker s'est arrêté en cours d'exécution."""
+
+
+def _worker_main(tasks, results):
+    """Boucle d'un worker : exécute les tâches que le maître lui attribue une à une.
+
+    ``results`` est un tube propre au worker : une file partagée serait
+    protégée par un verrou inter-processus qu'un worker tué en cours d'écriture
+    ne relâcherait jamais, bloquant les résultats de tous les autres.
+    """
+    while True:
+        item = tasks.get()
+        if item is None:
+            break
+        task_id, fn, args, kwargs = item
+        try:
+            results.send(("ok", task_id, fn(*args, **kwargs)))
+        except BaseException as exc:
+            try:
+                results.send(("error", task_id, exc))
+            except Exception:
+                results.send(("error", task_id, RuntimeError(repr(exc))))
+
+
+def _read_proc_kb(path: str, field: str) -> int | None:
+    try:
+        with open(path) as f:
+            for line in f:
+                if line.startswith(field):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+class PreforkPool(Executor):
+    """Pool de workers forkés après chargement des modèles.
+
+    Les workers sont forkés par le fork-server de multiprocessing, un
+    processus à un seul thread qui a chargé les modèles spaCy à son démarrage
+    (cf. prefork_preload) : leur mémoire est partagée en copy-on-write, et un
+    worker mort peut être remplacé sans forker le serveur multithreadé.
+    Le maître attribue chaque tâche à un worker inactif (une file par worker) :
+    il sait ainsi quelle tâche faire échouer si ce worker meurt.
+    """
+
+    def __init__(self, workers: int, langs=None):
+        self.workers = workers
+        self.langs = langs
+        self._ctx = multiprocessing.get_context("forkserver")
+        self._processes: dict[int, multiprocessing.Process] = {}
+        self._queues: dict[int, multiprocessing.Queue] = {}
+        self._results: dict[int, multiprocessing.connection.Connection] = {}
+        self._idle: list[int] = []
+        self._assigned: dict[int, int] = {}  # pid -> tâche en cours
+        self._backlog: collections.deque = collections.deque()
+        self._pending: dict[int, Future] = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._collector = None
+        self._closed = False
+
+    def start(self):
+        os.environ[_LANGS_ENV] = "*" if self.langs is None else ",".join(self.langs)
+        self._ctx.set_forkserver_preload(["backend.prefork_preload"])
+        for _ in range(self.workers):
+            self._spawn()
+        self._collector = threading.Thread(target=self._collect, name="prefork-collector", daemon=True)
+        self._collector.start()
+        return self
+
+    def _spawn(self):
+        tasks = self._ctx.Queue()
+        reader, writer = self._ctx.Pipe(duplex=False)
+        process = self._ctx.Process(target=_worker_main, args=(tasks, writer), daemon=True)
+        process.start()
+        writer.close()
+        with self._lock:
+            self._processes[process.pid] = process
+            self._queues[process.pid] = tasks
+            self._results[process.pid] = reader
+            self._idle.append(process.pid)
+        self._dispatch()
+
+    def _dispatch(self):
+        """Attribue les tâches en attente aux workers inactifs."""
+        while True:
+            with self._lock:
+                if not self._backlog or not self._idle:
+                    return
+                task_id, fn, args, kwargs = self._backlog.popleft()
+                future = self._pending.get(task_id)
+                if future is None or not future.set_running_or_notify_cancel():
+                    # Annulée avant d'être attribuée
+                    self._pending.pop(task_id, None)
+                    continue
+                pid = self._idle.pop()
+                self._assigned[pid] = task_id
+                tasks = self._queues[pid]
+            tasks.put((task_id, fn, args, kwargs))
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Pool arrêté")
+            task_id = next(self._ids)
+            self._pending[task_id] = future
+            self._backlog.append((task_id, fn, args, kwargs))
+        self._dispatch()
+        return future
+
+    def _collect(self):
+        """Reçoit les résultats des workers et remplace ceux qui s'arrêtent."""
+        while not self._closed:
+            with self._lock:
+                readers = {conn: pid for pid, conn in self._results.items()}
+                sentinels = [process.sentinel for process in self._processes.values()]
+            ready = wait(list(readers) + sentinels, timeout=1)
+            for conn in ready:
+                if conn in readers:
+                    self._receive(readers[conn], conn)
+            if any(conn not in readers for conn in ready):
+                self._reap()
+
+    def _receive(self, pid: int, conn) -> bool:
+        """Traite le résultat disponible sur le tube du worker ``pid`` (False si le tube est fermé)."""
+        try:
+            kind, task_id, payload = conn.recv()
+        except (EOFError, OSError):
+            # Worker arrêté : sa tâche est traitée par _reap
+            return False
+        with self._lock:
+            future = self._pending.pop(task_id, None)
+            if self._assigned.get(pid) == task_id:
+                del self._assigned[pid]
+                self._idle.append(pid)
+        self._dispatch()
+        if future is not None:
+            try:
+                if kind == "ok":
+                    future.set_result(payload)
+                else:
+                    future.set_exception(payload)
+            except InvalidStateError:
+                # Future annulée par l'appelant entre-temps
+                pass
+        return True
+
+    def _reap(self):
+        """Remplace les workers morts et fait échouer leur tâche en cours."""
+        for pid, process in list(self._processes.items()):
+            if process.is_alive() or self._closed:
+                continue
+            # Résultat envoyé juste avant l'arrêt
+            conn = self._results[pid]
+            while conn.poll() and self._receive(pid, conn):
+                pass
+            with self._lock:
+                del self._processes[pid]
+                self._queues.pop(pid).close()
+                self._results.pop(pid).close()
+                if pid in self._idle:
+                    self._idle.remove(pid)
+                task_id = self._assigned.pop(pid, None)
+                future = self._pending.pop(task_id, None) if task_id is not None else None
+            if future is not None and not future.done():
+                future.set_exception(WorkerDied(f"Worker {pid} arrêté (code {process.exitcode})"))
+            if not self._closed:
+                self._spawn()
+
+    def _busy(self, pid: int) -> bool:
+        return pid in self._assigned
+
+    def queue_depth(self) -> int:
+        return len(self._backlog)
+
+    def stats(self) -> dict:
+        workers = []
+        for pid, process in list(self._processes.items()):
+            workers.append({
+                "pid": pid,
+                "alive": process.is_alive(),
+                "busy": self._busy(pid),
+                "rss_bytes": _read_proc_kb(f"/proc/{pid}/status", "VmRSS:"),
+                # PSS : part de la mémoire partagée imputée au worker
+                "pss_bytes": _read_proc_kb(f"/proc/{pid}/smaps_rollup", "Pss:"),
+            })
+        return {
+            "queue_depth": self.queue_depth(),
+            "pending": len(self._pending),
+            "master_rss_bytes": _read_proc_kb("/proc/self/status", "VmRSS:"),
+            "workers": workers,
+        }
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        with self._lock:
+            self._closed = True
+            pending = list(self._pending.values()) if cancel_futures else []
+            queues = list(self._queues.values())
+            # Copie : le collecteur retire les workers arrêtés
+            processes = list(self._processes.values())
+        for future in pending:
+            future.cancel()
+        for tasks in queues:
+            tasks.put(None)
+        if wait:
+            for process in processes:
+                process.join(timeout=5)
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
@@ -0,0 +1,18 @@
+"""Préchargement du fork-server du pool prefork (cf. prefork.PreforkPool).
+
+Importé une seule fois par le processus fork-server de multiprocessing (un
+seul thread), avant qu'il ne forke les workers : les modèles y sont chargés
+puis partagés en copy-on-write avec chaque worker, y compris ceux qui
+remplacent un worker mort.
+"""
+import gc
+import os
+
+from backend.detector import warm_up
+
+_langs = os.environ.get("SECUREMAIL_PREFORK_LANGS", "*")
+if _langs:
+    warm_up(None if _langs == "*" else _langs.split(","))
+# Geler le GC évite que les collectes des workers ne dupliquent les pages héritées
+gc.collect()
+gc.freeze()
@@ -0,0 +1,250 @@
+import logging
+import os
+import re
+import time
+
+try:
+    from re import _parser as _sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse as _sre_parse
+
+from backend import metrics
+
+logger = logging.getLogger(__name__)
+
+# Budget de temps regex par requête (secondes, 0 : illimité) : par règle et toutes règles confondues
+REGEX_RULE_BUDGET = float(os.getenv("REGEX_RULE_BUDGET", "1"))
+REGEX_REQUEST_BUDGET = float(os.getenv("REGEX_REQUEST_BUDGET", "5"))
+
+# Règles sans déclencheur : balayage par fenêtres de cette taille, échéance vérifiée entre deux fenêtres
+_WINDOW_CHARS = 16 * 1024
+# Marge au-delà de la longueur maximale d'une correspondance (assertions \b, lookahead courts)
+_WINDOW_MARGIN = 64
+
+# Caractères que re.IGNORECASE rapproche d'une lettre ASCII sans que str.lower() le fasse
+# ("İ" est aussi le seul caractère dont la minuscule change de longueur)
+_IGNORECASE_FOLD = str.maketrans({"İ": "i", "ı": "i", "ſ": "s"})
+
+
+def _fold(text: str) -> str:
+    """Replie la casse comme re.IGNORECASE, en conservant les positions."""
+    if "İ" in text or "ı" in text or "ſ" in text:
+        text = text.translate(_IGNORECASE_FOLD)
+    return text.lower()
+
+
+def _max_width(pattern: re.Pattern) -> int | None:
+    """Longueur maximale d'une correspondance (None : non bornée ou inconnue)."""
+    try:
+        width = _sre_parse.parse(pattern.pattern, pattern.flags).getwidth()[1]
+    except Exception:
+        return None
+    return width if width < _sre_parse.MAXREPEAT else None
+
+
+class RegexBudget:
+    """Temps regex alloué à une requête, tous morceaux de texte confondus.
+
+    Seul le temps passé dans les regex est décompté (pas celui de l'appelant
+    entre deux correspondances). Une règle qui épuise son budget (ou celui de
+    la requête) est interrompue, comptée, journalisée puis ignorée pour la
+    suite de la requête : la détection est alors incomplète (``incomplete``).
+    """
+
+    def __init__(self, rule_seconds: float = REGEX_RULE_BUDGET, request_seconds: float = REGEX_REQUEST_BUDGET):
+        self.rule_seconds = rule_seconds
+        self.request_seconds = request_seconds
+        self.spent: dict[str, float] = {}
+        self.total = 0.0
+        self.exceeded: list[str] = []
+
+    def remaining(self, label: str) -> float | None:
+        """Temps restant pour la règle (None : illimité)."""
+        limits = []
+        if self.rule_seconds > 0:
+            limits.append(self.rule_seconds - self.spent.get(label, 0.0))
+        if self.request_seconds > 0:
+            limits.append(self.request_seconds - self.total)
+        return min(limits) if limits else None
+
+    @property
+    def incomplete(self) -> bool:
+        """Vrai si une règle a été interrompue : des correspondances ont pu être manquées."""
+        return bool(self.exceeded)
+
+    def charge(self, label: str, seconds: float, text_chars: int, cut: bool = False):
+        """Décompte ``seconds`` pour la règle ; ``cut`` : la règle a été interrompue avant la fin du texte."""
+        self.spent[label] = self.spent.get(label, 0.0) + seconds
+        self.total += seconds
+        remaining = self.remaining(label)
+        if (cut or (remaining is not None and remaining <= 0)) and label not in self.exceeded:
+            self.exceeded.append(label)
+            metrics.record_budget_exceeded(label)
+            logger.warning(
+                "Règle regex %s hors budget (%.2f s pour la règle, %.2f s pour la requête, texte de %d caractères) : "
+                "ignorée pour la suite de la requête",
+                label, self.spent[label], self.total, text_chars,
+            )
+
+
+class _Clock:
+    """Temps passé dans les regex d'une règle, hors traitement des correspondances par l'appelant."""
+
+    __slots__ = ("limit", "spent", "cut", "_start")
+
+    def __init__(self, limit: float | None):
+        self.limit = limit
+        self.spent = 0.0
+        self.cut = False
+        self._start = time.perf_counter()
+
+    def pause(self):
+        self.spent += time.perf_counter() - self._start
+
+    def resume(self):
+        self._start = time.perf_counter()
+
+    def expired(self) -> bool:
+        if self.limit is not None and self.spent + time.perf_counter() - self._start > self.limit:
+            self.cut = True
+        return self.cut
+
+
+class RegexEngine:
+    """Moteur de détection regex compilé : un seul balayage du texte pour les déclencheurs.
+
+    Chaque règle peut déclarer :
+    - "triggers" : mots-clés par lesquels toute correspondance commence
+      (la règle n'est alors testée qu'aux positions de ces mots-clés) ;
+    - "requires" : sous-chaîne obligatoire (la règle est ignorée si absente).
+    Les règles sans déclencheur sont balayées normalement.
+
+    Les correspondances produites sont identiques à celles de
+    ``rule["pattern"].finditer(text)`` pour chaque règle, dans l'ordre des règles,
+    sauf interruption d'une règle par son budget (cf. RegexBudget) : l'échéance
+    est vérifiée entre deux positions candidates, ou, pour une règle sans
+    déclencheur, entre deux fenêtres de _WINDOW_CHARS positions de départ
+    (seulement entre deux correspondances si la longueur d'une correspondance
+    n'est pas bornée). Les quantificateurs bornés des règles limitent la durée
+    de chaque tentative.
+    """
+
+    def __init__(self, rules: list[dict]):
+        self.rules = rules
+        self._widths = [_max_width(rule["pattern"]) for rule in rules]
+        trigger_rules: dict[str, set[int]] = {}
+        for index, rule in enumerate(rules):
+            for trigger in rule.get("triggers", ()):
+                trigger_rules.setdefault(_fold(trigger), set()).add(index)
+
+        # Un déclencheur préfixe d'un autre s'applique aussi aux positions du plus long
+        for trigger, indexes in trigger_rules.items():
+            for other, other_indexes in trigger_rules.items():
+                if other != trigger and trigger.startswith(other):
+                    indexes |= other_indexes
+
+        self._triggers = sorted(trigger_rules, key=len, reverse=True)
+        self._trigger_rules = [frozenset(trigger_rules[t]) for t in self._triggers]
+        # Un déclencheur peut-il en contenir le début d'un autre ? (ex. "pas|secret")
+        self._reentrant = [
+            any(
+                other.startswith(trigger[k:]) or trigger[k:].startswith(other)
+                for other in self._triggers
+                for k in range(1, len(trigger))
+            )
+            for trigger in self._triggers
+        ]
+        self._trigger_index = {t: i for i, t in enumerate(self._triggers)}
+        self._trigger_pattern = None
+        if self._triggers:
+            # Sans groupes nommés pour garder l'optimisation par préfixe de sre
+            self._trigger_pattern = re.compile("|".join(re.escape(t) for t in self._triggers))
+
+    def _candidates(self, text: str) -> list[list[int]]:
+        """Positions candidates par règle, en un seul balayage du texte."""
+        positions: list[list[int]] = [[] for _ in self.rules]
+        if self._trigger_pattern is None:
+            return positions
+
+        # Balayage sensible à la casse sur le texte replié : bien plus rapide que IGNORECASE
+        folded = _fold(text)
+        pattern = self._trigger_pattern
+        pos = 0
+        while True:
+            match = pattern.search(folded, pos)
+            if match is None:
+                break
+            trigger = self._trigger_index[match.group()]
+            for index in self._trigger_rules[trigger]:
+                positions[index].append(match.start())
+            pos = match.start() + 1 if self._reentrant[trigger] else match.end()
+        return positions
+
+    def _iter_windows(self, pattern: re.Pattern, width: int, text: str, clock: _Clock):
+        # Départs dans [pos, window_end) ; le texte au-delà de window_end + width n'est jamais
+        # examiné par ces tentatives, le tronquer (endpos) donne les correspondances de finditer
+        pos = 0
+        while pos <= len(text):
+            if clock.expired():
+                return
+            window_end = pos + _WINDOW_CHARS
+            endpos = window_end + width + _WINDOW_MARGIN
+            match = pattern.search(text, pos, endpos)
+            if match is None and endpos >= len(text):
+                return
+            if match is None or match.start() >= window_end:
+                pos = window_end
+                continue
+            clock.pause()
+            yield match
+            clock.resume()
+            # Correspondance vide : avancer d'un caractère, comme finditer
+            pos = match.end() + (match.end() == match.start())
+
+    def _iter_rule(self, rule: dict, width: int | None, text: str, candidates: list[int], clock: _Clock):
+        pattern = rule["pattern"]
+        requires = rule.get("requires")
+        if requires and requires not in text:
+            return
+        if not rule.get("triggers"):
+            if width is not None:
+                yield from self._iter_windows(pattern, width, text, clock)
+                return
+            for match in pattern.finditer(text):
+                clock.pause()
+                yield match
+                clock.resume()
+                if clock.expired():
+                    return
+            return
+        last_end = 0
+        for pos in candidates:
+            if pos < last_end:
+                continue
+            if clock.expired():
+                return
+            match = pattern.match(text, pos)
+            if match:
+                last_end = match.end()
+                clock.pause()
+                yield match
+                clock.resume()
+
+    def finditer(self, text: str, budget: RegexBudget | None = None):
+        """Itère sur les couples (règle, match), règle par règle dans l'ordre d'enregistrement.
+
+        Une règle interrompue par le budget est signalée dans ``budget`` (cf. RegexBudget.incomplete).
+        """
+        candidates = self._candidates(text)
+        for rule, width, rule_candidates in zip(self.rules, self._widths, candidates):
+            label = rule["label"]
+            remaining = budget.remaining(label) if budget is not None else None
+            if remaining is not None and remaining <= 0:
+                # Déjà hors budget pour cette requête (signalée lors de son interruption)
+                continue
+            clock = _Clock(remaining)
+            yield from ((rule, match) for match in self._iter_rule(rule, width, text, rule_candidates, clock))
+            clock.pause()
+            metrics.record_rule(label, clock.spent)
+            if budget is not None:
+                budget.charge(label, clock.spent, len(text), cut=clock.cut)
@@ -0,0 +1,212 @@
+"""Jeu de règles regex versionné, chargé depuis un fichier JSON et rechargé à chaud.
+
+Les règles sont validées et précompilées au chargement : une expression
+invalide ou dont un quantificateur non borné est imbriqué dans une répétition
+(retour arrière catastrophique possible) rend le fichier refusé. Chaque
+processus (serveur, workers) surveille la date de modification du fichier et
+recharge le jeu de règles sans redémarrage ; un fichier invalide est signalé
+et l'ancien jeu reste actif.
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+from backend.cache import content_key
+from backend.regex_engine import RegexEngine
+
+try:
+    from re import _constants as sre_constants, _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_constants
+    import sre_parse
+
+logger = logging.getLogger(__name__)
+
+RULES_FILE = os.getenv("RULES_FILE", os.path.join(os.path.dirname(__file__), "rules.json"))
+# Intervalle (secondes) de vérification du fichier de règles (0 : pas de rechargement)
+RULES_RELOAD_INTERVAL = float(os.getenv("RULES_RELOAD_INTERVAL", "5"))
+# "re" ou "re2" (google-re2, temps linéaire ; repli sur "re" pour une règle non supportée)
+RULES_BACKEND = os.getenv("RULES_BACKEND", "re")
+
+SEVERITIES = ("critique", "élevé", "moyen", "faible")
+_RULE_KEYS = {"label", "pattern", "triggers", "requires", "severity", "description"}
+_REPEATS = {sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT}
+if hasattr(sre_constants, "POSSESSIVE_REPEAT"):
+    _REPEATS.add(sre_constants.POSSESSIVE_REPEAT)
+
+
+class RulesetError(ValueError):
+    """Fichier de règles illisible ou règle refusée."""
+
+
+def _children(value):
+    if isinstance(value, sre_parse.SubPattern):
+        yield value
+    elif isinstance(value, (tuple, list)):
+        for item in value:
+            yield from _children(item)
+
+
+def _nested_unbounded(tree, in_repeat: bool = False) -> bool:
+    """Vrai si un quantificateur non borné (*, +, {n,}) figure dans une autre répétition."""
+    for op, av in tree:
+        if op in _REPEATS:
+            low, high, sub = av
+            if high == sre_constants.MAXREPEAT and in_repeat:
+                return True
+            if _nested_unbounded(sub, in_repeat or high > 1):
+                return True
+        elif any(_nested_unbounded(child, in_repeat) for child in _children(av)):
+            return True
+    return False
+
+
+def _import_re2():
+    try:
+        import re2
+    except ImportError:
+        logger.warning("RULES_BACKEND=re2 : module google-re2 absent, moteur \"re\" utilisé")
+        return None
+    return re2
+
+
+def _compile(label: str, pattern: str, re2):
+    if re2 is not None:
+        try:
+            return re2.compile(pattern), "re2"
+        except Exception as e:
+            logger.warning("Règle %s non supportée par re2 (%s) : moteur \"re\" utilisé", label, e)
+    return re.compile(pattern), "re"
+
+
+def _check_rule(index: int, rule) -> str:
+    if not isinstance(rule, dict):
+        raise RulesetError(f"Règle n°{index + 1} : objet JSON attendu")
+    label = rule.get("label")
+    if not isinstance(label, str) or not label:
+        raise RulesetError(f"Règle n°{index + 1} : \"label\" manquant")
+    unknown = set(rule) - _RULE_KEYS
+    if unknown:
+        raise RulesetError(f"Règle {label} : clé(s) inconnue(s) {', '.join(sorted(unknown))}")
+    if not isinstance(rule.get("pattern"), str):
+        raise RulesetError(f"Règle {label} : \"pattern\" manquant")
+    triggers = rule.get("triggers", [])
+    if not isinstance(triggers, list) or not all(isinstance(t, str) and t for t in triggers):
+        raise RulesetError(f"Règle {label} : \"triggers\" doit être une liste de chaînes non vides")
+    if "requires" in rule and not isinstance(rule["requires"], str):
+        raise RulesetError(f"Règle {label} : \"requires\" doit être une chaîne")
+    if "severity" in rule and rule["severity"] not in SEVERITIES:
+        raise RulesetError(f"Règle {label} : \"severity\" parmi {', '.join(SEVERITIES)}")
+    try:
+        tree = sre_parse.parse(rule["pattern"])
+    except re.error as e:
+        raise RulesetError(f"Règle {label} : expression invalide ({e})") from e
+    if _nested_unbounded(tree):
+        raise RulesetError(
+            f"Règle {label} : quantificateur non borné imbriqué dans une répétition "
+            "(retour arrière catastrophique possible) ; bornez-le, ex. {{1,40}}"
+        )
+    return label
+
+
+class Ruleset:
+    """Règles compilées d'un fichier, avec leur moteur de détection."""
+
+    def __init__(self, version: str, rules: list[dict], path: str = "", mtime: int = 0, backend: str = "re"):
+        self.version = version
+        self.rules = rules
+        self.path = path
+        self.mtime = mtime
+        self.backend = backend
+        self.engine = RegexEngine(rules)
+        # Empreinte du contenu effectif : entre dans les clés de cache de résultats
+        self.digest = content_key(
+            backend,
+            *(f"{r['label']}\0{r['source']}\0{' '.join(r.get('triggers', ()))}\0{r.get('requires', '')}\0{r.get('severity', '')}"
+              for r in rules),
+        )[:16]
+
+    def stats(self) -> dict:
+        return {
+            "version": self.version,
+            "digest": self.digest,
+            "rules": len(self.rules),
+            "backend": self.backend,
+            "path": self.path,
+        }
+
+
+def parse_ruleset(data: dict, path: str = "", mtime: int = 0, backend: str = RULES_BACKEND) -> Ruleset:
+    """Valide et compile un jeu de règles ({"version", "rules": [...]})."""
+    if not isinstance(data, dict) or not isinstance(data.get("version"), str) or not isinstance(data.get("rules"), list):
+        raise RulesetError("Format attendu : {\"version\": \"...\", \"rules\": [...]}")
+    if not data["rules"]:
+        raise RulesetError("Aucune règle définie")
+    labels = [_check_rule(i, rule) for i, rule in enumerate(data["rules"])]
+    duplicates = sorted({label for label in labels if labels.count(label) > 1})
+    if duplicates:
+        raise RulesetError(f"Label(s) en double : {', '.join(duplicates)}")
+
+    re2 = _import_re2() if backend == "re2" else None
+    rules = []
+    for rule in data["rules"]:
+        compiled, engine = _compile(rule["label"], rule["pattern"], re2)
+        rules.append({
+            **{k: v for k, v in rule.items() if k not in ("pattern", "triggers", "description")},
+            "pattern": compiled,
+            "source": rule["pattern"],
+            "triggers": tuple(rule.get("triggers", ())),
+            "engine": engine,
+        })
+    return Ruleset(data["version"], rules, path, mtime, "re2" if re2 is not None else "re")
+
+
+def load_ruleset(path: str = RULES_FILE) -> Ruleset:
+    try:
+        with open(path, "rb") as f:
+            mtime = os.fstat(f.fileno()).st_mtime_ns
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        raise RulesetError(f"Fichier de règles illisible ({path}) : {e}") from e
+    return parse_ruleset(data, path, mtime)
+
+
+_current: Ruleset | None = None
+_checked = 0.0
+_rejected_mtime = 0
+_lock = threading.Lock()
+
+
+def current() -> Ruleset:
+    """Jeu de règles actif ; rechargé si le fichier a changé (vérifié toutes les RULES_RELOAD_INTERVAL s)."""
+    global _current, _checked, _rejected_mtime
+    ruleset = _current
+    if ruleset is not None and (RULES_RELOAD_INTERVAL <= 0 or time.monotonic() - _checked < RULES_RELOAD_INTERVAL):
+        return ruleset
+    with _lock:
+        if _current is None:
+            # Premier chargement : un fichier invalide empêche le démarrage
+            _current = load_ruleset(RULES_FILE)
+            _checked = time.monotonic()
+            return _current
+        if time.monotonic() - _checked < RULES_RELOAD_INTERVAL:
+            return _current
+        _checked = time.monotonic()
+        try:
+            mtime = os.stat(RULES_FILE).st_mtime_ns
+        except OSError as e:
+            logger.error("Fichier de règles inaccessible, règles %s conservées : %s", _current.version, e)
+            return _current
+        if mtime in (_current.mtime, _rejected_mtime):
+            return _current
+        try:
+            _current = load_ruleset(RULES_FILE)
+        except RulesetError as e:
+            _rejected_mtime = mtime
+            logger.error("Nouveau fichier de règles refusé, règles %s conservées : %s", _current.version, e)
+        else:
+            logger.warning("Règles rechargées : version %s (%d règles)", _current.version, len(_current.rules))
+        return _current
@@ -0,0 +1,288 @@
+"""Scan hors ligne d'archives de messagerie (mbox, .eml) : python -m backend.scan."""
+import argparse
+import csv
+import email
+import io
+import itertools
+import json
+import mailbox
+import multiprocessing
+import os
+import re
+import sys
+import threading
+import time
+from email import policy
+
+from backend.detector import detect_sensitive_data, warm_up
+from backend.file_parser import extract_text, is_supported
+
+CSV_FIELDS = [
+    "message", "message_id", "date", "from", "subject", "part",
+    "label", "severity", "start", "end", "text", "error",
+]
+
+# Intervalle (secondes) entre deux points de reprise / deux affichages de progression
+CHECKPOINT_INTERVAL = 5.0
+PROGRESS_INTERVAL = 1.0
+
+_HTML_TAG = re.compile(r"<[^>]+>")
+
+
+def _is_mbox(path: str) -> bool:
+    if path.lower().endswith((".mbox", ".mbx")) or os.path.basename(path) == "mbox":
+        return True
+    with open(path, "rb") as f:
+        return f.read(5) == b"From "
+
+
+def iter_sources(paths: list[str]):
+    """Fichiers .eml et mbox des chemins donnés, dans un ordre déterministe (reprise)."""
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    file_path = os.path.join(root, name)
+                    if name.lower().endswith(".eml") or _is_mbox(file_path):
+                        yield file_path
+        else:
+            yield path
+
+
+def iter_messages(paths: list[str]):
+    """Génère (référence, message brut) : "chemin" pour un .eml, "chemin#n" pour le n-ième message d'une mbox."""
+    for path in iter_sources(paths):
+        if path.lower().endswith(".eml"):
+            with open(path, "rb") as f:
+                yield path, f.read()
+            continue
+        box = mailbox.mbox(path, create=False)
+        try:
+            for index, key in enumerate(box.iterkeys()):
+                yield f"{path}#{index}", box.get_bytes(key)
+        finally:
+            box.close()
+
+
+def _init_worker(langs: list[str]):
+    # Chaque worker charge ses modèles une fois, avant son premier message
+    warm_up(langs)
+
+
+def _part_text(part) -> str:
+    try:
+        text = part.get_content()
+    except (LookupError, UnicodeError):
+        # Jeu de caractères inconnu : octets bruts (éventuellement absents) lus en UTF-8
+        text = (part.get_payload(decode=True) or b"").decode("utf-8", errors="replace")
+    if part.get_content_type() == "text/html":
+        text = _HTML_TAG.sub(" ", text)
+    return text
+
+
+def scan_message(task: tuple[str, bytes]) -> tuple[list[dict], int]:
+    """Analyse un message et ses pièces jointes ; retourne (lignes de résultat, taille du message)."""
+    ref, raw = task
+    rows = []
+    try:
+        message = email.message_from_bytes(raw, policy=policy.default)
+        meta = {
+            "message": ref,
+            "message_id": str(message.get("Message-ID", "")),
+            "date": str(message.get("Date", "")),
+            "from": str(message.get("From", "")),
+            "subject": str(message.get("Subject", "")),
+        }
+        parts = [("body", meta["subject"])]
+        for part in message.walk():
+            if part.is_multipart():
+                continue
+            filename = part.get_filename()
+            if filename:
+                if is_supported(filename):
+                    try:
+                        parts.append((filename, extract_text(filename, part.get_payload(decode=True) or b"")))
+                    except Exception as e:
+                        rows.append({**meta, "part": filename, "error": str(e)})
+            elif part.get_content_maintype() == "text":
+                try:
+                    parts.append(("body", _part_text(part)))
+                except Exception as e:
+                    rows.append({**meta, "part": "body", "error": str(e)})
+
+        # Corps (sujet + parties texte) analysé d'un bloc, pièces jointes séparément
+        body = "\n\n".join(text for name, text in parts if name == "body")
+        attachments = [(name, text) for name, text in parts if name != "body"]
+        for name, text in [("body", body)] + attachments:
+            try:
+                entities = detect_sensitive_data(text)
+            except Exception as e:
+                rows.append({**meta, "part": name, "error": str(e)})
+                continue
+            for entity in entities:
+                rows.append({
+                    **meta,
+                    "part": name,
+                    "label": entity["label"],
+                    "severity": entity["severity"],
+                    "start": entity["start"],
+                    "end": entity["end"],
+                    "text": entity["text"],
+                })
+    except Exception as e:
+        rows.append({"message": ref, "error": f"Message illisible : {e}"})
+    return rows, len(raw)
+
+
+class _Output:
+    """Fichier de résultats JSONL ou CSV, ouvert en binaire pour connaître sa taille exacte."""
+
+    def __init__(self, path: str, fmt: str, resume_bytes: int | None):
+        self.fmt = fmt
+        self.file = open(path, "r+b" if resume_bytes is not None else "wb")
+        if resume_bytes is not None:
+            # Les lignes écrites après le dernier point de reprise seront réécrites
+            self.file.truncate(resume_bytes)
+            self.file.seek(resume_bytes)
+        if fmt == "csv" and self.file.tell() == 0:
+            self._write_csv([dict(zip(CSV_FIELDS, CSV_FIELDS))])
+
+    def _write_csv(self, rows: list[dict]):
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=CSV_FIELDS, extrasaction="ignore")
+        writer.writerows(rows)
+        self.file.write(buffer.getvalue().encode("utf-8"))
+
+    def write(self, rows: list[dict], redact: bool):
+        if not rows:
+            return
+        if redact:
+            rows = [{k: v for k, v in row.items() if k != "text"} for row in rows]
+        if self.fmt == "csv":
+            self._write_csv(rows)
+        else:
+            self.file.write("".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows).encode("utf-8"))
+
+    def sync(self) -> int:
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+def _load_checkpoint(path: str, sources: list[str]) -> dict:
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("sources") != sources:
+        raise SystemExit("Point de reprise créé pour d'autres sources : relancer sans --resume.")
+    return checkpoint
+
+
+def _save_checkpoint(path: str, checkpoint: dict):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+def _progress(done: int, size: int, findings: int, started: float, final: bool = False):
+    elapsed = max(time.monotonic() - started, 1e-9)
+    line = (f"\r{done} messages  {done / elapsed:.1f} msg/s  {size / elapsed / 1e6:.2f} Mo/s  "
+            f"{findings} détections")
+    sys.stderr.write(line + ("\n" if final else ""))
+    sys.stderr.flush()
+
+
+def _bounded(tasks, slots: threading.Semaphore):
+    # Pool.imap consomme son itérable sans limite : on borne les messages en vol
+    for task in tasks:
+        slots.acquire()
+        yield task
+
+
+def scan(args) -> dict:
+    sources = [os.path.abspath(p) for p in args.paths]
+    checkpoint_path = args.checkpoint or args.output + ".checkpoint"
+    checkpoint = {"sources": sources, "done": 0, "bytes": 0, "findings": 0, "output_bytes": 0}
+    if args.resume and os.path.exists(checkpoint_path):
+        checkpoint = _load_checkpoint(checkpoint_path, sources)
+
+    output = _Output(args.output, args.format, checkpoint["output_bytes"] if args.resume else None)
+    # Messages déjà traités : relus mais pas analysés
+    stop = checkpoint["done"] + args.max_messages if args.max_messages else None
+    tasks = itertools.islice(iter_messages(sources), checkpoint["done"], stop)
+
+    started = time.monotonic()
+    session_bytes = 0
+    session_done = 0
+    last_checkpoint = last_progress = started
+    pool = None
+    try:
+        if args.workers > 0:
+            pool = multiprocessing.Pool(args.workers, initializer=_init_worker, initargs=(args.langs,))
+            slots = threading.Semaphore(args.workers * args.chunksize * 4)
+            results = pool.imap(scan_message, _bounded(tasks, slots), chunksize=args.chunksize)
+        else:
+            slots = None
+            _init_worker(args.langs)
+            results = map(scan_message, tasks)
+
+        # imap restitue les résultats dans l'ordre : "done" est un point de reprise exact
+        for rows, size in results:
+            if slots is not None:
+                slots.release()
+            output.write(rows, args.redact)
+            checkpoint["done"] += 1
+            checkpoint["bytes"] += size
+            checkpoint["findings"] += sum(1 for row in rows if "label" in row)
+            session_done += 1
+            session_bytes += size
+            now = time.monotonic()
+            if now - last_checkpoint >= CHECKPOINT_INTERVAL:
+                checkpoint["output_bytes"] = output.sync()
+                _save_checkpoint(checkpoint_path, checkpoint)
+                last_checkpoint = now
+            if not args.quiet and now - last_progress >= PROGRESS_INTERVAL:
+                _progress(session_done, session_bytes, checkpoint["findings"], started)
+                last_progress = now
+    finally:
+        checkpoint["output_bytes"] = output.sync()
+        _save_checkpoint(checkpoint_path, checkpoint)
+        output.close()
+        if pool is not None:
+            pool.terminate()
+    if not args.quiet:
+        _progress(session_done, session_bytes, checkpoint["findings"], started, final=True)
+    return checkpoint
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m backend.scan",
+        description="Recherche de données sensibles dans des archives mbox / .eml (et leurs pièces jointes).",
+    )
+    parser.add_argument("paths", nargs="+", help="Fichiers mbox / .eml ou répertoires à parcourir")
+    parser.add_argument("-o", "--output", required=True, help="Fichier de résultats")
+    parser.add_argument("--format", choices=("jsonl", "csv"), default="jsonl")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 1,
+                        help="Processus d'analyse (0 : dans le processus courant)")
+    parser.add_argument("--chunksize", type=int, default=16, help="Messages envoyés à la fois à un worker")
+    parser.add_argument("--langs", type=lambda s: [lang for lang in s.split(",") if lang], default=["fr", "en"],
+                        help="Modèles spaCy préchargés par worker (ex. fr,en)")
+    parser.add_argument("--checkpoint", help="Fichier de reprise (défaut : <output>.checkpoint)")
+    parser.add_argument("--resume", action="store_true", help="Reprendre au dernier point de reprise")
+    parser.add_argument("--max-messages", type=int, default=0, help="Arrêter après N messages (0 : tous)")
+    parser.add_argument("--redact", action="store_true", help="Ne pas écrire les valeurs détectées")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Sans affichage de progression")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    scan(parse_args(argv))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,408 @@
+import bisect
+import os
+import posixpath
+import re
+import zipfile
+from itertools import groupby
+from xml.etree import ElementTree
+from xml.parsers import expat
+from openpyxl.utils import get_column_letter
+
+from backend import rules
+from backend.detector import INCOMPLETE_LABEL, SEVERITY, SPACY_BATCH_SIZE, SPACY_LABEL_MAP, detect_language, get_nlp
+from backend.regex_engine import RegexBudget
+from backend.file_parser import EXTRACT_MAX_ROWS, ExtractionLimitError, open_source
+from backend.spans import SpanIndex
+
+# Lignes examinées pour typer une colonne et décider du passage NER
+SHEET_SAMPLE_ROWS = int(os.getenv("SHEET_SAMPLE_ROWS", "200"))
+
+# Mots-clés d'en-tête → label attendu dans la colonne (cf. _scan_column)
+HEADER_HINTS = {
+    "MOT_DE_PASSE": ("mot de passe", "password", "passwd", "mdp", "pwd"),
+    "IDENTIFIANT": ("identifiant", "login", "username", "utilisateur"),
+    "CLE_API": ("api key", "api_key", "apikey", "token", "secret"),
+    "CODE_PIN": ("code pin", "pin"),
+    "IBAN": ("iban",),
+    "CARTE_BANCAIRE": ("carte bancaire", "numéro de carte", "card number", "credit card", "pan"),
+    "CVV": ("cvv", "cvc"),
+    "SECU": ("sécurité sociale", "securite sociale", "sécu", "secu", "nir", "ssn"),
+    "SALAIRE": ("salaire", "rémunération", "remuneration", "salary", "paie"),
+    "EMAIL": ("email", "e-mail", "courriel", "mail"),
+    "TELEPHONE": ("téléphone", "telephone", "tél", "tel", "phone", "mobile", "portable"),
+    "NOM": ("nom", "prénom", "prenom", "name", "surname", "firstname", "lastname"),
+    "ADRESSE_IP": ("adresse ip", "ip address", "ip"),
+}
+
+# Labels sans forme reconnaissable par les règles : dans une colonne désignée par son
+# en-tête, une valeur de cette forme est la donnée elle-même
+_HEADER_VALUES = {
+    "MOT_DE_PASSE": re.compile(r"\S{4,}"),
+    "IDENTIFIANT": re.compile(r"\S{2,}"),
+    "CLE_API": re.compile(r"\S{8,}"),
+    "CODE_PIN": re.compile(r"\d{4,8}"),
+    "CVV": re.compile(r"\d{3,4}"),
+    "SALAIRE": re.compile(r"\d[\d\s.,]*(?:\s?(?:€|euros?|eur|k€?))?", re.IGNORECASE),
+    "NOM": re.compile(r"[^\W\d_]+(?:[' .-]+[^\W\d_]+)*"),
+}
+
+# Valeurs de remplissage, jamais une donnée
+_PLACEHOLDERS = {"n/a", "na", "nan", "none", "null", "néant", "neant", "aucun", "aucune", "vide", "inconnu", "tbd", "-", "?"}
+
+# Mots-clés d'au plus ce nombre de caractères ("nom", "tel", "pin", "ip") : en-tête exact uniquement
+_SHORT_KEYWORD = 3
+
+# Entier d'au moins ce nombre de chiffres : candidat carte, téléphone, n° de sécurité sociale
+_MIN_DIGITS = 9
+
+
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+def _words(text: str) -> str:
+    return " " + _NON_WORD.sub(" ", text.lower()).strip() + " "
+
+
+_HEADER_KEYWORDS = [(label, _words(keyword)) for label, keywords in HEADER_HINTS.items() for keyword in keywords]
+
+
+def _header_label(header: str) -> str | None:
+    """Label désigné par un en-tête (mots-clés entiers, insensible à la casse et à la ponctuation).
+
+    Un mot-clé court doit former l'en-tête entier : "Nom" désigne des noms, "Nom du produit" non.
+    """
+    words = _words(header)
+    for label, keyword in _HEADER_KEYWORDS:
+        if keyword == words if len(keyword) - 2 <= _SHORT_KEYWORD else keyword in words:
+            return label
+    return None
+
+
+def _cell_text(value, all_numbers: bool = False) -> str | None:
+    """Texte d'une cellule à analyser, ou None.
+
+    Parmi les nombres, seuls les grands entiers (carte, téléphone, n° de sécurité
+    sociale) sont retenus, sauf si ``all_numbers`` (colonne désignée par son en-tête).
+    """
+    if value is None or value == "" or isinstance(value, bool):
+        return None
+    if isinstance(value, str):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if all_numbers or (isinstance(value, int) and abs(value) >= 10 ** (_MIN_DIGITS - 1)):
+        return str(value)
+    return None
+
+
+def _column_type(values: list) -> str:
+    """Type d'une colonne d'après son échantillon : "numeric", "text" ou "empty"."""
+    seen = [v for v in values if v is not None and v != ""]
+    if not seen:
+        return "empty"
+    if all(isinstance(v, (int, float)) for v in seen):
+        return "numeric"
+    return "text"
+
+
+# --- Lecture XLSX en flux : expat directement sur le XML, sans les objets openpyxl ---
+
+_SPREADSHEET_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_RELATIONSHIP_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_PACKAGE_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+_column_indexes: dict[str, int] = {}
+
+
+def _column_index(ref: str) -> int:
+    """Index (base 0) de la colonne d'une référence de cellule ("AB12" → 27)."""
+    letters = ref.rstrip("0123456789")
+    index = _column_indexes.get(letters)
+    if index is None:
+        index = 0
+        for char in letters:
+            index = index * 26 + ord(char.upper()) - 64
+        index = _column_indexes[letters] = index - 1
+    return index
+
+
+def _local(name: str) -> str:
+    return name.rpartition(":")[2] if ":" in name else name
+
+
+class _SheetParser:
+    """Parseur expat d'une feuille (ou de la table des chaînes partagées).
+
+    Les lignes terminées s'accumulent dans ``rows`` sous forme
+    (numéro de ligne, {index de colonne: valeur}) ; les chaînes partagées dans ``strings``.
+    """
+
+    def __init__(self, shared: list[str] | None = None):
+        self.shared = shared
+        self.rows: list[tuple[int, dict]] = []
+        self.strings: list[str] = []
+        self.row_number = 0
+        self.row: dict = {}
+        self.col = -1
+        self.kind = "n"
+        self.text: list[str] = []
+        self.capture = False
+        self.skip = 0
+        self.parser = expat.ParserCreate()
+        self.parser.buffer_text = True
+        self.parser.StartElementHandler = self._start
+        self.parser.EndElementHandler = self._end
+        self.parser.CharacterDataHandler = self._data
+
+    def feed(self, data: bytes, final: bool = False):
+        self.parser.Parse(data, final)
+
+    def _start(self, name, attrs):
+        name = _local(name)
+        if name == "c":
+            ref = attrs.get("r")
+            self.col = _column_index(ref) if ref else self.col + 1
+            self.kind = attrs.get("t", "n")
+            self.text = []
+        elif name in ("v", "t"):
+            self.capture = not self.skip
+        elif name == "row":
+            self.row_number = int(attrs.get("r", self.row_number + 1))
+            self.row = {}
+            self.col = -1
+        elif name == "si":
+            self.text = []
+        elif name == "rPh":
+            # Transcriptions phonétiques : pas du contenu de la cellule
+            self.skip += 1
+
+    def _data(self, data):
+        if self.capture:
+            self.text.append(data)
+
+    def _end(self, name):
+        name = _local(name)
+        if name in ("v", "t"):
+            self.capture = False
+        elif name == "c":
+            raw = "".join(self.text)
+            if raw:
+                self.row[self.col] = self._value(raw)
+        elif name == "row":
+            self.rows.append((self.row_number, self.row))
+        elif name == "si":
+            self.strings.append("".join(self.text))
+        elif name == "rPh":
+            self.skip -= 1
+
+    def _value(self, raw: str):
+        kind = self.kind
+        if kind == "s":
+            return self.shared[int(raw)]
+        if kind in ("str", "inlineStr", "e"):
+            return raw
+        if kind == "b":
+            return raw == "1"
+        try:
+            return int(raw)
+        except ValueError:
+            try:
+                return float(raw)
+            except ValueError:
+                return raw
+
+
+def _parse_part(archive: zipfile.ZipFile, path: str, parser: _SheetParser):
+    with archive.open(path) as part:
+        while True:
+            data = part.read(1024 * 1024)
+            parser.feed(data, final=not data)
+            if not data:
+                break
+            yield
+
+
+def _iter_sheets(fileobj):
+    """Génère (nom de feuille, générateur de (numéro de ligne, {colonne: valeur}))."""
+    with zipfile.ZipFile(fileobj) as archive:
+        names = set(archive.namelist())
+        shared = _SheetParser()
+        if "xl/sharedStrings.xml" in names:
+            for _ in _parse_part(archive, "xl/sharedStrings.xml", shared):
+                pass
+        rels = ElementTree.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+        targets = {rel.get("Id"): rel.get("Target") for rel in rels.iter(f"{_PACKAGE_REL_NS}Relationship")}
+        workbook = ElementTree.fromstring(archive.read("xl/workbook.xml"))
+        for sheet in workbook.iter(f"{_SPREADSHEET_NS}sheet"):
+            target = targets.get(sheet.get(f"{_RELATIONSHIP_NS}id"), "")
+            path = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join("xl", target))
+            if path in names:
+                yield sheet.get("name"), _iter_rows(archive, path, shared.strings)
+
+
+def _iter_rows(archive: zipfile.ZipFile, path: str, shared: list[str]):
+    parser = _SheetParser(shared)
+    for _ in _parse_part(archive, path, parser):
+        rows, parser.rows = parser.rows, []
+        yield from rows
+
+
+def _hit(sheet: str, row: int, col: int, header: str, text: str, label: str, source: str, severity: str | None = None) -> dict:
+    return {
+        "sheet": sheet,
+        "row": row,
+        "column": get_column_letter(col + 1),
+        "header": header,
+        "text": text,
+        "label": label,
+        "severity": severity or SEVERITY.get(label, "faible"),
+        "source": source,
+    }
+
+
+class _Column:
+    def __init__(self, index: int, header: str):
+        self.index = index
+        self.header = header
+        self.rows: list[int] = []
+        self.values: list = []
+
+
+def _scan_regex(sheet: str, column: _Column, cells: list[tuple[int, str]], hits: list[dict], budget: RegexBudget):
+    # Un seul passage du moteur sur les cellules jointes, correspondances ramenées à leur cellule ;
+    # les cellules touchées par une correspondance à cheval sur deux lignes sont réanalysées seules
+    engine = rules.current().engine
+    order = {id(rule): k for k, rule in enumerate(engine.rules)}
+    text = "\n".join(value for _, value in cells)
+    starts = []
+    offset = 0
+    for _, value in cells:
+        starts.append(offset)
+        offset += len(value) + 1
+    found = []
+    dirty = set()
+    for rule, match in engine.finditer(text, budget):
+        i = bisect.bisect_right(starts, match.start()) - 1
+        if match.end() > starts[i] + len(cells[i][1]):
+            dirty.update(range(i, bisect.bisect_right(starts, match.end() - 1)))
+        else:
+            found.append((order[id(rule)], rule, i, match.start(), match.end()))
+    found = [item for item in found if item[2] not in dirty]
+    for i in sorted(dirty):
+        found.extend((order[id(rule)], rule, i, starts[i] + match.start(), starts[i] + match.end())
+                     for rule, match in engine.finditer(cells[i][1], budget))
+    found.sort(key=lambda item: (item[0], item[3]))
+    seen_spans = SpanIndex()
+    for _, group in groupby(found, key=lambda item: item[1]["label"]):
+        group = list(group)
+        for (_, rule, i, start, end), added in zip(group, seen_spans.add_sorted((s, e) for _, _, _, s, e in group)):
+            if added:
+                row, value = cells[i]
+                hits.append(_hit(sheet, row, column.index, column.header, value[start - starts[i]:end - starts[i]],
+                                 rule["label"], "regex", rule.get("severity")))
+
+
+def _scan_ner(sheet: str, column: _Column, cells: list[tuple[int, str]], hits: list[dict]):
+    # Valeurs distinctes uniquement ; colonne ignorée si l'échantillon ne contient aucun nom
+    distinct = list(dict.fromkeys(value for _, value in cells if any(c.isalpha() for c in value)))
+    if not distinct:
+        return
+    nlp = get_nlp(detect_language(" ".join(distinct[:SHEET_SAMPLE_ROWS])))
+    names: dict[str, list[str]] = {}
+    sample = distinct[:SHEET_SAMPLE_ROWS]
+    for value, doc in zip(sample, nlp.pipe(sample, batch_size=SPACY_BATCH_SIZE)):
+        names[value] = [ent.text for ent in doc.ents if ent.label_ in SPACY_LABEL_MAP]
+    if not any(names.values()):
+        return
+    rest = distinct[SHEET_SAMPLE_ROWS:]
+    for value, doc in zip(rest, nlp.pipe(rest, batch_size=SPACY_BATCH_SIZE)):
+        names[value] = [ent.text for ent in doc.ents if ent.label_ in SPACY_LABEL_MAP]
+    for row, value in cells:
+        for name in names.get(value, ()):
+            hits.append(_hit(sheet, row, column.index, column.header, name, "NOM", "ner"))
+
+
+def _scan_header(sheet: str, column: _Column, label: str, cells: list[tuple[int, str]], hits: list[dict]) -> set[int]:
+    # Valeurs d'une colonne désignée par son en-tête, hors cellules déjà détectées par les règles
+    pattern = _HEADER_VALUES[label]
+    covered = {hit["row"] for hit in hits}
+    rows = set()
+    for row, value in cells:
+        value = value.strip()
+        if row not in covered and value.lower() not in _PLACEHOLDERS and pattern.fullmatch(value):
+            rows.add(row)
+            hits.append(_hit(sheet, row, column.index, column.header, value, label, "header"))
+    return rows
+
+
+def _scan_column(sheet: str, column: _Column, hits: list[dict]) -> dict:
+    kind = _column_type(column.values[:SHEET_SAMPLE_ROWS])
+    label = _header_label(column.header) if column.header else None
+    info = {"column": get_column_letter(column.index + 1), "header": column.header, "type": kind, "label": label}
+    if kind == "empty":
+        return info
+
+    # Les règles passent sur toutes les cellules : l'en-tête guide la détection sans la remplacer
+    cells = [(row, text) for row, value in zip(column.rows, column.values)
+             if (text := _cell_text(value, all_numbers=label is not None)) is not None]
+    found: list[dict] = []
+    budget = RegexBudget()
+    _scan_regex(sheet, column, cells, found, budget)
+    if budget.incomplete:
+        # Règles interrompues : signalé sur la colonne entière (ligne 0)
+        info["incomplete"] = True
+        found.append(_hit(sheet, 0, column.index, column.header, "", INCOMPLETE_LABEL, "regex"))
+    designated = _scan_header(sheet, column, label, cells, found) if label in _HEADER_VALUES else set()
+    hits.extend(found)
+
+    if kind == "text":
+        # Pas de NER sur les colonnes numériques ni sur les valeurs déjà désignées par l'en-tête
+        _scan_ner(sheet, column, [(row, text) for row, text in cells if row not in designated], hits)
+    return info
+
+
+def scan_workbook(source) -> dict:
+    """Analyse un classeur Excel (.xlsx) colonne par colonne.
+
+    Chaque colonne est typée sur un échantillon et toutes ses cellules
+    passent par les règles ; un en-tête reconnu (HEADER_HINTS) ajoute la
+    détection des valeurs sans forme reconnaissable (mot de passe, nom...),
+    les colonnes numériques ne passent pas par spaCy. Une colonne dont les
+    règles ont été interrompues par leur budget porte ``incomplete`` et une
+    détection INCOMPLETE_LABEL en ligne 0. Retourne
+    { sheets: [{ name, rows, columns }], hits: [{ sheet, row, column, header, text, label, severity, source }] }.
+    """
+    sheets = []
+    hits: list[dict] = []
+    total_rows = 0
+    with open_source(source) as fileobj:
+        for sheet_name, sheet_rows in _iter_sheets(fileobj):
+            columns: dict[int, _Column] = {}
+            header_row = None
+            rows = 0
+            for row_number, row in sheet_rows:
+                total_rows += 1
+                if total_rows > EXTRACT_MAX_ROWS:
+                    raise ExtractionLimitError(f"Classeur trop grand (max {EXTRACT_MAX_ROWS} lignes)")
+                if not row:
+                    continue
+                if header_row is None:
+                    header_row = row_number
+                    # Première ligne non vide : en-têtes si elle ne contient que du texte
+                    if all(isinstance(v, str) for v in row.values()):
+                        for i, v in row.items():
+                            columns[i] = _Column(i, v.strip())
+                        continue
+                rows += 1
+                for i, v in row.items():
+                    column = columns.get(i)
+                    if column is None:
+                        column = columns[i] = _Column(i, "")
+                    column.rows.append(row_number)
+                    column.values.append(v)
+            sheet_hits: list[dict] = []
+            infos = [_scan_column(sheet_name, columns[i], sheet_hits) for i in sorted(columns)]
+            sheet_hits.sort(key=lambda h: (h["row"], len(h["column"]), h["column"]))
+            hits.extend(sheet_hits)
+            sheets.append({"name": sheet_name, "rows": rows, "columns": infos})
+
+    return {"sheets": sheets, "hits": hits}
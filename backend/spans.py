@@ -0,0 +1,82 @@
+import bisect
+
+
+class SpanIndex:
+    """Ensemble d'intervalles [start, end) disjoints, triés par début.
+
+    La recherche de chevauchement se fait par bisection (O(log n)) sur les
+    débuts, en ne comparant que les voisins immédiats : les intervalles
+    stockés étant disjoints, leurs fins sont elles aussi triées.
+
+    Les détections arrivant triées (correspondances d'une règle, entités NER),
+    elles s'ajoutent par lot avec add_sorted : fusion linéaire avec la seule
+    portion de l'index concernée, au lieu d'une insertion O(n) par intervalle.
+    """
+
+    def __init__(self, spans=()):
+        spans = sorted(spans)
+        self._starts: list[int] = [start for start, _ in spans]
+        self._ends: list[int] = [end for _, end in spans]
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    def __iter__(self):
+        return iter(zip(self._starts, self._ends))
+
+    def overlaps(self, start: int, end: int) -> bool:
+        """Indique si [start, end) chevauche un intervalle déjà présent."""
+        i = bisect.bisect_right(self._starts, start)
+        if i > 0 and self._ends[i - 1] > start and end > self._starts[i - 1]:
+            return True
+        if i < len(self._starts) and self._starts[i] < end and self._ends[i] > start:
+            return True
+        return False
+
+    def add(self, start: int, end: int):
+        """Ajoute un intervalle supposé disjoint des intervalles présents (O(n) : préférer add_sorted)."""
+        i = bisect.bisect_right(self._starts, start)
+        self._starts.insert(i, start)
+        self._ends.insert(i, end)
+
+    def try_add(self, start: int, end: int) -> bool:
+        """Ajoute [start, end) s'il ne chevauche rien ; retourne True si ajouté."""
+        if self.overlaps(start, end):
+            return False
+        self.add(start, end)
+        return True
+
+    def add_sorted(self, spans) -> list[bool]:
+        """Équivaut à try_add sur chaque intervalle, ``spans`` étant triés par début.
+
+        Coût O(log n + m + k) : m intervalles ajoutés, k intervalles présents
+        dans la plage couverte (plus le décalage de la fin des listes).
+        Retourne, pour chaque intervalle, s'il a été ajouté.
+        """
+        spans = list(spans)
+        if not spans:
+            return []
+        starts, ends = self._starts, self._ends
+        lo = max(bisect.bisect_right(starts, spans[0][0]) - 1, 0)
+        hi = bisect.bisect_left(starts, max(end for _, end in spans), lo)
+
+        new_starts: list[int] = []
+        new_ends: list[int] = []
+        added = []
+        j = lo
+        for start, end in spans:
+            while j < hi and ends[j] <= start:
+                new_starts.append(starts[j])
+                new_ends.append(ends[j])
+                j += 1
+            if (new_ends and new_ends[-1] > start) or (j < hi and starts[j] < end):
+                added.append(False)
+                continue
+            new_starts.append(start)
+            new_ends.append(end)
+            added.append(True)
+        new_starts.extend(starts[j:hi])
+        new_ends.extend(ends[j:hi])
+        starts[lo:hi] = new_starts
+        ends[lo:hi] = new_ends
+        return added
@@ -0,0 +1,73 @@
+"""Compare le moteur regex compilé à la boucle historique (une passe par règle).
+
+Usage : python -m benchmarks.bench_regex_engine --size-mb 5
+"""
+import argparse
+import random
+import time
+
+from backend import rules
+
+ROW_TEMPLATES = [
+    "{i} | Dupont | Jean | jean.dupont{i}@example.com | 06 12 34 56 {d2} | Paris",
+    "{i} | Commande {i} | 2024-03-{d2} | 1250.50 | livree",
+    "{i} | Martin | Claire | claire.martin{i}@corp.fr | +33 1 23 45 67 {d2}",
+    "{i} | Note interne : revoir le contrat avant la fin du mois",
+    "{i} | Serveur de test http://192.168.1.{d2}:8080/admin",
+    "{i} | mdp du compte: Secret{i}!",
+]
+
+
+def make_attachment(size_bytes: int, seed: int = 0) -> str:
+    """Génère un export type tableur d'environ size_bytes caractères."""
+    rng = random.Random(seed)
+    rows = []
+    total = 0
+    i = 0
+    while total < size_bytes:
+        row = rng.choice(ROW_TEMPLATES).format(i=i, d2=f"{i % 100:02d}")
+        rows.append(row)
+        total += len(row) + 1
+        i += 1
+    return "\n".join(rows)
+
+
+def legacy_scan(text: str) -> list[tuple[str, int, int]]:
+    return [
+        (rule["label"], m.start(), m.end())
+        for rule in rules.current().rules
+        for m in rule["pattern"].finditer(text)
+    ]
+
+
+def engine_scan(text: str) -> list[tuple[str, int, int]]:
+    return [(rule["label"], m.start(), m.end()) for rule, m in rules.current().engine.finditer(text)]
+
+
+def _best_of(fn, text: str, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(text)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size-mb", type=float, nargs="+", default=[0.5, 1, 5])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'taille':>8} | {'boucle (s)':>10} | {'moteur (s)':>10} | {'gain':>6}")
+    for size_mb in args.size_mb:
+        text = make_attachment(int(size_mb * 1024 * 1024))
+        if legacy_scan(text) != engine_scan(text):
+            raise SystemExit(f"Résultats divergents pour {size_mb} Mo")
+        legacy = _best_of(legacy_scan, text, args.repeat)
+        engine = _best_of(engine_scan, text, args.repeat)
+        print(f"{size_mb:>6} Mo | {legacy:>10.3f} | {engine:>10.3f} | x{legacy / engine:>5.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""Suite de benchmarks : latence, débit et pic mémoire par module et de bout en bout.
+
+Modules : detect_sensitive_data(), anonymize(), extract_text(), generate_report(),
+sur le corpus synthétique (benchmarks.corpus) à tailles et densités contrôlées.
+Bout en bout : requêtes concurrentes sur l'application FastAPI (transport ASGI,
+sans réseau), avec un faux Ollama à latence configurable (benchmarks.mock_ollama).
+
+Les résultats sont écrits en JSON, à comparer d'une version à l'autre.
+
+Usage :
+  python -m benchmarks.bench_suite --out bench.json
+  python -m benchmarks.bench_suite --only detect,extract --size-kb 10 100 --density 0 10
+  python -m benchmarks.bench_suite --only e2e --llm-latency 0.8 --requests 50 --concurrency 8
+  python -m benchmarks.bench_suite --compare avant.json apres.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from benchmarks.corpus import ATTACHMENT_BUILDERS, make_attachment, make_email
+
+MODULES = ("detect", "anonymize", "extract", "report")
+READY_TIMEOUT = 300
+# Préfixes des variables d'environnement reportées dans les résultats (configuration mesurée, hors clés)
+CONFIG_PREFIXES = ("AI_BACKEND", "OLLAMA_", "LLM_", "CPU_", "IO_", "MAX_", "SPACY_", "EXTRACT", "PDF_", "ANALYSIS_", "BATCH_", "WARMUP_", "LANG_")
+
+
+def _latency(timings: list[float]) -> dict:
+    timings = sorted(timings)
+    return {
+        "min": timings[0],
+        "median": statistics.median(timings),
+        "p95": timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        "max": timings[-1],
+    }
+
+
+def measure(fn, repeat: int, nbytes: int) -> dict:
+    """Latence sur ``repeat`` appels (après un appel d'échauffement), puis pic mémoire sur un appel tracé."""
+    fn()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    # tracemalloc ralentit l'exécution : pic mesuré à part, hors chronométrage
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    latency = _latency(timings)
+    return {
+        "bytes": nbytes,
+        "latency_s": latency,
+        "throughput_mb_s": nbytes / 1024 / 1024 / latency["median"],
+        "peak_mem_mb": peak / 1024 / 1024,
+    }
+
+
+def bench_modules(args) -> list[dict]:
+    from backend.anonymizer import anonymize
+    from backend.detector import detect_sensitive_data
+    from backend.file_parser import extract_text
+    from backend.report import generate_report
+
+    results = []
+
+    def add(bench: str, params: dict, fn, nbytes: int, **extra):
+        result = {"bench": bench, "params": params, **measure(fn, args.repeat, nbytes), **extra}
+        results.append(result)
+        _print_result(result)
+
+    for lang in args.langs if {"detect", "anonymize", "report"} & set(args.only) else ():
+        for size_kb in args.size_kb:
+            for density in args.density:
+                text, planted = make_email(int(size_kb * 1024), density, lang, args.seed)
+                nbytes = len(text.encode("utf-8"))
+                params = {"lang": lang, "size_kb": size_kb, "density": density}
+                entities = detect_sensitive_data(text, lang)
+                if "detect" in args.only:
+                    add("detect", params, lambda: detect_sensitive_data(text, lang), nbytes,
+                        planted=len(planted), found=len(entities))
+                if "anonymize" in args.only:
+                    add("anonymize", params, lambda: anonymize(text, entities), nbytes)
+                if "report" in args.only:
+                    add("report", params, lambda: generate_report(text, entities), nbytes)
+
+    if "extract" in args.only:
+        for ext in args.formats:
+            for size_kb in args.size_kb:
+                content, _ = make_attachment(ext, int(size_kb * 1024), 2.0, args.langs[0], args.seed)
+                add("extract", {"format": ext, "size_kb": size_kb},
+                    lambda: extract_text(f"bench{ext}", content), len(content))
+    return results
+
+
+def _server_timing(header: str) -> dict[str, float]:
+    stages = {}
+    for entry in header.split(","):
+        name, _, dur = entry.strip().partition(";dur=")
+        if dur:
+            stages[name] = float(dur)
+    return stages
+
+
+async def _run_scenario(client, requests: list[dict], concurrency: int) -> dict:
+    """Envoie les requêtes avec ``concurrency`` requêtes simultanées ; latences, statuts et étapes."""
+    semaphore = asyncio.Semaphore(concurrency)
+    timings, statuses, stages = [], {}, {}
+
+    async def send(request: dict):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.post(**request)
+            timings.append(time.perf_counter() - start)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            for name, ms in _server_timing(response.headers.get("server-timing", "")).items():
+                stages.setdefault(name, []).append(ms)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(send(request) for request in requests))
+    elapsed = time.perf_counter() - start
+    return {
+        "latency_s": _latency(timings),
+        "requests_per_s": len(requests) / elapsed,
+        "status": {str(code): count for code, count in sorted(statuses.items())},
+        "stages_ms": {name: statistics.median(values) for name, values in stages.items()},
+    }
+
+
+def _e2e_requests(scenario: str, params: dict, args) -> list[dict]:
+    size = int(params["size_kb"] * 1024)
+    lang = args.langs[0]
+    requests = []
+    # Un contenu différent par requête : aucun cache ne peut servir la réponse
+    for i in range(args.requests):
+        seed = args.seed + i
+        if scenario in ("analyze", "report"):
+            text, _ = make_email(size, params["density"], lang, seed)
+            requests.append({"url": f"/{scenario}", "data": {"text": text}})
+        elif scenario == "analyze_file":
+            content, _ = make_attachment(params["format"], size, 2.0, lang, seed)
+            requests.append({"url": "/analyze", "files": {"file": (f"piece{params['format']}", content)}})
+        elif scenario == "batch":
+            items = [{"id": n, "text": make_email(size, 2.0, lang, seed * 1000 + n)[0]} for n in range(params["items"])]
+            requests.append({"url": "/analyze/batch", "json": items})
+    return requests
+
+
+async def _bench_e2e(args, mock) -> list[dict]:
+    import httpx
+
+    from backend.main import app
+
+    scenarios = []
+    for size_kb in args.size_kb:
+        for density in args.density:
+            scenarios.append(("analyze", {"size_kb": size_kb, "density": density}))
+        for ext in args.formats:
+            scenarios.append(("analyze_file", {"format": ext, "size_kb": size_kb}))
+        scenarios.append(("batch", {"items": args.batch_items, "size_kb": size_kb}))
+        scenarios.append(("report", {"size_kb": size_kb, "density": 2.0}))
+
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app), httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=None
+    ) as client:
+        # Attente du préchargement des modèles (/readyz)
+        deadline = time.monotonic() + READY_TIMEOUT
+        while (ready := await client.get("/readyz")).status_code != 200:
+            if time.monotonic() > deadline:
+                raise SystemExit(f"Application non prête après {READY_TIMEOUT}s : {ready.json()}")
+            await asyncio.sleep(0.2)
+        for scenario, params in scenarios:
+            requests = _e2e_requests(scenario, params, args)
+            await _run_scenario(client, requests[:1], 1)  # échauffement
+            llm_calls = mock.requests
+            result = {
+                "bench": f"e2e:{scenario}",
+                "params": {**params, "concurrency": args.concurrency, "requests": len(requests)},
+                **await _run_scenario(client, requests, args.concurrency),
+                "llm_calls": mock.requests - llm_calls,
+                # Pic RSS du processus (et des workers terminés) depuis le lancement
+                "rss_peak_mb": _rss_peak_mb(),
+            }
+            results.append(result)
+            _print_result(result)
+    return results
+
+
+def bench_e2e(args) -> list[dict]:
+    from benchmarks.mock_ollama import MockOllama
+
+    with MockOllama(args.llm_latency, args.llm_jitter) as mock:
+        # À définir avant l'import de l'application (configuration lue à l'import)
+        os.environ.update({"AI_BACKEND": "ollama", "OLLAMA_URL": mock.url})
+        os.environ.setdefault("ANALYSIS_CACHE_MAX_BYTES", "0")
+        os.environ.setdefault("EXTRACTION_CACHE_MEMORY_BYTES", "0")
+        os.environ.setdefault("WARMUP_LANGS", ",".join(args.langs))
+        return asyncio.run(_bench_e2e(args, mock))
+
+
+def _rss_peak_mb() -> float:
+    # ru_maxrss : Ko sous Linux, octets sous macOS
+    unit = 1 if sys.platform == "darwin" else 1024
+    peak = max(resource.getrusage(who).ru_maxrss for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN))
+    return peak * unit / 1024 / 1024
+
+
+def _print_result(result: dict):
+    params = " ".join(f"{k}={v}" for k, v in result["params"].items())
+    latency = result["latency_s"]
+    line = f"{result['bench']:<18} {params:<48} médiane {latency['median'] * 1000:9.1f} ms  p95 {latency['p95'] * 1000:9.1f} ms"
+    if "throughput_mb_s" in result:
+        line += f"  {result['throughput_mb_s']:8.2f} Mo/s  pic {result['peak_mem_mb']:7.1f} Mo"
+    else:
+        line += f"  {result['requests_per_s']:7.2f} req/s  statuts {result['status']}"
+    print(line, flush=True)
+
+
+def _git_revision() -> str:
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "inconnue"
+    return revision + ("-modifié" if dirty else "")
+
+
+def metadata(args) -> dict:
+    from backend import rules
+    from backend.detector import detector_version
+    from backend.file_parser import PARSER_VERSION
+
+    return {
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "detector_version": detector_version(),
+        "rules_version": rules.current().version,
+        "parser_version": PARSER_VERSION,
+        "config": {k: v for k, v in sorted(os.environ.items()) if k.startswith(CONFIG_PREFIXES) and "KEY" not in k},
+        "args": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+    }
+
+
+def _key(result: dict) -> str:
+    return f"{result['bench']} {json.dumps(result['params'], sort_keys=True)}"
+
+
+def compare(before_path: str, after_path: str):
+    """Affiche l'évolution de la latence médiane entre deux fichiers de résultats."""
+    with open(before_path, encoding="utf-8") as f:
+        before = {_key(r): r for r in json.load(f)["results"]}
+    with open(after_path, encoding="utf-8") as f:
+        after = json.load(f)["results"]
+
+    print(f"{'benchmark':<70} {'avant (ms)':>11} {'après (ms)':>11} {'écart':>8}")
+    for result in after:
+        old = before.get(_key(result))
+        if old is None:
+            continue
+        old_ms = old["latency_s"]["median"] * 1000
+        new_ms = result["latency_s"]["median"] * 1000
+        print(f"{_key(result):<70} {old_ms:>11.1f} {new_ms:>11.1f} {(new_ms - old_ms) / old_ms:>+8.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", default="bench_results.json", help="Fichier JSON des résultats")
+    parser.add_argument("--only", default=",".join((*MODULES, "e2e")), help="Benchmarks à lancer (séparés par des virgules)")
+    parser.add_argument("--size-kb", type=float, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--density", type=float, nargs="+", default=[0, 2, 10], help="Données sensibles par Ko")
+    parser.add_argument("--langs", default="fr,en")
+    parser.add_argument("--formats", default=",".join(ATTACHMENT_BUILDERS))
+    parser.add_argument("--repeat", type=int, default=5, help="Mesures par benchmark de module")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--requests", type=int, default=20, help="Requêtes par scénario de bout en bout")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--batch-items", type=int, default=50, help="Emails par appel à /analyze/batch")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Latence du faux Ollama (secondes)")
+    parser.add_argument("--llm-jitter", type=float, default=0.1)
+    parser.add_argument("--compare", nargs=2, metavar=("AVANT", "APRES"), help="Compare deux fichiers de résultats")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    args.only = args.only.split(",")
+    args.langs = args.langs.split(",")
+    args.formats = args.formats.split(",")
+
+    results = bench_modules(args)
+    if "e2e" in args.only:
+        results += bench_e2e(args)
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump({"meta": metadata(args), "results": results}, f, indent=2, ensure_ascii=False)
+    print(f"Résultats : {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Faux serveur Ollama pour les benchmarks : latence configurable, réponses JSON valides.
+
+Répond à /api/tags et /api/generate (réponse simple, flux NDJSON et mode lot).
+La latence simule le temps de génération du modèle, sans consommer de CPU.
+
+Usage : python -m benchmarks.mock_ollama --port 11434 --latency 0.8 --jitter 0.2
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_EMAIL_MARKER = re.compile(r"=== EMAIL (\d+) ===")
+
+ANSWER = {
+    "entities": [],
+    "risk_level": "aucun",
+    "risk_summary": "Aucune donnée sensible supplémentaire (réponse simulée).",
+}
+
+
+def _answer_for(prompt: str) -> str:
+    ids = _EMAIL_MARKER.findall(prompt)
+    if "MODE LOT" in prompt and ids:
+        return json.dumps({"results": [{"id": int(i), **ANSWER} for i in ids]}, ensure_ascii=False)
+    return json.dumps(ANSWER, ensure_ascii=False)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload: dict):
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json({"models": [{"name": "mock"}]})
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        if self.path != "/api/generate":
+            self.send_error(404)
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        server: MockOllama = self.server.mock
+        server.requests += 1
+        delay = max(0.0, server.latency + random.uniform(-server.jitter, server.jitter))
+        answer = _answer_for(request.get("prompt", ""))
+
+        if not request.get("stream"):
+            time.sleep(delay)
+            self._send_json({"model": request.get("model"), "response": answer, "done": True})
+            return
+
+        # Flux NDJSON : la réponse est émise en quelques morceaux répartis sur la latence
+        pieces = [answer[i:i + 64] for i in range(0, len(answer), 64)]
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for piece in pieces + [""]:
+            time.sleep(delay / (len(pieces) + 1))
+            line = json.dumps({"response": piece, "done": not piece}).encode() + b"\n"
+            self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class MockOllama:
+    """Serveur HTTP dans un thread ; à utiliser comme gestionnaire de contexte."""
+
+    def __init__(self, latency: float = 0.5, jitter: float = 0.0, host: str = "127.0.0.1", port: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.requests = 0
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.mock = self
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockOllama":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--latency", type=float, default=0.5, help="Latence moyenne d'une réponse (secondes)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Variation aléatoire de la latence (secondes)")
+    args = parser.parse_args()
+
+    mock = MockOllama(args.latency, args.jitter, args.host, args.port)
+    print(f"Faux Ollama sur {mock.url} (latence {args.latency}s ± {args.jitter}s)")
+    try:
+        mock._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
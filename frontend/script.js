@@ -1,5 +1,8 @@
 const API_BASE = "";
 
+// Pause de saisie (ms) avant de demander l'analyse complete du brouillon
+const DRAFT_PAUSE_MS = 1500;
+
 const SEVERITY_COLORS = {
     critique: { bg: "#dc2626", color: "#fff" },
     "élevé": { bg: "#f59e0b", color: "#000" },
@@ -143,6 +146,41 @@ function escapeAttr(str) {
     return str.replace(/"/g, "&quot;").replace(/'/g, "&#39;");
 }
 
+async function readEventStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let sep;
+        while ((sep = buffer.indexOf("\n\n")) >= 0) {
+            const raw = buffer.slice(0, sep);
+            buffer = buffer.slice(sep + 2);
+            let event = "message";
+            let data = "";
+            for (const line of raw.split("\n")) {
+                if (line.startsWith("event: ")) event = line.slice(7);
+                else if (line.startsWith("data: ")) data += line.slice(6);
+            }
+            onEvent(event, data ? JSON.parse(data) : null);
+        }
+    }
+}
+
+function renderAnalysis(text, entities) {
+    document.getElementById("pii-count").textContent = `${entities.length} donnee(s) sensible(s) detectee(s)`;
+    document.getElementById("highlighted-text").innerHTML = highlightText(text, entities);
+    document.getElementById("pii-legend").innerHTML = renderLegend(entities);
+
+    const detailEl = document.getElementById("entities-detail");
+    if (detailEl) {
+        detailEl.innerHTML = renderEntitiesList(entities);
+        detailEl.hidden = false;
+    }
+}
+
 async function analyzeText() {
     const text = getText();
     const file = getFile();
@@ -152,27 +190,34 @@ async function analyzeText() {
     document.getElementById("btn-analyze").disabled = true;
 
     try {
-        const res = await fetch(`${API_BASE}/analyze`, {
+        // Flux SSE : entites regex immediates, puis entites IA au fil de l'eau
+        const res = await fetch(`${API_BASE}/analyze/stream`, {
             method: "POST",
             body: buildFormData(),
         });
-        const data = await res.json();
-
-        showRiskBanner(data.risk_level, data.risk_summary);
-        showAttachment(data.attachment_name, data.attachment_text);
         showResults();
-
-        document.getElementById("pii-count").textContent = `${data.count} donnee(s) sensible(s) detectee(s)`;
-        document.getElementById("highlighted-text").innerHTML = highlightText(text, data.entities);
-        document.getElementById("pii-legend").innerHTML = renderLegend(data.entities);
-
-        const detailEl = document.getElementById("entities-detail");
-        if (detailEl) {
-            detailEl.innerHTML = renderEntitiesList(data.entities);
-            detailEl.hidden = false;
+        document.getElementById("anonymized-card").hidden = true;
+        if (!res.ok) {
+            const summary = res.status === 503 ? "Serveur sature, reessayez dans quelques secondes." : `Erreur HTTP ${res.status}`;
+            showRiskBanner("erreur", summary);
+            return;
         }
 
-        document.getElementById("anonymized-card").hidden = true;
+        const entities = [];
+        showRiskBanner("analyse en cours", "");
+        await readEventStream(res, (event, data) => {
+            if (event === "attachment") {
+                showAttachment(data.attachment_name, data.attachment_text);
+            } else if (event === "entities") {
+                entities.push(...data.entities);
+                renderAnalysis(text, entities);
+            } else if (event === "entity") {
+                entities.push(data);
+                renderAnalysis(text, entities);
+            } else if (event === "verdict") {
+                showRiskBanner(data.risk_level, data.risk_summary);
+            }
+        });
     } finally {
         document.getElementById("btn-analyze").textContent = "Verifier la securite";
         document.getElementById("btn-analyze").disabled = false;
@@ -209,6 +254,7 @@ async function anonymizeText() {
 
         document.getElementById("anonymized-card").hidden = false;
         document.getElementById("anonymized-text").textContent = data.anonymized;
+        document.getElementById("btn-masked-file").hidden = !(file && /\.(docx|xlsx)$/i.test(file.name));
     } finally {
         document.getElementById("btn-anonymize").textContent = "Masquer les donnees";
         document.getElementById("btn-anonymize").disabled = false;
@@ -241,7 +287,123 @@ async function downloadReport() {
     }
 }
 
+async function downloadMaskedFile() {
+    const file = getFile();
+    if (!file) return;
+
+    const button = document.getElementById("btn-masked-file");
+    button.textContent = "Masquage en cours...";
+    button.disabled = true;
+
+    try {
+        const formData = new FormData();
+        formData.append("file", file);
+        const res = await fetch(`${API_BASE}/anonymize/file`, {
+            method: "POST",
+            body: formData,
+        });
+        if (!res.ok) return;
+        const blob = await res.blob();
+        const url = URL.createObjectURL(blob);
+        const a = document.createElement("a");
+        a.href = url;
+        a.download = file.name.replace(/(\.[^.]+)$/, "_masque$1");
+        a.click();
+        URL.revokeObjectURL(url);
+    } finally {
+        button.textContent = "Telecharger la piece jointe masquee";
+        button.disabled = false;
+    }
+}
+
+// Analyse pendant la saisie : seule la modification est envoyee, dans l'ordre des versions
+const draft = { session: null, version: 0, text: "", inflight: false, timer: null };
+
+// Offsets en points de code, comme les indices de chaine Python du serveur (et non en unites UTF-16)
+function codePointCount(s) {
+    let n = 0;
+    for (const _ of s) n++;
+    return n;
+}
+
+const isLowSurrogate = (code) => code >= 0xdc00 && code <= 0xdfff;
+
+function diffRange(before, after) {
+    let start = 0;
+    while (start < before.length && start < after.length && before[start] === after[start]) start++;
+    // Ne pas couper un caractere hors BMP (paire de substitution)
+    if (start > 0 && (isLowSurrogate(before.charCodeAt(start)) || isLowSurrogate(after.charCodeAt(start)))) start--;
+    let end = 0;
+    while (end < before.length - start && end < after.length - start
+           && before[before.length - 1 - end] === after[after.length - 1 - end]) end++;
+    if (end > 0 && isLowSurrogate(before.charCodeAt(before.length - end))) end--;
+    const offset = codePointCount(before.slice(0, start));
+    return {
+        start: offset,
+        end: offset + codePointCount(before.slice(start, before.length - end)),
+        text: after.slice(start, after.length - end),
+    };
+}
+
+function showLiveDetections(data) {
+    const el = document.getElementById("live-detections");
+    el.hidden = data.count === 0;
+    el.innerHTML = `${data.count} donnee(s) sensible(s) detectee(s) pendant la saisie ${renderLegend(data.entities)}`;
+}
+
+async function syncDraft() {
+    if (draft.inflight) return;
+    const text = document.getElementById("text-input").value;
+    if (draft.session && text === draft.text) return;
+
+    draft.inflight = true;
+    let ok = false;
+    try {
+        let res = null;
+        if (draft.session) {
+            res = await fetch(`${API_BASE}/draft/${draft.session}/edit`, {
+                method: "POST",
+                headers: { "Content-Type": "application/json" },
+                body: JSON.stringify({ version: draft.version, ...diffRange(draft.text, text) }),
+            });
+            // Session expiree, version perimee ou modification refusee : nouvelle session avec le texte complet
+            if (!res.ok) draft.session = null;
+        }
+        if (!draft.session) {
+            res = await fetch(`${API_BASE}/draft`, {
+                method: "POST",
+                headers: { "Content-Type": "application/json" },
+                body: JSON.stringify({ text }),
+            });
+        }
+        if (!res.ok) return;
+        const data = await res.json();
+        draft.session = data.session;
+        draft.version = data.version;
+        draft.text = text;
+        showLiveDetections(data);
+        clearTimeout(draft.timer);
+        draft.timer = setTimeout(fetchDraftAnalysis, DRAFT_PAUSE_MS);
+        ok = true;
+    } finally {
+        draft.inflight = false;
+        // Saisie pendant la requete : envoyer la suite
+        if (ok && document.getElementById("text-input").value !== draft.text) syncDraft();
+    }
+}
+
+async function fetchDraftAnalysis() {
+    const version = draft.version;
+    const res = await fetch(`${API_BASE}/draft/${draft.session}/analysis?version=${version}`);
+    if (!res.ok || version !== draft.version) return;
+    const data = await res.json();
+    showLiveDetections(data);
+    showRiskBanner(data.risk_level, data.risk_summary);
+}
+
 function copyAnonymized() {
     const text = document.getElementById("anonymized-text").textContent;
     navigator.clipboard.writeText(text);
 }
+
+document.getElementById("text-input").addEventListener("input", syncDraft);
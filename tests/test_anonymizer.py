@@ -0,0 +1,113 @@
+import io
+
+import pytest
+from docx import Document
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls
+from openpyxl import Workbook, load_workbook
+from openpyxl.chart import BarChart, Reference
+
+from backend.anonymizer import UnsupportedContentError, anonymize, anonymize_docx, anonymize_xlsx
+
+
+def _entity(start, end, label):
+    return {"start": start, "end": end, "label": label}
+
+
+def test_anonymize_masks_entities_in_order():
+    text = "mail a@b.fr tel 0612345678 fin"
+    entities = [_entity(16, 26, "TELEPHONE"), _entity(5, 11, "EMAIL")]
+    assert anonymize(text, entities) == "mail [EMAIL_MASQUÉ] tel [TEL_MASQUÉ] fin"
+
+
+def test_overlapping_entities_are_merged():
+    text = "abc def ghi"
+    entities = [_entity(0, 7, "NOM"), _entity(4, 11, "EMAIL")]
+    assert anonymize(text, entities) == "[NOM_MASQUÉ]"
+
+
+def test_docx_is_masked_in_place():
+    doc = Document()
+    para = doc.add_paragraph("Le mot de passe: ")
+    para.add_run("MonSuper").bold = True
+    para.add_run("Mdp123! merci")
+    doc.add_paragraph("Rien à signaler")
+    source = io.BytesIO()
+    doc.save(source)
+
+    masked = Document(io.BytesIO(anonymize_docx(source.getvalue())))
+    runs = masked.paragraphs[0].runs
+    assert masked.paragraphs[0].text == "Le [MOT_DE_PASSE_MASQUÉ] merci"
+    assert len(runs) == 3 and runs[1].bold
+    assert masked.paragraphs[1].text == "Rien à signaler"
+
+
+def test_xlsx_is_masked_cell_by_cell():
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["Email", "Commentaire", "Montant"])
+    ws.append(["jean@example.com", "écrire à paul@example.com svp", 12])
+    ws.append(["n/a", "RAS", 3])
+    source = io.BytesIO()
+    wb.save(source)
+
+    masked = load_workbook(io.BytesIO(anonymize_xlsx(source.getvalue()))).active
+    assert [c.value for c in masked[2]] == ["[EMAIL_MASQUÉ]", "écrire à [EMAIL_MASQUÉ] svp", 12]
+    assert masked["A1"].value == "Email"
+    assert [c.value for c in masked[3]] == ["n/a", "RAS", 3]
+
+
+def test_docx_tracked_changes_and_content_controls_are_masked():
+    doc = Document()
+    para = doc.add_paragraph("Contact : ")
+    para._p.append(parse_xml(
+        f'<w:ins {nsdecls("w")} w:id="1" w:author="A" w:date="2024-01-01T00:00:00Z">'
+        '<w:r><w:t>jean.dupont@example.com</w:t></w:r></w:ins>'
+    ))
+    para._p.append(parse_xml(
+        f'<w:del {nsdecls("w")} w:id="2" w:author="A" w:date="2024-01-01T00:00:00Z">'
+        '<w:r><w:delText>paul.martin@example.com</w:delText></w:r></w:del>'
+    ))
+    para._p.append(parse_xml(
+        f'<w:sdt {nsdecls("w")}><w:sdtContent><w:r><w:t> ou marie.curie@example.com</w:t></w:r></w:sdtContent></w:sdt>'
+    ))
+    source = io.BytesIO()
+    doc.save(source)
+
+    content = anonymize_docx(source.getvalue())
+    xml = Document(io.BytesIO(content)).element.body.xml
+    for address in ("jean.dupont", "paul.martin", "marie.curie"):
+        assert address not in xml
+    assert xml.count("[EMAIL_MASQUÉ]") == 3
+
+
+def test_xlsx_with_chart_is_refused():
+    wb = Workbook()
+    ws = wb.active
+    for row in (["Nom", "Montant"], ["a", 1], ["b", 2]):
+        ws.append(row)
+    chart = BarChart()
+    chart.add_data(Reference(ws, min_col=2, min_row=1, max_row=3), titles_from_data=True)
+    ws.add_chart(chart, "D2")
+    source = io.BytesIO()
+    wb.save(source)
+
+    with pytest.raises(UnsupportedContentError, match="graphiques"):
+        anonymize_xlsx(source.getvalue())
+
+
+def test_xlsx_masks_every_cell_that_anonymize_masks():
+    values = ["pass:", "pass: hunter2", "ok", "écrire à paul@example.com", "FR76 3000 6000 0112 3456 7890 189",
+              "tel 06 12 34 56 78", "login: jdupont", "RAS"]
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["Notes"])
+    for value in values:
+        ws.append([value])
+    source = io.BytesIO()
+    wb.save(source)
+
+    masked = load_workbook(io.BytesIO(anonymize_xlsx(source.getvalue()))).active
+    assert masked["A1"].value == "Notes"
+    for row, value in enumerate(values, start=2):
+        assert masked[f"A{row}"].value == anonymize(value), value
@@ -0,0 +1,38 @@
+import json
+
+import httpx
+
+from benchmarks.corpus import make_attachment, make_email
+from benchmarks.mock_ollama import MockOllama
+from backend.file_parser import extract_text
+
+
+def test_corpus_is_deterministic_and_sized():
+    text, planted = make_email(5000, 5.0, "fr", seed=3)
+    assert (text, planted) == make_email(5000, 5.0, "fr", seed=3)
+    assert 5000 <= len(text) < 5200
+    assert 10 <= len(planted) <= 40
+    assert make_email(5000, 0.0, "en")[1] == []
+
+
+def test_attachments_contain_the_generated_text():
+    _, planted = make_email(2000, 10.0, "fr", seed=1)
+    assert "EMAIL" in planted
+    for ext in (".pdf", ".docx", ".xlsx"):
+        content, _ = make_attachment(ext, 2000, 10.0, "fr", seed=1)
+        assert "claire.martin" in extract_text(f"piece{ext}", content)
+
+
+def test_mock_ollama_answers_single_and_batch_prompts():
+    with MockOllama(latency=0) as mock:
+        single = httpx.post(f"{mock.url}/api/generate", json={"prompt": "email", "stream": False})
+        batch = httpx.post(
+            f"{mock.url}/api/generate",
+            json={"prompt": "MODE LOT\n=== EMAIL 1 ===\na\n=== EMAIL 2 ===\nb", "stream": False},
+        )
+        streamed = httpx.post(f"{mock.url}/api/generate", json={"prompt": "email", "stream": True})
+    assert json.loads(single.json()["response"])["risk_level"] == "aucun"
+    assert [r["id"] for r in json.loads(batch.json()["response"])["results"]] == [1, 2]
+    pieces = [json.loads(line)["response"] for line in streamed.text.splitlines()]
+    assert json.loads("".join(pieces)) == json.loads(single.json()["response"])
+    assert mock.requests == 3
@@ -0,0 +1,102 @@
+import time
+
+import os
+
+import pytest
+
+from backend.cache import DiskCache, ResultCache, TieredCache, content_key
+
+
+def test_hit_and_miss_counters():
+    cache = ResultCache(max_bytes=10_000, ttl=60)
+    key = content_key("v1", "texte")
+    assert cache.get(key) is None
+    cache.put(key, {"entities": [], "risk_level": "aucun"})
+    assert cache.get(key) == {"entities": [], "risk_level": "aucun"}
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_lru_eviction_by_size():
+    cache = ResultCache(max_bytes=60, ttl=60)
+    cache.put("a", "x" * 20)
+    cache.put("b", "y" * 20)
+    cache.get("a")
+    cache.put("c", "z" * 20)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_expire_after_ttl():
+    cache = ResultCache(max_bytes=10_000, ttl=0.05)
+    cache.put("a", {"text": "secret"})
+    time.sleep(0.1)
+    cache.purge_expired()
+    assert cache.stats()["entries"] == 0
+    assert cache.get("a") is None
+
+
+@pytest.fixture
+def key():
+    fernet = pytest.importorskip("cryptography.fernet")
+    return fernet.Fernet.generate_key().decode()
+
+
+def test_disk_cache_persists_and_evicts_lru(tmp_path, key):
+    cache = DiskCache(str(tmp_path), max_bytes=10_000, encryption_key=key, ttl=60)
+    cache.put("a", {"text": "contrat " * 10})
+    cache.put("b", {"text": "grille tarifaire"})
+    assert cache.get("a") == {"text": "contrat " * 10}
+
+    reopened = DiskCache(str(tmp_path), max_bytes=10_000, encryption_key=key, ttl=60)
+    assert reopened.get("b") == {"text": "grille tarifaire"}
+
+    small = DiskCache(str(tmp_path), max_bytes=reopened.stats()["bytes"] - 1, encryption_key=key, ttl=60)
+    assert small.stats()["evictions"] == 1
+    assert len(os.listdir(tmp_path)) == 1
+
+
+def test_disk_cache_ignores_corrupted_entries(tmp_path, key):
+    cache = DiskCache(str(tmp_path), max_bytes=10_000, encryption_key=key, ttl=60)
+    cache.put("a", {"text": "x"})
+    (tmp_path / "a").write_bytes(b"corrompu")
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_disk_cache_encryption(tmp_path, key):
+    cache = DiskCache(str(tmp_path), max_bytes=10_000, encryption_key=key, ttl=60)
+    cache.put("a", {"text": "mot de passe: secret"})
+    assert b"secret" not in (tmp_path / "a").read_bytes()
+    assert cache.get("a") == {"text": "mot de passe: secret"}
+
+
+def test_disk_cache_requires_a_key(tmp_path):
+    with pytest.raises(ValueError):
+        DiskCache(str(tmp_path), max_bytes=10_000, encryption_key="", ttl=60)
+    assert os.listdir(tmp_path) == []
+
+
+def test_disk_entries_expire_after_ttl(tmp_path, key):
+    cache = DiskCache(str(tmp_path), max_bytes=10_000, encryption_key=key, ttl=60)
+    cache.put("a", {"text": "ancien"})
+    cache.put("b", {"text": "récent"})
+    old = time.time() - 120
+    os.utime(tmp_path / "a", (old, old))
+    assert cache.get("a") is None
+    assert cache.get("b") == {"text": "récent"}
+    assert cache.stats()["expirations"] == 1
+
+    os.utime(tmp_path / "b", (old, old))
+    reopened = DiskCache(str(tmp_path), max_bytes=10_000, encryption_key=key, ttl=60)
+    assert reopened.stats()["entries"] == 0 and os.listdir(tmp_path) == []
+
+
+def test_tiered_cache_promotes_disk_hits(tmp_path, key):
+    disk = DiskCache(str(tmp_path), max_bytes=10_000, encryption_key=key, ttl=60)
+    disk.put("k", {"text": "x"})
+    cache = TieredCache(ResultCache(max_bytes=10_000, ttl=60), disk)
+    assert cache.get("k") == {"text": "x"}
+    assert cache.memory.get("k") == {"text": "x"}
@@ -1,4 +1,4 @@
-from backend.detector import detect_sensitive_data
+from backend.detector import detect_sensitive_data, detect_sensitive_data_batch
 
 
 def test_detect_password():
@@ -129,3 +129,51 @@ def test_multiple_sensitive_data():
     assert "MOT_DE_PASSE" in labels
     assert "IDENTIFIANT" in labels
     assert "URL_PRIVEE" in labels
+
+
+def test_batch_matches_single_detection():
+    texts = [
+        "Bonjour, je suis Jean Dupont et mon mot de passe est: Azerty123",
+        "Merci de virer le montant sur l'IBAN FR76 3000 6000 0112 3456 7890 189 avant vendredi.",
+        "",
+        "Réunion prévue demain avec Marie Curie pour discuter du budget.",
+    ]
+    assert detect_sensitive_data_batch(texts) == [detect_sensitive_data(t) for t in texts]
+
+
+def test_batch_ner_honours_spacy_n_process(monkeypatch):
+    from backend import detector
+
+    texts = [
+        "Bonjour, je suis Jean Dupont et mon mot de passe est: Azerty123",
+        "Réunion prévue demain avec Marie Curie pour discuter du budget.",
+    ]
+    expected = [detect_sensitive_data(t) for t in texts]
+    calls = []
+    get_nlp = detector.get_nlp
+
+    class Recorder:
+        def __init__(self, nlp):
+            self.nlp = nlp
+
+        def pipe(self, texts, batch_size, n_process):
+            calls.append(n_process)
+            return self.nlp.pipe(texts, batch_size=batch_size)
+
+    monkeypatch.setattr(detector, "SPACY_N_PROCESS", 2)
+    monkeypatch.setattr(detector, "get_nlp", lambda lang: Recorder(get_nlp(lang)))
+    assert detect_sensitive_data_batch(texts) == expected
+    assert calls == [2]
+
+
+def test_interrupted_rules_make_the_verdict_incomplete(monkeypatch):
+    from backend import detector
+    from backend.regex_engine import RegexBudget
+    from backend.report import assess_risk
+
+    monkeypatch.setattr(detector, "RegexBudget", lambda: RegexBudget(rule_seconds=1e-9, request_seconds=0))
+    entities = detect_sensitive_data("Rien de sensible ici.", "fr")
+    assert detector.is_incomplete(entities)
+    [marker] = [e for e in entities if e["label"] == detector.INCOMPLETE_LABEL]
+    assert marker["start"] == marker["end"] == -1
+    assert assess_risk(entities) != "aucun"
@@ -0,0 +1,113 @@
+import json
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from backend import drafts
+from backend.drafts import DraftConflict, DraftSession, DraftStore
+
+
+def _entity(text, full, label="EMAIL"):
+    start = full.index(text)
+    return {"text": text, "label": label, "start": start, "end": start + len(text)}
+
+
+def _session(text, *values):
+    return DraftSession("s", text, [_entity(v, text) for v in values], "fr")
+
+
+def test_entities_after_edit_are_shifted(monkeypatch):
+    monkeypatch.setattr(drafts, "DRAFT_MARGIN_CHARS", 0)
+    text = "ligne a@b.fr\nautre\nfin c@d.fr"
+    session = _session(text, "a@b.fr", "c@d.fr")
+
+    new_text, win_start, win_end, before, after = session.prepare_edit(13, 18, "texte modifié")
+    assert new_text[win_start:win_end] == "texte modifié"
+    assert [e["text"] for e in before] == ["a@b.fr"]
+    assert new_text[after[0]["start"]:after[0]["end"]] == "c@d.fr"
+
+
+def test_edited_entity_is_dropped_and_rescanned(monkeypatch):
+    monkeypatch.setattr(drafts, "DRAFT_MARGIN_CHARS", 0)
+    text = "début\nmail jean@example.com merci\nfin"
+    session = _session(text, "jean@example.com")
+
+    start = text.index("example")
+    new_text, win_start, win_end, before, after = session.prepare_edit(start, start, "x")
+    assert before == [] and after == []
+    assert new_text[win_start:win_end] == "mail jean@xexample.com merci"
+
+
+def test_window_includes_margin_on_whole_lines(monkeypatch):
+    monkeypatch.setattr(drafts, "DRAFT_MARGIN_CHARS", 3)
+    text = "un\ndeux\ntrois\nquatre"
+    session = _session(text)
+
+    pos = text.index("trois")
+    new_text, win_start, win_end, _, _ = session.prepare_edit(pos, pos, "!")
+    assert new_text[win_start:win_end] == "deux\n!trois"
+
+
+def test_invalid_range_is_rejected():
+    with pytest.raises(ValueError):
+        _session("abc").prepare_edit(2, 10, "")
+
+
+def test_store_expires_sessions():
+    store = DraftStore(max_sessions=2, ttl=60)
+    first = store.create("a", [], "fr")
+    store.create("b", [], "fr")
+    store.create("c", [], "fr")
+    with pytest.raises(DraftConflict):
+        store.get(first.id)
+
+    store.ttl = 0
+    session = store.create("d", [], "fr")
+    with pytest.raises(DraftConflict):
+        store.get(session.id)
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="node absent")
+@pytest.mark.parametrize("before, after", [
+    ("Salut 😀 mail: a@b.fr", "Salut 😀 mail: jean@b.fr"),
+    ("a😀b", "a😁b"),
+    ("𐀀x", "𐐀x"),
+    ("début 🇫🇷", "début 🇫🇷 fin"),
+])
+def test_client_diff_uses_python_offsets(before, after):
+    # diffRange de l'interface web, exécuté tel quel : ses offsets s'appliquent au texte côté serveur
+    script = (Path(__file__).parent.parent / "frontend" / "script.js").read_text(encoding="utf-8")
+    source = script[script.index("function codePointCount"):script.index("function showLiveDetections")]
+    program = source + "process.stdout.write(JSON.stringify(diffRange(...JSON.parse(process.argv[1]))));"
+    output = subprocess.run(["node", "-e", program, json.dumps([before, after])],
+                            capture_output=True, text=True, check=True).stdout
+    edit = json.loads(output)
+    new_text = _session(before).prepare_edit(edit["start"], edit["end"], edit["text"])[0]
+    assert new_text == after
+
+
+def test_failed_background_analysis_is_logged_and_still_raised(monkeypatch, caplog):
+    import asyncio
+
+    from backend import main
+    from backend.executor import Saturated
+
+    async def saturated(text):
+        raise Saturated()
+
+    monkeypatch.setattr(main, "DRAFT_LLM_DELAY", 0)
+    monkeypatch.setattr(main, "full_analysis", saturated)
+
+    async def run():
+        session = main.drafts.create("texte", [], "fr")
+        main._schedule_full_analysis(session)
+        await asyncio.sleep(0.05)
+        assert session.full_task.done()
+        # Le client qui demande l'analyse reçoit l'erreur (503 via le handler Saturated)
+        with pytest.raises(Saturated):
+            await main.draft_analysis(session.id, session.version)
+
+    asyncio.run(run())
+    assert "Analyse complète du brouillon impossible" in caplog.text
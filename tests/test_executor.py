@@ -0,0 +1,45 @@
+import time
+
+from backend import executor
+
+
+def test_process_pool_reports_workers_ready(monkeypatch):
+    monkeypatch.setattr(executor, "CPU_EXECUTOR", "process")
+    monkeypatch.setattr(executor, "CPU_WORKERS", 2)
+    monkeypatch.setattr(executor, "_cpu_pool", None)
+    try:
+        executor.start([])
+        deadline = time.monotonic() + 60
+        while not executor.models_ready()["ready"] and time.monotonic() < deadline:
+            time.sleep(0.1)
+        assert executor.models_ready() == {"ready": True, "workers_ready": 2, "workers": 2}
+        # Préchargement dans les workers uniquement, pas dans le processus serveur
+        assert not executor.warm_up_in_process()
+    finally:
+        executor.shutdown()
+
+
+def test_prefork_pool_preloads_only_requested_langs(monkeypatch):
+    from backend import prefork
+
+    created = []
+
+    class _Pool:
+        def __init__(self, workers, langs=None):
+            created.append(langs)
+
+        def start(self):
+            return self
+
+        def shutdown(self, wait=True, cancel_futures=False):
+            pass
+
+    monkeypatch.setattr(prefork, "PreforkPool", _Pool)
+    monkeypatch.setattr(executor, "CPU_EXECUTOR", "prefork")
+    monkeypatch.setattr(executor, "_cpu_pool", None)
+    try:
+        # WARMUP_LANGS vide : aucun modèle préchargé (et non tous)
+        executor.start([])
+    finally:
+        executor.shutdown()
+    assert created == [[]]
@@ -0,0 +1,133 @@
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+from fpdf import FPDF
+from openpyxl import Workbook
+
+from backend import file_parser
+from backend.file_parser import ExtractionLimitError, extract_text, iter_extract
+
+
+def _xlsx(rows: int) -> bytes:
+    wb = Workbook()
+    ws = wb.active
+    for i in range(rows):
+        ws.append([i, f"ligne {i}", None])
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def test_chunks_rebuild_extracted_text(monkeypatch):
+    monkeypatch.setattr(file_parser, "EXTRACT_CHUNK_CHARS", 50)
+    content = ("première ligne\r\n" * 20 + "fin é").encode()
+    text = extract_text("note.txt", content)
+    assert text == content.decode()
+    chunks = list(iter_extract("note.txt", io.BytesIO(content)))
+    assert len(chunks) > 1
+    assert all(text[offset:offset + len(chunk)] == chunk for offset, chunk in chunks)
+
+
+def test_excel_rows_are_streamed():
+    chunks = list(iter_extract("data.xlsx", _xlsx(30)))
+    text = "\n".join(chunk for _, chunk in chunks)
+    assert text.startswith("[Feuille: Sheet]\n0 | ligne 0")
+    assert "29 | ligne 29" in text
+
+
+def test_limits_fail_fast(monkeypatch):
+    monkeypatch.setattr(file_parser, "EXTRACT_MAX_ROWS", 10)
+    with pytest.raises(ExtractionLimitError):
+        extract_text("data.xlsx", _xlsx(30))
+    monkeypatch.setattr(file_parser, "EXTRACT_MAX_BYTES", 100)
+    with pytest.raises(ExtractionLimitError):
+        extract_text("note.txt", b"a" * 101)
+
+
+def _pdf(pages: int) -> bytes:
+    pdf = FPDF()
+    pdf.set_font("Helvetica", size=10)
+    for i in range(pages):
+        pdf.add_page()
+        pdf.cell(0, 10, f"Page {i + 1} : mot de passe: secret{i}")
+    return bytes(pdf.output())
+
+
+def test_parallel_pdf_matches_serial(monkeypatch):
+    content = _pdf(6)
+    serial = extract_text("doc.pdf", content)
+    monkeypatch.setattr(file_parser, "PDF_PARALLEL_MIN_PAGES", 2)
+    monkeypatch.setattr(file_parser, "PDF_WORKERS", 2)
+    try:
+        assert extract_text("doc.pdf", content) == serial
+    finally:
+        file_parser.shutdown_pdf_pool()
+    assert "Page 6 : mot de passe: secret5" in serial
+
+
+def _pdf_workers_in_cpu_worker():
+    return file_parser._pdf_workers()
+
+
+def test_pdf_pool_is_capped_inside_cpu_workers():
+    # Pool CPU par défaut (un worker par CPU) : pas de pool PDF imbriqué
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        nested = pool.submit(_pdf_workers_in_cpu_worker).result(timeout=60)
+    expected = min(file_parser.PDF_WORKERS, max(1, (os.cpu_count() or 1) // file_parser.CPU_WORKERS))
+    assert nested == expected
+    assert file_parser._pdf_workers() == file_parser.PDF_WORKERS
+
+
+def _parallel_extract_then_exit(content: bytes):
+    os.cpu_count = lambda: 8
+    file_parser.PDF_PARALLEL_MIN_PAGES = 2
+    file_parser.PDF_WORKERS = 2
+    file_parser.CPU_WORKERS = 1
+    assert "secret5" in extract_text("doc.pdf", content)
+    assert file_parser._pdf_pool is not None
+
+
+def test_cpu_worker_exits_after_parallel_pdf():
+    # Le pool PDF d'un worker est arrêté à la sortie du worker (sinon join sans fin de ses processus)
+    process = multiprocessing.get_context("spawn").Process(target=_parallel_extract_then_exit, args=(_pdf(6),))
+    process.start()
+    process.join(timeout=60)
+    if process.is_alive():
+        process.kill()
+    assert process.exitcode == 0
+
+
+def test_pdf_time_budget_reports_skipped_pages(monkeypatch):
+    monkeypatch.setattr(file_parser, "PDF_TIME_BUDGET", 1e-9)
+    text = extract_text("doc.pdf", _pdf(4))
+    assert text == "[Pages non analysées (budget de temps dépassé) : 1-4]"
+
+
+def _extract_with_stuck_first_page(source, start, stop, deadline):
+    # Exécutée dans un worker du pool PDF : la première page ne se termine pas à temps
+    if start == 0:
+        import time
+
+        time.sleep(60)
+    return file_parser._extract_pdf_pages(source, start, stop, deadline)
+
+
+def test_slow_page_is_abandoned_in_parallel_extraction(monkeypatch):
+    import time
+
+    monkeypatch.setattr(file_parser, "PDF_PARALLEL_MIN_PAGES", 2)
+    monkeypatch.setattr(file_parser, "PDF_WORKERS", 2)
+    monkeypatch.setattr(file_parser, "PDF_TIME_BUDGET", 5)
+    monkeypatch.setattr(file_parser, "_extract_pdf_pages", _extract_with_stuck_first_page)
+    started = time.time()
+    try:
+        text = extract_text("doc.pdf", _pdf(6))
+    finally:
+        file_parser.shutdown_pdf_pool()
+    assert time.time() - started < 30
+    assert "secret5" in text and "secret0" not in text
+    assert text.endswith("[Pages non analysées (budget de temps dépassé) : 1]")
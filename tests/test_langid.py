@@ -0,0 +1,43 @@
+from backend import detector
+from backend.langid import identify, language_runs
+
+MIXED = (
+    "Bonjour Paul,\n\nVoici le rapport que vous avez demandé pour la réunion.\n\n"
+    "Hi team, please find the report attached for the meeting with John.\n\n"
+    "Thanks,\nJohn\n\n"
+    "Merci et à bientôt, je reste disponible."
+)
+
+
+def test_identify_needs_enough_evidence():
+    assert identify("Voici le mot de passe du compte pour la démo") == "fr"
+    assert identify("Here are the credentials for the demo account") == "en"
+    assert identify("Jean Dupont, 06 12 34 56 78") is None
+
+
+def test_runs_cover_text_and_short_paragraphs_inherit():
+    runs = language_runs(MIXED)
+    assert [lang for _, _, lang in runs] == ["fr", "en", "fr"]
+    assert runs[0][0] == 0 and runs[-1][1] == len(MIXED)
+    assert all(a[1] == b[0] for a, b in zip(runs, runs[1:]))
+    assert MIXED[runs[1][0]:runs[1][1]].endswith("Thanks,\nJohn\n\n")
+
+
+def test_previous_language_carries_over_stream_chunks():
+    assert language_runs("Best,\nJohn", previous="en") == [(0, 10, "en")]
+    assert language_runs("Best,\nJohn") == [(0, 10, "fr")]
+
+
+def test_paragraphs_are_routed_to_their_language_model(monkeypatch):
+    calls = []
+    monkeypatch.setattr(detector, "_detect_ner", lambda lang, chunks, *_: calls.append((lang, chunks)))
+
+    detector.detect_sensitive_data(MIXED)
+    routed = {lang: "".join(chunk for _, chunk in chunks) for lang, chunks in calls}
+    assert "Hi team" in routed["en"] and "Hi team" not in routed["fr"]
+    for _, chunks in calls:
+        assert all(MIXED[offset:offset + len(chunk)] == chunk for offset, chunk in chunks)
+
+    calls.clear()
+    detector.detect_sensitive_data(MIXED, "fr")
+    assert [lang for lang, _ in calls] == ["fr"]
@@ -0,0 +1,49 @@
+import asyncio
+
+from backend import ai_analyzer
+from backend.ai_analyzer import LLMBatcher
+
+
+def _result(text):
+    return {"entities": [], "risk_level": "faible", "risk_summary": text}
+
+
+def test_batch_demultiplexes_results(monkeypatch):
+    calls = []
+
+    async def fake_batch(texts):
+        calls.append(texts)
+        return [_result(t) for t in texts]
+
+    monkeypatch.setattr(ai_analyzer, "_analyze_batch", fake_batch)
+
+    async def run():
+        batcher = LLMBatcher(window_ms=20, max_items=8)
+        results = await asyncio.gather(*(batcher.submit(f"email {i}") for i in range(3)))
+        return batcher, results
+
+    batcher, results = asyncio.run(run())
+    assert len(calls) == 1
+    assert [r["risk_summary"] for r in results] == ["email 0", "email 1", "email 2"]
+    assert batcher.stats()["batches"] == 1
+    assert batcher.stats()["fill_ratio"] == 3 / 8
+
+
+def test_missing_results_fall_back_to_single_calls(monkeypatch):
+    async def fake_batch(texts):
+        return [_result(texts[0]), None]
+
+    async def fake_single(text):
+        return _result("seul " + text)
+
+    monkeypatch.setattr(ai_analyzer, "_analyze_batch", fake_batch)
+    monkeypatch.setattr(ai_analyzer, "_analyze_text", fake_single)
+
+    async def run():
+        batcher = LLMBatcher(window_ms=1000, max_items=2)
+        results = await asyncio.gather(batcher.submit("a"), batcher.submit("b"))
+        return batcher, results
+
+    batcher, results = asyncio.run(run())
+    assert [r["risk_summary"] for r in results] == ["a", "seul b"]
+    assert batcher.stats()["fallbacks"] == 1
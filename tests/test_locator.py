@@ -0,0 +1,38 @@
+from backend.ai_analyzer import merge_detections
+from backend.anonymizer import anonymize
+from backend.locator import Locator
+
+
+def test_locate_is_case_and_whitespace_tolerant():
+    text = "Projet  ATLAS :\nbudget validé par Marie\n  Curie. Rappel : projet atlas."
+    spans = Locator(["projet Atlas", "marie curie"]).locate(text)
+    assert [text[s:e] for s, e in spans[0]] == ["Projet  ATLAS", "projet atlas"]
+    assert [text[s:e] for s, e in spans[1]] == ["Marie\n  Curie"]
+
+
+def test_locate_respects_word_boundaries():
+    text = "Paul et Paulette, puis Paul."
+    spans = Locator(["paul", "absent"]).locate(text)
+    assert spans[0] == [(0, 4), (23, 27)]
+    assert spans[1] == []
+    # Même résultat avec une seule chaîne (recherche directe)
+    assert Locator(["paul"]).locate(text)[0] == spans[0]
+
+
+def test_locate_overlapping_needles():
+    text = "Le code projet Hermès-42 et Hermès."
+    spans = Locator(["Hermès-42", "hermès"]).locate(text)
+    assert spans[0] == [(15, 24)]
+    assert spans[1] == [(15, 21), (28, 34)]
+
+
+def test_ai_entities_are_positioned_and_masked():
+    text = "Réunion avec Projet Atlas. Le projet ATLAS est confidentiel."
+    ai_result = {
+        "entities": [{"text": "projet atlas", "label": "PROJET", "severity": "élevé"}],
+        "risk_level": "ÉLEVÉ - ATTENTION",
+    }
+    merged = merge_detections([], ai_result, text)
+    positioned = [e for e in merged["entities"] if e["start"] >= 0]
+    assert [e["text"] for e in positioned] == ["Projet Atlas", "projet ATLAS"]
+    assert "atlas" not in anonymize(text, positioned).lower()
@@ -0,0 +1,62 @@
+import asyncio
+import time
+
+from backend import executor, metrics
+
+
+def _stage():
+    with metrics.timed("regex"):
+        metrics.record_rule("EMAIL", 0.002)
+    return "ok"
+
+
+def test_call_timed_collects_worker_stages():
+    result, timings = metrics.call_timed(_stage)
+    assert result == "ok"
+    assert [stage for stage, _ in timings.stages] == ["regex"]
+    assert timings.rules == {"EMAIL": 0.002}
+
+
+def test_timed_iter_excludes_consumer_time():
+    timings = metrics.begin()
+    for _ in metrics.timed_iter("extract", ["a", "b"]):
+        time.sleep(0.02)
+    [(stage, seconds)] = timings.stages
+    assert stage == "extract" and seconds < 0.02
+
+
+def test_server_timing_sums_stages():
+    timings = metrics.Timings()
+    timings.stages += [("ner", 0.001), ("regex", 0.002), ("ner", 0.003)]
+    assert timings.server_timing() == "ner;dur=4.0, regex;dur=2.0"
+
+
+def test_run_cpu_merges_worker_timings(monkeypatch):
+    monkeypatch.setattr(executor, "CPU_EXECUTOR", "thread")
+    monkeypatch.setattr(executor, "_cpu_pool", None)
+
+    async def scenario():
+        timings = metrics.begin()
+        assert await executor.run_cpu(_stage) == "ok"
+        return timings
+
+    try:
+        timings = asyncio.run(scenario())
+    finally:
+        executor.shutdown()
+    assert [stage for stage, _ in timings.stages] == ["regex"]
+
+
+def test_unknown_entity_labels_are_grouped():
+    def value(label):
+        return metrics.REGISTRY.get_sample_value("securemail_entities_total", {"label": label, "source": "ai"}) or 0
+
+    before_other, before_email = value("AUTRE"), value("EMAIL")
+    metrics.count_entities([
+        {"label": "EMAIL", "source": "ai"},
+        {"label": "Numéro de badge 4821", "source": "ai"},
+        {"source": "ai"},
+    ])
+    assert value("EMAIL") == before_email + 1
+    assert value("AUTRE") == before_other + 2
+    assert value("Numéro de badge 4821") == 0
@@ -0,0 +1,37 @@
+import os
+
+import pytest
+
+from backend.prefork import PreforkPool, WorkerDied
+
+
+def _pid():
+    return os.getpid()
+
+
+def _crash():
+    os._exit(3)
+
+
+@pytest.fixture(scope="module")
+def pool():
+    pool = PreforkPool(2, langs=[]).start()
+    yield pool
+    pool.shutdown(cancel_futures=True)
+
+
+def test_dead_worker_fails_its_task_and_is_replaced(pool):
+    pids = set(pool._processes)
+    with pytest.raises(WorkerDied):
+        pool.submit(_crash).result(timeout=30)
+    # Les tâches suivantes s'exécutent, dont sur le worker de remplacement
+    results = [pool.submit(_pid) for _ in range(20)]
+    assert {f.result(timeout=30) for f in results} <= set(pool._processes)
+    assert len(pool._processes) == 2 and set(pool._processes) != pids
+
+
+def test_queued_tasks_survive_a_worker_death(pool):
+    futures = [pool.submit(_crash)] + [pool.submit(_pid) for _ in range(10)]
+    with pytest.raises(WorkerDied):
+        futures[0].result(timeout=30)
+    assert all(isinstance(f.result(timeout=30), int) for f in futures[1:])
@@ -0,0 +1,75 @@
+import json
+import os
+import re
+import time
+
+import pytest
+
+from backend import rules
+from backend.regex_engine import RegexBudget, RegexEngine
+from backend.rules import RulesetError, parse_ruleset
+
+
+def _ruleset(pattern, **rule):
+    return {"version": "test", "rules": [{"label": "A", "pattern": pattern, **rule}]}
+
+
+def test_bundled_rules_are_bounded_and_linear():
+    ruleset = rules.load_ruleset(rules.RULES_FILE)
+    assert ruleset.version and len(ruleset.rules) >= 17
+
+    start = time.perf_counter()
+    for text in ("pass " * 20000, "user " * 20000, "salaire" + " " * 20000 + "x", "a" * 20000 + " @"):
+        list(ruleset.engine.finditer(text))
+    assert time.perf_counter() - start < 2
+
+
+@pytest.mark.parametrize("pattern", [r"(?:\s+\w+)*:", r"(a+)+b", r"(?:x|y\d*){2,5}", r"(?:ab*){0,3}"])
+def test_nested_unbounded_quantifiers_are_rejected(pattern):
+    with pytest.raises(RulesetError):
+        parse_ruleset(_ruleset(pattern))
+
+
+@pytest.mark.parametrize("data", [
+    _ruleset(r"(?:\s{1,10}\w{1,40}){0,6}:", severity="grave"),
+    _ruleset(r"abc", trigger=["a"]),
+    _ruleset(r"(unclosed"),
+    {"version": "test", "rules": [{"label": "A", "pattern": "a"}, {"label": "A", "pattern": "b"}]},
+])
+def test_invalid_rulesets_are_rejected(data):
+    with pytest.raises(RulesetError):
+        parse_ruleset(data)
+
+
+def test_rule_over_budget_is_interrupted():
+    # Règle quadratique (hors validation) : interrompue bien avant la fin de son balayage
+    engine = RegexEngine([{"label": "LENT", "pattern": re.compile(r"pass(?:\s+\w+)*\s*:"), "triggers": ("pass",)}])
+    budget = RegexBudget(rule_seconds=0.05, request_seconds=0)
+    start = time.perf_counter()
+    assert list(engine.finditer("pass " * 50000, budget)) == []
+    assert time.perf_counter() - start < 1
+    assert budget.exceeded == ["LENT"]
+    # Règle épuisée : ignorée pour la suite de la requête
+    assert list(engine.finditer("pass :", budget)) == []
+
+
+def test_ruleset_is_hot_reloaded(tmp_path, monkeypatch):
+    path = tmp_path / "rules.json"
+    monkeypatch.setattr(rules, "RULES_FILE", str(path))
+    monkeypatch.setattr(rules, "_current", None)
+    monkeypatch.setattr(rules, "_rejected_mtime", 0)
+
+    def write(data, mtime):
+        path.write_text(json.dumps(data) if isinstance(data, dict) else data, encoding="utf-8")
+        os.utime(path, (mtime, mtime))
+        monkeypatch.setattr(rules, "_checked", float("-inf"))
+
+    write({"version": "1", "rules": [{"label": "A", "pattern": "a"}]}, 1_000_000)
+    assert rules.current().version == "1"
+
+    write({"version": "2", "rules": [{"label": "B", "pattern": "b", "severity": "critique"}]}, 2_000_000)
+    assert rules.current().version == "2"
+    assert [(r["label"], m.group()) for r, m in rules.current().engine.finditer("ab")] == [("B", "b")]
+
+    write("{invalide", 3_000_000)
+    assert rules.current().version == "2"
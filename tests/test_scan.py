@@ -0,0 +1,87 @@
+import json
+from email.message import EmailMessage
+
+from backend import scan
+from backend.scan import main, scan_message
+
+
+def _message(subject, body, attachment=None):
+    msg = EmailMessage()
+    msg["From"] = "alice@example.com"
+    msg["To"] = "bob@example.com"
+    msg["Subject"] = subject
+    msg.set_content(body)
+    if attachment:
+        msg.add_attachment(attachment.encode(), maintype="text", subtype="plain", filename="acces.txt")
+    return msg.as_bytes()
+
+
+def _archive(tmp_path):
+    tmp_path.mkdir()
+    (tmp_path / "a.eml").write_bytes(_message("Accès", "mot de passe: MonSuperMdp123!"))
+    # Jeu de caractères inconnu : corps relu en UTF-8
+    (tmp_path / "b.eml").write_bytes(
+        b'Subject: Charset\nContent-Type: text/plain; charset="x-inconnu"\n\nmdp: Charset123abc\n'
+    )
+    mbox = b""
+    for i in range(3):
+        mbox += b"From alice@example.com Thu Jan  1 00:00:00 2026\n"
+        mbox += _message(f"Message {i}", "Bonjour", attachment=f"mdp: secret{i}abc") + b"\n"
+    (tmp_path / "archive.mbox").write_bytes(mbox)
+    return tmp_path
+
+
+def _scan(argv):
+    main(argv + ["--workers", "0", "--langs", "fr", "--quiet"])
+
+
+def _rows(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_scan_reports_body_and_attachment_findings(tmp_path):
+    archive = _archive(tmp_path / "mails")
+    output = tmp_path / "out.jsonl"
+    _scan([str(archive), "-o", str(output)])
+
+    rows = _rows(output)
+    assert {(r["part"], r["label"]) for r in rows} >= {("body", "MOT_DE_PASSE"), ("acces.txt", "MOT_DE_PASSE")}
+    assert {r["message"].rsplit("/", 1)[-1] for r in rows} >= {"a.eml", "archive.mbox#2"}
+    checkpoint = json.loads((tmp_path / "out.jsonl.checkpoint").read_text())
+    assert checkpoint["done"] == 5
+
+
+def test_resume_produces_same_output(tmp_path):
+    archive = _archive(tmp_path / "mails")
+    full = tmp_path / "full.jsonl"
+    _scan([str(archive), "-o", str(full)])
+
+    partial = tmp_path / "partial.jsonl"
+    _scan([str(archive), "-o", str(partial), "--max-messages", "2"])
+    assert json.loads((tmp_path / "partial.jsonl.checkpoint").read_text())["done"] == 2
+    _scan([str(archive), "-o", str(partial), "--resume"])
+
+    assert partial.read_text() == full.read_text()
+
+
+def test_worker_pool_matches_in_process_scan(tmp_path):
+    archive = _archive(tmp_path / "mails")
+    single, pooled = tmp_path / "single.jsonl", tmp_path / "pooled.jsonl"
+    _scan([str(archive), "-o", str(single)])
+    main([str(archive), "-o", str(pooled), "--workers", "2", "--chunksize", "1", "--langs", "fr", "--quiet"])
+
+    assert pooled.read_text() == single.read_text()
+    assert any(r["message"].endswith("b.eml") and r["label"] == "MOT_DE_PASSE" for r in _rows(pooled))
+
+
+def test_unreadable_part_keeps_other_findings(monkeypatch):
+    def part_text(part):
+        if "illisible" in part.get_content():
+            raise ValueError("partie illisible")
+        return part.get_content()
+
+    monkeypatch.setattr(scan, "_part_text", part_text)
+    raw = _message("Accès", "illisible", attachment="mdp: secret9abc")
+    rows, _ = scan_message(("m.eml", raw))
+    assert {"part": "body", "error": "partie illisible"}.items() <= rows[0].items()
+    assert any(r.get("part") == "acces.txt" and r.get("label") == "MOT_DE_PASSE" for r in rows)
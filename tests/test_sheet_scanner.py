@@ -0,0 +1,91 @@
+import io
+
+from openpyxl import Workbook
+
+from backend.sheet_scanner import _header_label, scan_workbook
+
+
+def _xlsx(rows: list[list]) -> bytes:
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Clients"
+    for row in rows:
+        ws.append(row)
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def test_header_hints():
+    assert _header_label("Mot de passe") == "MOT_DE_PASSE"
+    assert _header_label("IBAN client") == "IBAN"
+    assert _header_label("Nom d'utilisateur") == "IDENTIFIANT"
+    assert _header_label("Salaire brut (€)") == "SALAIRE"
+    assert _header_label("Pinceau") is None
+    assert _header_label("Nom") == "NOM"
+    assert _header_label("Tél.") == "TELEPHONE"
+    # Mot-clé court : l'en-tête entier doit correspondre
+    assert _header_label("Nom du produit") is None
+    assert _header_label("Pipeline") is None
+
+
+def test_scan_reports_coordinates():
+    content = _xlsx([
+        ["Référence", "Password", "Montant", "Commentaire"],
+        [1, "Secret123", 12.5, "RAS"],
+        [2, None, 40, "écrire à jean.dupont@gmail.com"],
+    ])
+    result = scan_workbook(content)
+    columns = {c["column"]: c for c in result["sheets"][0]["columns"]}
+    assert columns["A"]["type"] == "numeric"
+    assert columns["B"]["label"] == "MOT_DE_PASSE"
+    assert result["sheets"][0]["rows"] == 2
+
+    hits = [(h["sheet"], h["row"], h["column"], h["label"], h["text"]) for h in result["hits"]]
+    assert ("Clients", 2, "B", "MOT_DE_PASSE", "Secret123") in hits
+    assert ("Clients", 3, "D", "EMAIL", "jean.dupont@gmail.com") in hits
+    assert not any(h["column"] in ("A", "C") for h in result["hits"])
+
+
+def test_large_integers_are_checked_in_numeric_columns():
+    content = _xlsx([["Ref", "Info"], [1, 4970101234567890], [2, 12]])
+    hits = scan_workbook(content)["hits"]
+    assert [(h["row"], h["column"], h["label"]) for h in hits] == [(2, "B", "CARTE_BANCAIRE")]
+
+
+def test_header_guides_detection_without_replacing_it():
+    content = _xlsx([
+        ["Nom du produit", "Email", "Password"],
+        ["Chaise pliante", "n/a", "n/a"],
+        ["Table basse", "FR76 3000 6000 0112 3456 7890 189", "Secret123"],
+        ["Lampe", "jean.dupont@gmail.com", None],
+    ])
+    result = scan_workbook(content)
+    columns = {c["column"]: c for c in result["sheets"][0]["columns"]}
+    assert columns["A"]["label"] is None
+    hits = {(h["row"], h["column"]): (h["label"], h["severity"], h["source"]) for h in result["hits"]}
+    assert not any(column == "A" and source == "header" for (_, column), (_, _, source) in hits.items())
+    # Valeur de remplissage ignorée, IBAN reconnu par les règles malgré l'en-tête "Email"
+    assert (2, "B") not in hits and (2, "C") not in hits
+    assert hits[(3, "B")] == ("IBAN", "élevé", "regex")
+    assert hits[(4, "B")] == ("EMAIL", "faible", "regex")
+    assert hits[(3, "C")] == ("MOT_DE_PASSE", "critique", "header")
+
+
+def test_text_cells_are_checked_in_numeric_columns(monkeypatch):
+    from backend import sheet_scanner
+
+    monkeypatch.setattr(sheet_scanner, "SHEET_SAMPLE_ROWS", 2)
+    content = _xlsx([["Ref", "Info"], [1, 12], [2, 34], [3, "4970 1012 3456 7890"]])
+    result = scan_workbook(content)
+    assert result["sheets"][0]["columns"][1]["type"] == "numeric"
+    assert [(h["row"], h["column"], h["label"]) for h in result["hits"]] == [(4, "B", "CARTE_BANCAIRE")]
+
+
+def test_match_does_not_run_into_the_next_row():
+    # Une étiquette seule juste au-dessus d'un vrai secret ne doit pas l'absorber
+    content = _xlsx([["Notes"], ["pass:"], ["pass: hunter2"], ["ok"]])
+    hits = scan_workbook(content)["hits"]
+    assert [(h["row"], h["label"], h["text"]) for h in hits if h["label"] == "MOT_DE_PASSE"] == [
+        (3, "MOT_DE_PASSE", "pass: hunter2")
+    ]
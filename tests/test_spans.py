@@ -0,0 +1,63 @@
+from backend.spans import SpanIndex
+
+
+def test_overlap_detection():
+    index = SpanIndex([(10, 20), (30, 40)])
+    assert index.overlaps(15, 25)
+    assert index.overlaps(25, 35)
+    assert index.overlaps(5, 50)
+    assert not index.overlaps(20, 30)
+    assert not index.overlaps(0, 10)
+    assert not index.overlaps(40, 45)
+
+
+def test_try_add_keeps_first_span():
+    index = SpanIndex()
+    assert index.try_add(5, 10)
+    assert not index.try_add(8, 12)
+    assert index.try_add(10, 12)
+    assert list(index) == [(5, 10), (10, 12)]
+
+
+def test_matches_quadratic_check():
+    import random
+
+    rng = random.Random(0)
+    index = SpanIndex()
+    seen = []
+    for _ in range(2000):
+        start = rng.randrange(0, 5000)
+        span = (start, start + rng.randrange(1, 30))
+        overlaps = any(not (span[1] <= s[0] or span[0] >= s[1]) for s in seen)
+        assert index.try_add(*span) is not overlaps
+        if not overlaps:
+            seen.append(span)
+
+
+def test_add_sorted_matches_try_add():
+    import random
+
+    rng = random.Random(1)
+    index, reference = SpanIndex(), SpanIndex()
+    for _ in range(50):
+        batch = sorted((s, s + rng.randrange(1, 30)) for s in (rng.randrange(0, 5000) for _ in range(40)))
+        assert index.add_sorted(batch) == [reference.try_add(*span) for span in batch]
+    assert list(index) == list(reference)
+
+
+def test_add_sorted_scales_linearly():
+    import time
+
+    def fill(n):
+        # Deux règles dont les correspondances s'intercalent (pire cas de l'insertion unitaire)
+        index = SpanIndex()
+        start = time.perf_counter()
+        index.add_sorted((i * 20, i * 20 + 5) for i in range(n))
+        index.add_sorted((i * 20 + 10, i * 20 + 15) for i in range(n))
+        assert len(index) == 2 * n
+        return time.perf_counter() - start
+
+    small, large = fill(50_000), fill(200_000)
+    assert large < 1
+    # Linéaire : ~4x pour 4x plus d'intervalles (16x si quadratique)
+    assert large < 10 * max(small, 1e-3)
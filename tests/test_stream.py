@@ -0,0 +1,90 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from backend import executor, main
+
+
+def _events(body: str) -> list[tuple[str, dict]]:
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+@pytest.fixture
+def thread_pool(monkeypatch):
+    monkeypatch.setattr(executor, "CPU_EXECUTOR", "thread")
+    monkeypatch.setattr(executor, "_cpu_pool", None)
+    monkeypatch.setattr(main, "AI_ENABLED", True)
+    main.analysis_cache.clear()
+    yield
+    executor.shutdown()
+
+
+def test_stream_emits_final_entities_missing_from_stream(thread_pool, monkeypatch):
+    async def fake_stream(text):
+        yield "entity", {"text": "projet Aurore", "label": "PROJET", "severity": "moyen"}
+        # Le résultat final ne reprend pas l'entité du flux : seule la nouvelle doit être émise
+        yield "result", {
+            "entities": [{"text": "budget 2027", "label": "FINANCE", "severity": "moyen"}],
+            "risk_level": "MOYEN - A VERIFIER",
+            "risk_summary": "",
+        }
+
+    monkeypatch.setattr(main, "stream_ai_analysis", fake_stream)
+    text = "Bonjour, le projet Aurore avance. Le budget 2027 reste confidentiel, rappel : projet Aurore."
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/analyze/stream", data={"text": text})
+
+    response = asyncio.run(scenario())
+    events = _events(response.text)
+    streamed = [(data["text"], data["start"]) for kind, data in events if kind == "entity"]
+    assert streamed == [
+        ("projet Aurore", text.find("projet")),
+        ("projet Aurore", text.rfind("projet")),
+        ("budget 2027", text.find("budget")),
+    ]
+    assert events[-1] == ("done", {"count": 1})
+    assert main.limiter.in_flight == 0
+
+
+def test_admission_slot_released_when_client_leaves_before_stream():
+    started = []
+
+    async def events():
+        started.append(True)
+        yield "x"
+
+    async def scenario():
+        await main.limiter.acquire()
+        response = main.AdmittedStreamingResponse(events())
+
+        async def receive():
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            raise OSError("client déconnecté")
+
+        with pytest.raises(Exception):
+            await response({"type": "http", "method": "GET", "path": "/", "headers": []}, receive, send)
+
+    asyncio.run(scenario())
+    assert main.limiter.in_flight == 0 and not started
+
+
+def test_batch_releases_admission_slot(thread_pool):
+    async def scenario():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/analyze/batch", json=[{"id": "a", "text": 3}])
+
+    response = asyncio.run(scenario())
+    assert json.loads(response.text)["id"] == "a"
+    assert main.limiter.in_flight == 0